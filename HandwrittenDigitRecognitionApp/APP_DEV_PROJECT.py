@@ -1,24 +1,35 @@
+import time
+process_start = time.perf_counter()  # Start-up time is measured from here
+
 import os
-import cv2
+import sys
+import threading
 import numpy as np  # Fix the import statement
-import pytesseract
-from googletrans import Translator
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
-from PIL import Image, ImageTk, ImageDraw, ImageGrab, ImageOps  # Add ImageOps for inverting colors
+from PIL import Image, ImageTk, ImageDraw, ImageOps  # Add ImageOps for inverting colors
 import logging
 from pathlib import Path
-import time
-from gtts import gTTS
-import pygame
-import requests
-import tempfile
 import json
+from functools import partial
 from concurrent.futures import ThreadPoolExecutor
-from urllib.parse import quote
-import wikitextparser as wtp
-import html
-import uuid
+from tesseract_pool import TesseractEnginePool
+from ocr_registry import OcrRouter, default_registry
+from ocr_languages import resolve_language
+from segmentation import line_bands
+from preprocessing import preprocess
+from page_tiling import load_page, recognize_page
+from translation_cache import TranslationCache
+from offline_dictionary import OfflineDictionary
+from tts_cache import AudioCache
+from instrumentation import metrics, open_debug_panel
+from frame_memo import FrameMemo, canvas_hash
+from lazy_loading import StartupTimer, Subsystem
+
+# googletrans, pygame, requests, wikitextparser and the OCR bindings are
+# imported on first use or by the background warm-up, not here
+startup = StartupTimer(process_start)
+startup.mark('imports')
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
@@ -39,6 +50,7 @@ def check_tesseract_installation():
 if os.name == 'nt':  # Windows
     try:
         check_tesseract_installation()
+        import pytesseract
         pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
         os.environ['TESSDATA_PREFIX'] = r'C:\Program Files\Tesseract-OCR\tessdata'
         logging.info("Tesseract configured successfully")
@@ -49,44 +61,73 @@ if os.name == 'nt':  # Windows
             "Please install Tesseract-OCR and ensure the language data files are present.")
         sys.exit(1)
 
-def enhance_image(image):
-    """Enhanced image processing pipeline specifically for handwriting recognition"""
-    try:
-        # Add padding to the image
-        padding = 20
-        height, width = image.shape[:2]
-        padded_image = cv2.copyMakeBorder(
-            image,
-            padding, padding, padding, padding,
-            cv2.BORDER_CONSTANT,
-            value=[255, 255, 255]
-        )
-        
-        # Convert to grayscale
-        gray = cv2.cvtColor(padded_image, cv2.COLOR_BGR2GRAY)
-        
-        # Apply adaptive thresholding
-        binary = cv2.adaptiveThreshold(
-            gray,
-            255,
-            cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
-            cv2.THRESH_BINARY_INV,
-            21,
-            10
-        )
-        
-        # Noise removal and text enhancement
-        kernel = np.ones((2,2), np.uint8)
-        binary = cv2.morphologyEx(binary, cv2.MORPH_CLOSE, kernel)
-        binary = cv2.morphologyEx(binary, cv2.MORPH_OPEN, kernel)
-        
-        # Dilate to make text more prominent
-        binary = cv2.dilate(binary, kernel, iterations=1)
-        
-        return binary
-    except Exception as e:
-        logging.error(f"Image enhancement failed: {e}")
-        return None
+# Warm Tesseract engines shared by every recognition worker thread
+ocr_pool = TesseractEnginePool()
+
+# Every OCR engine the app knows about, loaded on demand and shared
+ocr_registry = default_registry(ocr_pool)
+
+# Seconds the router may spend on a real-time pass and on an explicit Recognize
+REAL_TIME_BUDGET = 0.25
+ACCURATE_BUDGET = 5.0
+
+def run_ocr(processed, psm=6, lang='eng'):
+    """Run Tesseract on a preprocessed binary image and normalize whitespace"""
+    text = ocr_pool.image_to_string(processed, lang=lang, psm=psm)
+    return ' '.join(text.strip().split())  # Clean up whitespace
+
+def find_text_lines(gray, ink_threshold=128, line_gap=8, margin=4):
+    """Return (top, bottom, left, right) boxes of the text lines on a white canvas
+
+    Rows containing ink are grouped into horizontal bands; rows separated by
+    fewer than ``line_gap`` blank rows belong to the same line.
+    """
+    ink = gray < ink_threshold
+    tops, bottoms = line_bands(ink, line_gap)
+    
+    height, width = gray.shape[:2]
+    lines = []
+    for top, bottom in zip(tops, bottoms):
+        ink_cols = np.flatnonzero(ink[top:bottom + 1].any(axis=0))
+        lines.append((
+            max(int(top) - margin, 0),
+            min(int(bottom) + margin + 1, height),
+            max(int(ink_cols[0]) - margin, 0),
+            min(int(ink_cols[-1]) + margin + 1, width),
+        ))
+    return lines
+
+def boxes_overlap(line, bbox):
+    """Check whether a (top, bottom, left, right) line touches an (x0, y0, x1, y1) box"""
+    top, bottom, left, right = line
+    x0, y0, x1, y1 = bbox
+    return top < y1 and y0 < bottom and left < x1 and x0 < right
+
+def incremental_ocr(gray, dirty_bbox, line_cache, ocr=run_ocr):
+    """OCR only the text lines touched by ``dirty_bbox``
+
+    ``line_cache`` maps line boxes from the previous pass to their text.
+    Lines whose box is unchanged and that do not intersect the dirty region
+    reuse the cached transcript. ``ocr(processed, psm)`` recognizes one line.
+    Returns the merged text and the new cache.
+    """
+    new_cache = {}
+    for line in find_text_lines(gray):
+        if line in line_cache and (dirty_bbox is None or not boxes_overlap(line, dirty_bbox)):
+            new_cache[line] = line_cache[line]
+            continue
+        
+        top, bottom, left, right = line
+        with metrics.span('preprocess'):
+            processed = preprocess(gray[top:bottom, left:right])
+        if processed is None:
+            raise Exception("Image processing failed")
+        with metrics.span('ocr_line'):
+            new_cache[line] = ocr(processed, psm=7)
+    
+    # Lines come back top to bottom, so the cache order is reading order
+    text = ' '.join(line_text for line_text in new_cache.values() if line_text)
+    return text, new_cache
 
 class MultilingualRecognitionApp:
     def __init__(self, root):
@@ -94,8 +135,8 @@ class MultilingualRecognitionApp:
         self.root.title("Multilingual Handwriting Recognition")
         self.root.geometry("1400x800")
         
-        # Initialize variables
-        self.translator = Translator()
+        # Initialize variables; the translation backend is imported when first needed
+        self.translator = Subsystem('translator', self.create_translator)
         self.last_x = None
         self.last_y = None
         self.captured_image = None
@@ -110,12 +151,28 @@ class MultilingualRecognitionApp:
         self.pen_width = 3  # Restore original pen width
         self.eraser_width = 50
         
+        # Off-screen grayscale copy of the canvas that recognition reads from
+        self.canvas_width = 800
+        self.canvas_height = 400
+        self.ink_image = None
+        self.ink_draw = None
+        self.reset_ink_buffer()
+        
+        # Dirty-region tracking for incremental real-time OCR
+        self.dirty_bbox = None
+        self.ink_version = 0
+        self.line_cache = {}
+        
+        # Ink version right after an upload was displayed; while it still
+        # matches, the decoded file is recognized instead of the canvas copy
+        self.upload_version = None
+        
         # Add real-time processing variables
         self.real_time_active = False
         self.last_process_time = time.time()
         self.process_delay = 1.0  # 1 second delay
         
-        self.stroke_completed = False
+        self.stroke_finished = False
         self.last_stroke_time = 0
         self.stroke_delay = 0.5  # Delay after stroke completion before detection
 
@@ -146,27 +203,62 @@ class MultilingualRecognitionApp:
             'Swedish': {'ocr': 'swe', 'translate': 'sv'}
         }
         
-        # Initialize pygame mixer for audio playback
-        pygame.mixer.init()
+        # Persistent caches live in the user's home directory
+        self.cache_dir = os.path.join(Path.home(), '.handwriting_app')
+        self.translation_cache = TranslationCache(
+            os.path.join(self.cache_dir, 'translations.sqlite3')
+        )
         
-        # Add LibreTranslate URL
-        self.libretranslate_url = "https://libretranslate.com/translate"
+        # Shared connection pool for dictionary and IPA lookups, backed by the
+        # offline store when one has been imported
+        self.lookups = Subsystem('dictionary lookups', self.create_lookups)
+        
+        # Translate through a LibreTranslate endpoint when one is configured,
+        # googletrans otherwise
+        self.libretranslate_url = os.environ.get('LIBRETRANSLATE_URL')
+        
+        # Recognizer backends by registry name; 'Auto' routes each request by its
+        # latency budget, the others are loaded when first selected
+        self.recognizers = {
+            'Auto': None,
+            'Tesseract': 'tesseract',
+            'CNN (EMNIST)': 'cnn_emnist',
+            'CNN digits (MNIST)': 'cnn_mnist',
+            'EasyOCR': 'easyocr',
+            'PaddleOCR': 'paddleocr',
+            'keras-ocr': 'keras_ocr',
+            'TrOCR (handwriting)': 'trocr',
+        }
         
-        # Initialize thread pool for concurrent API calls
+        # Initialize thread pool for background recognition
         self.executor = ThreadPoolExecutor(max_workers=3)
+        # Picks the engine for 'Auto'; Tesseract is warmed on the recognition threads
+        self.ocr_router = OcrRouter(ocr_registry, executor=self.executor)
+        # Tiles of full-resolution uploads are OCR'd on their own pool
+        self.tile_executor = ThreadPoolExecutor(max_workers=min(4, os.cpu_count() or 1),
+                                                thread_name_prefix='tile')
+        self.recognition_generation = 0
+        self.applied_generation = 0
+        # Pending real-time request, replaced by the next one if it has not started
+        self.real_time_future = None
         
         # Add audio state tracking
         self.current_audio = None
         self.audio_playing = False
         
-        # Create temp directory for audio files
-        self.temp_audio_dir = os.path.join(tempfile.gettempdir(), 'handwriting_app_audio')
-        os.makedirs(self.temp_audio_dir, exist_ok=True)
+        # Results of recent canvas frames, reused when the ink has not really changed
+        self.frame_memo = FrameMemo()
         
-        # Initialize pygame mixer with better settings
-        pygame.mixer.init(frequency=44100, size=-16, channels=2, buffer=4096)
+        # Synthesized pronunciations, kept in memory by (text, language)
+        self.audio_cache = AudioCache()
+        
+        # pygame and its mixer are set up once, on first use or during warm-up
+        self.audio = Subsystem('audio', self.init_audio)
         
+        startup.mark('init')
         self.setup_gui()
+        startup.mark('window')
+        self.root.after_idle(self.startup_finished)
 
     def setup_gui(self):
         # Main container
@@ -180,8 +272,8 @@ class MultilingualRecognitionApp:
         # Canvas
         self.canvas = tk.Canvas(
             left_panel,
-            width=800,
-            height=400,
+            width=self.canvas_width,
+            height=self.canvas_height,
             bg='white',
             highlightthickness=1,
             highlightbackground="gray"
@@ -193,6 +285,9 @@ class MultilingualRecognitionApp:
         self.canvas.bind("<ButtonRelease-1>", self.stroke_completed)
         self.canvas.bind("<Button-1>", self.start_stroke)
         
+        # F12 opens the performance panel (stage latencies, export, profiling)
+        self.root.bind("<F12>", lambda event: open_debug_panel(self.root))
+        
         # Controls
         controls = ttk.Frame(left_panel)
         controls.pack(fill=tk.X, pady=10)
@@ -212,6 +307,7 @@ class MultilingualRecognitionApp:
                                     width=15)
         self.source_lang.pack(side=tk.LEFT, padx=5)
         self.source_lang.set("English")
+        self.source_lang.bind("<<ComboboxSelected>>", self.source_changed)
         
         # Swap languages button
         ttk.Button(lang_controls, 
@@ -227,6 +323,11 @@ class MultilingualRecognitionApp:
         self.target_lang.pack(side=tk.LEFT, padx=5)
         self.target_lang.set("Spanish")
         
+        # Pick the OCR language from the script of the ink (needs osd.traineddata)
+        self.detect_script_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(lang_controls, text="Detect script",
+                       variable=self.detect_script_var).pack(side=tk.LEFT, padx=5)
+        
         # Tool controls
         self.tool_var = tk.StringVar(value="pen")
         ttk.Radiobutton(controls, text="Pen", variable=self.tool_var, 
@@ -240,6 +341,19 @@ class MultilingualRecognitionApp:
                        variable=self.realtime_var,
                        command=self.toggle_realtime).pack(side=tk.LEFT, padx=5)
         
+        # Recognizer backend
+        ttk.Label(controls, text="Engine:").pack(side=tk.LEFT, padx=5)
+        # Only offer engines whose packages are installed
+        available = {engine.name for engine in ocr_registry.available()}
+        self.engine_var = ttk.Combobox(controls,
+                                    values=[label for label, name in self.recognizers.items()
+                                            if name is None or name in available],
+                                    state='readonly',
+                                    width=18)
+        self.engine_var.pack(side=tk.LEFT, padx=5)
+        self.engine_var.set("Auto")
+        self.engine_var.bind("<<ComboboxSelected>>", self.engine_changed)
+        
         ttk.Button(controls, text="Clear", command=self.clear_canvas).pack(side=tk.LEFT, padx=5)
         ttk.Button(controls, text="Upload", command=self.upload_image).pack(side=tk.LEFT, padx=5)
         ttk.Button(controls, text="Recognize", command=self.recognize_text).pack(side=tk.LEFT, padx=5)
@@ -318,27 +432,72 @@ class MultilingualRecognitionApp:
         target = self.target_lang.get()
         self.source_lang.set(target)
         self.target_lang.set(source)
+        self.source_changed()
 
     def update_tool(self):
         self.current_tool = self.tool_var.get()
         self.status_label.config(text=f"Tool: {self.current_tool.title()}")
 
+    def source_changed(self, event=None):
+        """Transcripts were read with the previous language, and the new one needs its model"""
+        self.line_cache = {}
+        self.mark_dirty()
+        self.warm_ocr_language()
+
+    def warm_ocr_language(self):
+        """Load the selected engine's model for the source language in the background"""
+        ocr_lang = self.languages[self.source_lang.get()]['ocr']
+        name = self.recognizers.get(self.engine_var.get())
+        if name is None or name == 'tesseract':
+            # Tesseract handles are per thread, so load one on a recognition worker
+            self.executor.submit(ocr_registry.get('tesseract').load, ocr_lang)
+        elif ocr_registry.get(name).supports(ocr_lang):
+            ocr_registry.warm(name, ocr_lang)
+
+    def engine_changed(self, event=None):
+        """Cached line transcripts came from the previous engine, so drop them"""
+        self.line_cache = {}
+        self.mark_dirty()
+        
+        # Load the engine's models in the background as soon as it is selected
+        self.warm_ocr_language()
+
+    def get_ocr_function(self, engine, real_time=False, lang='eng'):
+        """Return an ocr(processed, psm) callable for the selected backend
+        
+        'Auto' keeps real-time passes on the cheapest engine that fits the
+        budget and lets an explicit Recognize escalate to accurate ones.
+        """
+        name = self.recognizers.get(engine)
+        if name is None:
+            budget = REAL_TIME_BUDGET if real_time else ACCURATE_BUDGET
+            
+            def ocr(processed, psm=6, lang=lang):
+                result = self.ocr_router.recognize(processed, lang, budget,
+                                              prefer_accuracy=not real_time, psm=psm)
+                logging.debug(f"OCR by {result.engine}, confidence {result.confidence}")
+                return result.text
+            return ocr
+        
+        backend = ocr_registry.get(name)
+        return lambda processed, psm=6, lang=lang: backend.recognize(processed, lang, psm)[0]
+
     def toggle_realtime(self):
         self.real_time_active = self.realtime_var.get()
         if self.real_time_active:
             self.process_real_time()
 
     def process_real_time(self):
-        if self.real_time_active and self.stroke_completed:
+        if self.real_time_active and self.stroke_finished:
             current_time = time.time()
             if current_time - self.last_stroke_time >= self.stroke_delay:
                 self.recognize_text(real_time=True)
-                self.stroke_completed = False  # Reset for next stroke
-            if self.real_time_active:
-                self.root.after(100, self.process_real_time)
+                self.stroke_finished = False  # Reset for next stroke
+        if self.real_time_active:
+            self.root.after(100, self.process_real_time)
     
     def start_stroke(self, event):
-        self.stroke_completed = False
+        self.stroke_finished = False
         self.last_x = event.x
         self.last_y = event.y
 
@@ -355,6 +514,8 @@ class MultilingualRecognitionApp:
                 capstyle=tk.ROUND,
                 smooth=tk.TRUE
             )
+            self.draw_ink_segment(self.last_x, self.last_y, event.x, event.y, width,
+                                  0 if self.current_tool == "pen" else 255)
         self.last_x = event.x
         self.last_y = event.y
         
@@ -364,12 +525,55 @@ class MultilingualRecognitionApp:
                 self.recognize_text(real_time=True)
                 self.last_process_time = current_time
 
+    def reset_ink_buffer(self):
+        """Create a blank (white) off-screen raster matching the canvas size"""
+        self.ink_image = Image.new('L', (self.canvas_width, self.canvas_height), 255)
+        self.ink_draw = ImageDraw.Draw(self.ink_image)
+
+    def draw_ink_segment(self, x0, y0, x1, y1, width, fill):
+        """Mirror a canvas line segment into the off-screen raster"""
+        self.ink_draw.line((x0, y0, x1, y1), fill=fill, width=width)
+        # Round caps so consecutive segments join the way Tk draws them
+        radius = width / 2.0
+        for x, y in ((x0, y0), (x1, y1)):
+            self.ink_draw.ellipse((x - radius, y - radius, x + radius, y + radius), fill=fill)
+        
+        self.mark_dirty((
+            int(min(x0, x1) - radius) - 1,
+            int(min(y0, y1) - radius) - 1,
+            int(max(x0, x1) + radius) + 2,
+            int(max(y0, y1) + radius) + 2,
+        ))
+
+    def mark_dirty(self, bbox=None):
+        """Grow the region changed since the last real-time pass (None = whole canvas)"""
+        if bbox is None:
+            bbox = (0, 0, self.canvas_width, self.canvas_height)
+        if self.dirty_bbox is not None:
+            bbox = (
+                min(bbox[0], self.dirty_bbox[0]),
+                min(bbox[1], self.dirty_bbox[1]),
+                max(bbox[2], self.dirty_bbox[2]),
+                max(bbox[3], self.dirty_bbox[3]),
+            )
+        self.dirty_bbox = bbox
+        self.ink_version += 1
+
+    def get_canvas_image(self):
+        """Return the current canvas content as a grayscale numpy array"""
+        return np.array(self.ink_image)
+
     def reset_coordinates(self, event):
         self.last_x = None
         self.last_y = None
 
     def clear_canvas(self):
         self.canvas.delete("all")
+        self.reset_ink_buffer()
+        self.captured_image = None
+        self.upload_version = None
+        self.line_cache = {}
+        self.mark_dirty()
         self.recognized_text_label.config(text="No text recognized yet")
         self.translated_text_label.config(text="No translation available")
         self.description_label.config(text="No description available")
@@ -378,129 +582,240 @@ class MultilingualRecognitionApp:
         file_path = filedialog.askopenfilename(
             filetypes=[("Image files", "*.png *.jpg *.jpeg *.bmp *.gif *.tiff")])
         if file_path:
-            self.captured_image = cv2.imread(file_path)
+            try:
+                # Decoded at full resolution (reduced only for huge JPEG scans)
+                self.captured_image = load_page(file_path)
+            except Exception as e:
+                logging.error(f"Upload error: {e}")
+                messagebox.showerror("Error", f"Could not open image: {e}")
+                return
             self.display_image()
 
     def display_image(self):
         if self.captured_image is not None:
-            image = cv2.cvtColor(self.captured_image, cv2.COLOR_BGR2RGB)
-            image = Image.fromarray(image)
+            image = Image.fromarray(self.captured_image)
             image.thumbnail((800, 400))
             photo = ImageTk.PhotoImage(image)
             self.canvas.create_image(0, 0, image=photo, anchor=tk.NW)
             self.canvas.image = photo
+            
+            # Keep the off-screen raster in sync with what is shown
+            self.ink_image.paste(image.convert('L'), (0, 0))
+            self.mark_dirty()
+            self.upload_version = self.ink_version
 
     def recognize_text(self, real_time=False):
+        """Queue a recognition of the current canvas on the background worker"""
         try:
-            # Get the exact canvas coordinates
-            canvas_x = self.canvas.winfo_rootx()
-            canvas_y = self.canvas.winfo_rooty()
-            canvas_width = self.canvas.winfo_width()
-            canvas_height = self.canvas.winfo_height()
-            
-            # Add padding to capture area
-            padding = 10
-            image = ImageGrab.grab(bbox=(
-                canvas_x - padding,
-                canvas_y - padding,
-                canvas_x + canvas_width + padding,
-                canvas_y + canvas_height + padding
-            ))
+            # Snapshot everything the worker needs while we are on the Tk thread;
+            # an upload nobody has drawn on is read from the decoded file
+            full_page = (not real_time and self.captured_image is not None
+                         and self.upload_version == self.ink_version)
+            image = self.captured_image if full_page else self.get_canvas_image()
+            source_lang = self.source_lang.get()
+            target_lang = self.target_lang.get()
+            engine = self.engine_var.get()
+            ocr_lang = self.languages[source_lang]['ocr']
+            ocr = self.get_ocr_function(engine, real_time, ocr_lang)
+            script_detection = ocr_lang if self.detect_script_var.get() else None
+            # Canvas frames are memoized per engine, language pair and mode; real-time
+            # results come from the cheap per-line path and must not answer Recognize,
+            # and script detection may read the ink in another language
+            memo_context = None if full_page else (engine, source_lang, target_lang, real_time,
+                                                   script_detection is not None)
             
-            # Convert to numpy array and process
-            cv_image = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
+            self.recognition_generation += 1
+            generation = self.recognition_generation
             
-            # Process image
-            processed = enhance_image(cv_image)
-            if processed is None:
-                raise Exception("Image processing failed")
+            # A newer real-time request replaces a real-time one that has not started
+            # yet; an explicit Recognize is never cancelled
+            if real_time and self.real_time_future is not None:
+                self.real_time_future.cancel()
             
-            # Update OCR configuration for better edge detection
-            custom_config = (
-                '--oem 1 '  # LSTM OCR Engine
-                '--psm 6 '  # Assume uniform block of text
-                '-c tessedit_char_whitelist=ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789 '
-                '-c tessedit_write_images=1 '
-                '-c preserve_interword_spaces=1 '
-                '--dpi 300'  # Increase DPI for better recognition
-            )
+            # Real-time passes only re-OCR the lines touched since the last pass
+            incremental = None
+            if real_time:
+                incremental = (self.dirty_bbox, dict(self.line_cache), self.ink_version)
             
-            # Perform OCR with increased page segmentation
-            text = pytesseract.image_to_string(
-                processed,
-                config=custom_config,
-                timeout=5
+            future = self.executor.submit(
+                self.run_recognition, generation, image, source_lang, target_lang,
+                real_time, incremental, ocr, full_page, memo_context, script_detection
             )
-            text = ' '.join(text.strip().split())  # Clean up whitespace
-            
-            if not text.strip():
-                if not real_time:
-                    messagebox.showinfo("Info", "No text detected")
-                return
-            
-            # Update UI
-            self.recognized_text_label.config(text=text)
-            
-            # Handle translation
-            if text.strip():
-                try:
-                    source_lang = self.source_lang.get()
-                    target_lang = self.target_lang.get()
+            if real_time:
+                self.real_time_future = future
+        except Exception as e:
+            logging.error(f"Recognition error: {e}")
+            if not real_time:
+                messagebox.showerror("Error", str(e))
+
+    def is_stale(self, generation, real_time):
+        """Real-time requests are abandoned as soon as a newer request arrives"""
+        return real_time and generation != self.recognition_generation
+
+    def run_recognition(self, generation, image, source_lang, target_lang, real_time,
+                        incremental=None, ocr=run_ocr, full_page=False, memo_context=None,
+                        script_detection=None):
+        """Worker side of recognize_text: OCR, translation and lookups off the Tk thread"""
+        result = {'text': None, 'translation': None, 'description': None,
+                  'error': None, 'warning': None, 'line_cache': None, 'ink_version': None}
+        metrics.increment('recognitions_real_time' if real_time else 'recognitions')
+        with metrics.profiled('recognition'), metrics.span('recognition'):
+            try:
+                frame = memoized = processed = None
+                if memo_context is not None:
+                    # The raw canvas ink is hashed before any preprocessing or OCR
+                    frame = canvas_hash(image)
+                    memoized = self.frame_memo.lookup(frame, memo_context)
+                
+                if memoized is not None:
+                    # Unchanged ink: reuse OCR, translation, descriptions and line transcripts
+                    result.update(memoized)
+                    if incremental is not None:
+                        result['ink_version'] = incremental[2]
+                    logging.debug(f"Frame memo hit, {self.frame_memo.skip_rate:.0%} of "
+                                  f"canvas recognitions skipped")
+                else:
+                    if incremental is None and not full_page:
+                        # Whole-canvas OCR reads the preprocessed frame
+                        with metrics.span('preprocess'):
+                            processed = preprocess(image)
+                        if processed is None:
+                            raise Exception("Image processing failed")
                     
-                    # Perform translation
-                    translation = self.translator.translate(
-                        text,
-                        src=self.languages[source_lang]['translate'],
-                        dest=self.languages[target_lang]['translate']
-                    )
+                    if script_detection is not None:
+                        # OCR with the model of the script actually written
+                        lang = self.detect_language(image, processed, script_detection)
+                        if lang != script_detection:
+                            ocr = partial(ocr, lang=lang)
                     
-                    # Update translation display
-                    if translation and translation.text:
-                        self.translated_text_label.config(text=translation.text)
-                        
-                        # Get pronunciation guide
-                        target_lang_code = self.languages[target_lang]['translate']
-                        pronunciation = self.get_pronunciation_guide(translation.text, target_lang_code)
-                        
-                        # Get word descriptions
-                        words = translation.text.split()
-                        descriptions = []
-                        
-                        for word in words[:3]:
-                            desc = self.get_word_description(word, target_lang_code)
-                            if desc:
-                                descriptions.append(f"\n{word}:\n{desc}")
-                        
-                        # Update description label
-                        full_text = f"Language: {target_lang}\n"
-                        if pronunciation:
-                            full_text += f"{pronunciation}\n"
-                        if descriptions:
-                            full_text += "\nDefinitions:" + "".join(descriptions)
-                        else:
-                            full_text += "\nNo detailed definitions available."
-                        
-                        self.description_label.config(text=full_text)
-                        
+                    if incremental is not None:
+                        dirty_bbox, line_cache, ink_version = incremental
+                        text, result['line_cache'] = incremental_ocr(image, dirty_bbox,
+                                                                     line_cache, ocr)
+                        result['ink_version'] = ink_version
+                    elif full_page:
+                        # Tiles of the full-resolution page, OCR'd in parallel
+                        text = recognize_page(image, ocr, self.tile_executor)
                     else:
-                        logging.warning("Translation returned empty result")
-                        if not real_time:
-                            messagebox.showwarning("Warning", "Translation failed")
-                            
-                except Exception as e:
-                    logging.error(f"Translation error: {str(e)}")
-                    if not real_time:
-                        messagebox.showerror("Translation Error", 
-                                           f"Failed to translate text: {str(e)}")
-                    self.translated_text_label.config(text="Translation error occurred")
+                        # Perform OCR on the whole page as a uniform block of text
+                        with metrics.span('ocr'):
+                            text = ocr(processed, psm=6)
+                    result['text'] = text
                     
+                    if text and not self.is_stale(generation, real_time):
+                        self.translate_recognized_text(result, source_lang, target_lang)
+                    
+                    # Only complete results are worth reusing
+                    complete = not text or result['description'] is not None
+                    if (frame is not None and complete
+                            and not result['error'] and not result['warning']):
+                        self.frame_memo.store(frame, memo_context, {
+                            'text': result['text'],
+                            'translation': result['translation'],
+                            'description': result['description'],
+                            'line_cache': result['line_cache'],
+                        })
+            except Exception as e:
+                logging.error(f"Recognition error: {e}")
+                metrics.increment('recognition_errors')
+                result['error'] = ("Error", str(e))
+        
+        if self.is_stale(generation, real_time):
+            metrics.increment('stale_results_dropped')
+        else:
+            self.root.after(0, self.apply_recognition_result, generation, result, real_time)
+        return result
+
+    def detect_language(self, image, processed, selected):
+        """OCR language for the ink's script, falling back to the selected one"""
+        if processed is None:
+            # Full-resolution upload: a canvas-sized copy is plenty for OSD
+            step = -(-max(image.shape[:2]) // 1600)
+            processed = preprocess(image[::step, ::step])
+            if processed is None:
+                return selected
+        with metrics.span('script_detection'):
+            # OSD expects dark text on a light page
+            script, confidence = ocr_pool.detect_script(255 - processed)
+        lang = resolve_language(selected, script, confidence)
+        if lang != selected:
+            logging.info(f"Detected {script} script ({confidence:.1f}), reading as '{lang}'")
+        return lang
+
+    def translate_recognized_text(self, result, source_lang, target_lang):
+        """Fill in translation, pronunciation and descriptions for a recognition result"""
+        try:
+            # Perform translation line by line; only lines missing from the
+            # cache are requested, all of them in one round trip
+            translation = self.translator.get().translate(
+                result['text'],
+                self.languages[source_lang]['translate'],
+                self.languages[target_lang]['translate']
+            )
+            logging.debug(f"Translation cache: {self.translation_cache.hits} hits, "
+                          f"{self.translation_cache.misses} misses")
+            
+            if translation:
+                result['translation'] = translation
+                
+                # Pronunciation guide and word descriptions, looked up concurrently
+                target_lang_code = self.languages[target_lang]['translate']
+                with metrics.span('lookups'):
+                    pronunciation, word_descriptions = self.lookups.get().describe(
+                        translation, target_lang_code, max_words=3
+                    )
+                descriptions = [f"\n{word}:\n{desc}" for word, desc in word_descriptions]
+                
+                full_text = f"Language: {target_lang}\n"
+                if pronunciation:
+                    full_text += f"{pronunciation}\n"
+                if descriptions:
+                    full_text += "\nDefinitions:" + "".join(descriptions)
+                else:
+                    full_text += "\nNo detailed definitions available."
+                
+                result['description'] = full_text
+            else:
+                logging.warning("Translation returned empty result")
+                result['warning'] = ("Warning", "Translation failed")
+                
         except Exception as e:
-            logging.error(f"Recognition error: {e}")
+            logging.error(f"Translation error: {str(e)}")
+            result['translation'] = "Translation error occurred"
+            result['error'] = ("Translation Error", f"Failed to translate text: {str(e)}")
+
+    def apply_recognition_result(self, generation, result, real_time):
+        """Show a finished recognition on the Tk thread, dropping out-of-date results"""
+        if generation < self.applied_generation or self.is_stale(generation, real_time):
+            return
+        self.applied_generation = generation
+        
+        if result['line_cache'] is not None:
+            self.line_cache = result['line_cache']
+            # Strokes drawn while the pass was running stay dirty for the next one
+            if result['ink_version'] == self.ink_version:
+                self.dirty_bbox = None
+        
+        if result['text']:
+            self.recognized_text_label.config(text=result['text'])
+        elif not result['error']:
             if not real_time:
-                messagebox.showerror("Error", str(e))
+                messagebox.showinfo("Info", "No text detected")
+            return
+        
+        if result['translation']:
+            self.translated_text_label.config(text=result['translation'])
+        if result['description']:
+            self.description_label.config(text=result['description'])
+        
+        if not real_time:
+            if result['error']:
+                messagebox.showerror(*result['error'])
+            elif result['warning']:
+                messagebox.showwarning(*result['warning'])
 
     def stroke_completed(self, event):
-        self.stroke_completed = True
+        self.stroke_finished = True
         self.last_stroke_time = time.time()
         self.reset_coordinates(event)
         
@@ -516,204 +831,119 @@ class MultilingualRecognitionApp:
             text = self.translated_text_label.cget("text")
             if text and text != "No translation available":
                 # Stop any currently playing audio
+                mixer = self.audio.get()
                 if self.audio_playing:
-                    pygame.mixer.music.stop()
+                    mixer.music.stop()
                     self.audio_playing = False
                 
-                # Generate unique filename
-                temp_file = os.path.join(
-                    self.temp_audio_dir,
-                    f"pronunciation_{uuid.uuid4().hex[:8]}.mp3"
-                )
+                # Synthesized audio is cached by (text, language) and played from memory
+                lang = self.languages[self.target_lang.get()]['translate']
+                with metrics.span('tts'):
+                    audio = self.audio_cache.open(text, lang)
+                mixer.music.load(audio, 'mp3')
+                mixer.music.play()
+                self.audio_playing = True
+                self.current_audio = audio  # Keep the buffer alive while it plays
                 
-                # Clean up old files
-                self.cleanup_old_audio_files()
-                
-                try:
-                    # Generate speech
-                    tts = gTTS(
-                        text=text,
-                        lang=self.languages[self.target_lang.get()]['translate'],
-                        slow=False
-                    )
-                    
-                    # Save with error handling
-                    for _ in range(3):  # Retry up to 3 times
-                        try:
-                            tts.save(temp_file)
-                            break
-                        except PermissionError:
-                            time.sleep(0.1)  # Wait briefly before retry
-                    
-                    # Load and play the audio
-                    if os.path.exists(temp_file) and os.path.getsize(temp_file) > 0:
-                        pygame.mixer.music.load(temp_file)
-                        pygame.mixer.music.play()
-                        self.audio_playing = True
-                        self.current_audio = temp_file
-                        
-                        # Schedule cleanup
-                        self.root.after(100, self.check_audio_finished)
-                    else:
-                        raise Exception("Failed to generate audio file")
-                        
-                except Exception as e:
-                    logging.error(f"Audio generation error: {e}")
-                    self.cleanup_audio_file(temp_file)
-                    raise
+                self.root.after(100, self.check_audio_finished)
                     
         except Exception as e:
             logging.error(f"Pronunciation error: {e}")
             messagebox.showerror("Error", "Failed to play pronunciation. Please try again.")
     
     def check_audio_finished(self):
-        """Check if audio has finished playing and clean up"""
-        if self.audio_playing and not pygame.mixer.music.get_busy():
+        """Check if audio has finished playing and release its buffer"""
+        if self.audio_playing and not self.audio.get().music.get_busy():
             self.audio_playing = False
-            if self.current_audio:
-                self.cleanup_audio_file(self.current_audio)
-                self.current_audio = None
+            self.current_audio = None
         elif self.audio_playing:
             # Check again in 100ms if still playing
             self.root.after(100, self.check_audio_finished)
     
-    def cleanup_audio_file(self, filepath):
-        """Safely clean up an audio file"""
-        try:
-            if os.path.exists(filepath):
-                os.remove(filepath)
-        except Exception as e:
-            logging.warning(f"Failed to cleanup audio file {filepath}: {e}")
-    
-    def cleanup_old_audio_files(self):
-        """Clean up old audio files from temp directory"""
-        try:
-            current_time = time.time()
-            for filename in os.listdir(self.temp_audio_dir):
-                filepath = os.path.join(self.temp_audio_dir, filename)
-                # Remove files older than 1 hour
-                if os.path.getctime(filepath) < current_time - 3600:
-                    self.cleanup_audio_file(filepath)
-        except Exception as e:
-            logging.warning(f"Failed to cleanup old audio files: {e}")
-    
     def __del__(self):
         """Cleanup on application exit"""
         try:
+            # Stop the recognition worker and release the OCR engines
+            if hasattr(self, 'executor'):
+                self.executor.shutdown(wait=False, cancel_futures=True)
+            if hasattr(self, 'tile_executor'):
+                self.tile_executor.shutdown(wait=False, cancel_futures=True)
+            ocr_registry.close()
+            ocr_pool.close()
+            if hasattr(self, 'translation_cache'):
+                self.translation_cache.close()
+            if hasattr(self, 'lookups') and self.lookups.loaded:
+                self.lookups.get().close()
+            
             # Stop any playing audio
             if hasattr(self, 'audio_playing') and self.audio_playing:
-                pygame.mixer.music.stop()
-            
-            # Clean up temp directory
-            if hasattr(self, 'temp_audio_dir') and os.path.exists(self.temp_audio_dir):
-                for filename in os.listdir(self.temp_audio_dir):
-                    self.cleanup_audio_file(os.path.join(self.temp_audio_dir, filename))
-                try:
-                    os.rmdir(self.temp_audio_dir)
-                except:
-                    pass
+                self.audio.get().music.stop()
         except:
             pass
 
-    def get_word_description(self, word, lang_code):
-        """Enhanced word description using free APIs"""
-        descriptions = []
-        
-        # Try Free Dictionary API first
-        try:
-            url = f"https://api.dictionaryapi.dev/api/v2/entries/{lang_code}/{quote(word.lower())}"
-            response = requests.get(url)
-            if response.status_code == 200:
-                data = response.json()
-                if data and len(data) > 0:
-                    meanings = data[0].get('meanings', [])
-                    if meanings:
-                        for meaning in meanings[:2]:
-                            pos = meaning.get('partOfSpeech', '')
-                            definition = meaning.get('definitions', [{}])[0].get('definition', '')
-                            if definition:
-                                descriptions.append(f"({pos}) {definition}")
-                                # Add example if available
-                                example = meaning.get('definitions', [{}])[0].get('example', '')
-                                if example:
-                                    descriptions.append(f"   Example: {example}")
-        except Exception as e:
-            logging.error(f"Free Dictionary API error: {e}")
+    def create_translator(self):
+        """Batched, cached translator over LibreTranslate or googletrans"""
+        from batch_translation import BatchTranslator
+        from translation_backends import GoogletransBackend, LibreTranslateBackend
+        if self.libretranslate_url:
+            backend = LibreTranslateBackend(self.libretranslate_url,
+                                            os.environ.get('LIBRETRANSLATE_API_KEY'))
+        else:
+            backend = GoogletransBackend()
+            backend.client  # Import googletrans now rather than on the first translation
+        return BatchTranslator(backend, self.translation_cache)
 
-        # Try Wiktionary API as backup
-        if not descriptions:
-            try:
-                url = f"https://en.wiktionary.org/w/api.php"
-                params = {
-                    'action': 'parse',
-                    'format': 'json',
-                    'page': word.lower(),
-                    'prop': 'wikitext',
-                    'section': 0
-                }
-                response = requests.get(url, params=params)
-                if response.status_code == 200:
-                    data = response.json()
-                    if 'parse' in data and 'wikitext' in data['parse']:
-                        wikitext = data['parse']['wikitext']['*']
-                        parsed = wtp.parse(wikitext)
-                        # Extract definitions from wikitext
-                        for section in parsed.sections:
-                            if 'Etymology' in section.title or 'Definitions' in section.title:
-                                clean_text = html.unescape(section.plain_text())
-                                if clean_text:
-                                    descriptions.append(clean_text[:200] + "...")  # Limit length
-                                break
-            except Exception as e:
-                logging.error(f"Wiktionary API error: {e}")
+    def create_lookups(self):
+        """Pooled dictionary/IPA client (imports requests and wikitextparser)"""
+        from dictionary_lookups import LookupClient
+        return LookupClient(offline=self.load_offline_dictionary())
 
-        # Try MyMemory API as final fallback
-        if not descriptions:
-            try:
-                url = f"https://api.mymemory.translated.net/get?q={quote(word)}&langpair={lang_code}|en"
-                response = requests.get(url)
-                if response.status_code == 200:
-                    data = response.json()
-                    if data.get('matches'):
-                        for match in data['matches'][:2]:
-                            if match.get('translation') and match.get('quality', '0') != '0':
-                                descriptions.append(f"≈ {match['translation']}")
-            except Exception as e:
-                logging.error(f"MyMemory API error: {e}")
+    def init_audio(self):
+        """Import pygame and open the mixer once, with the playback settings"""
+        import pygame
+        pygame.mixer.init(frequency=44100, size=-16, channels=2, buffer=4096)
+        return pygame.mixer
 
-        return '\n'.join(descriptions) if descriptions else None
+    def startup_finished(self):
+        """First idle moment of the event loop: the window is up and responsive"""
+        startup.mark('interactive')
+        logging.info(f"Startup: {startup.report()}")
+        ocr_lang = self.languages[self.source_lang.get()]['ocr']
+        threading.Thread(target=self.warm_up, args=(ocr_lang,), name='warm-up',
+                         daemon=True).start()
 
-    def get_pronunciation_guide(self, text, lang_code):
-        """Get pronunciation guide using LibreTranslate"""
+    def warm_up(self, ocr_lang):
+        """Load the deferred subsystems in the background, most needed first"""
+        start = time.perf_counter()
+        # Tesseract handles are per thread, so warm one on a recognition worker
+        self.executor.submit(ocr_registry.get('tesseract').load, ocr_lang)
+        for subsystem in (self.lookups, self.translator, self.audio):
+            subsystem.warm()
+        logging.info(f"Background warm-up finished in {time.perf_counter() - start:.2f}s")
+
+    def load_offline_dictionary(self):
+        """Open the offline dictionary built with offline_dictionary.py, if present"""
+        path = os.path.join(self.cache_dir, 'dictionary.sqlite3')
+        if not os.path.exists(path):
+            return None
         try:
-            # Try to get IPA pronunciation from Wiktionary
-            url = f"https://en.wiktionary.org/w/api.php"
-            params = {
-                'action': 'parse',
-                'format': 'json',
-                'page': text.lower(),
-                'prop': 'wikitext',
-                'section': 0
-            }
-            response = requests.get(url, params=params)
-            if response.status_code == 200:
-                data = response.json()
-                if 'parse' in data and 'wikitext' in data['parse']:
-                    wikitext = data['parse']['wikitext']['*']
-                    # Look for IPA pronunciation
-                    if '{{IPA|' in wikitext:
-                        ipa_start = wikitext.find('{{IPA|') + 6
-                        ipa_end = wikitext.find('}}', ipa_start)
-                        if ipa_end > ipa_start:
-                            return f"IPA: {wikitext[ipa_start:ipa_end]}"
-            
-            # Fallback to simplified pronunciation guide
-            return f"Pronunciation available through 'Listen' button"
-            
+            return OfflineDictionary(path)
         except Exception as e:
-            logging.error(f"Pronunciation guide error: {e}")
+            logging.warning(f"Offline dictionary unavailable: {e}")
             return None
 
+    def get_word_description(self, word, lang_code):
+        """Enhanced word description using free APIs"""
+        with metrics.span('descriptions'):
+            _, descriptions = self.lookups.get().describe(word, lang_code, max_words=1)
+        return descriptions[0][1] if descriptions else None
+
+    def get_pronunciation_guide(self, text, lang_code):
+        """Get an IPA pronunciation guide from Wiktionary"""
+        with metrics.span('ipa'):
+            pronunciation, _ = self.lookups.get().describe(text, lang_code, max_words=0)
+        return pronunciation
+
 def main():
     root = tk.Tk()
     app = MultilingualRecognitionApp(root)
@@ -0,0 +1,148 @@
+"""Recognize directories of scanned images from the command line
+
+Images are spread over a process pool (one worker per core by default),
+each worker keeping its OCR engine and translation cache warm. Results are
+appended to a JSON-lines file as soon as each image finishes, one
+``{"path", "text", "translation", "error", "seconds"}`` record per line,
+so an interrupted run is resumed by starting it again with the same output
+file: images that already have a record are skipped. With ``--retry-errors``
+the records with an error are removed from the file first, so every image
+ends up with exactly one record.
+
+Usage:
+    python batch_recognize.py scans/ --output results.jsonl
+    python batch_recognize.py "forms/**/*.png" --translate-to es --workers 8
+    python batch_recognize.py scans/ --output results.jsonl --retry-errors
+"""
+import argparse
+import glob
+import json
+import logging
+import multiprocessing
+import os
+import time
+
+from batch_translation import BatchTranslator
+from pipeline import ENGINES, recognize_image
+from translation_backends import GoogletransBackend, LibreTranslateBackend
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.gif', '.tif', '.tiff')
+
+# Per-process settings, filled in by init_worker
+_worker = {}
+
+
+def find_images(inputs):
+    """Expand directories (recursively) and glob patterns into a sorted list of images"""
+    paths = set()
+    for pattern in inputs:
+        if os.path.isdir(pattern):
+            for directory, _, files in os.walk(pattern):
+                paths.update(os.path.join(directory, name) for name in files
+                             if name.lower().endswith(IMAGE_EXTENSIONS))
+        else:
+            paths.update(path for path in glob.glob(pattern, recursive=True)
+                         if path.lower().endswith(IMAGE_EXTENSIONS))
+    return sorted(os.path.abspath(path) for path in paths)
+
+
+def load_finished(output, retry_errors=False):
+    """Paths already recorded in ``output``; a partly written last line is cut off
+
+    With ``retry_errors``, error records are dropped from the file so the
+    images can be run again without leaving a superseded record behind.
+    """
+    finished = set()
+    if not os.path.exists(output):
+        return finished
+    with open(output, 'rb+') as f:
+        data = f.read()
+        end = data.rfind(b'\n') + 1
+        if end < len(data):
+            f.truncate(end)  # Interrupted mid-write
+    kept = []
+    for line in data[:end].splitlines():
+        try:
+            record = json.loads(line)
+        except ValueError:
+            continue
+        if retry_errors and record.get('error'):
+            continue
+        finished.add(record['path'])
+        kept.append(line)
+    if retry_errors and len(kept) < len(data[:end].splitlines()):
+        # Written aside and swapped in, so an interruption cannot lose records
+        with open(output + '.tmp', 'wb') as f:
+            f.writelines(line + b'\n' for line in kept)
+        os.replace(output + '.tmp', output)
+    return finished
+
+
+def init_worker(engine, lang, src, dest, libretranslate_url):
+    # Tesseract's OpenMP threads would oversubscribe a pool that already uses every core
+    os.environ['OMP_THREAD_LIMIT'] = '1'
+    translator = None
+    if dest:
+        backend = (LibreTranslateBackend(libretranslate_url) if libretranslate_url
+                   else GoogletransBackend())
+        translator = BatchTranslator(backend)
+    _worker.update(engine=engine, lang=lang, src=src, dest=dest, translator=translator)
+
+
+def process_image(path):
+    """Worker task: one JSON-serializable record per image, errors included"""
+    start = time.perf_counter()
+    record = {'path': path, 'text': None, 'translation': None, 'error': None}
+    try:
+        record.update(recognize_image(path, _worker['engine'], _worker['lang'],
+                                      _worker['translator'], _worker['src'], _worker['dest'],
+                                      tile_workers=1))
+    except Exception as e:
+        record['error'] = str(e)
+    record['seconds'] = round(time.perf_counter() - start, 4)
+    return record
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch handwriting recognition")
+    parser.add_argument('inputs', nargs='+', help="Image directories or glob patterns")
+    parser.add_argument('--output', default='results.jsonl', help="JSON-lines result file")
+    parser.add_argument('--engine', choices=ENGINES, default='tesseract')
+    parser.add_argument('--lang', default='eng', help="Tesseract language code")
+    parser.add_argument('--translate-to', default=None, help="Target language code")
+    parser.add_argument('--source', default='en', help="Source language code")
+    parser.add_argument('--libretranslate-url', default=None,
+                        help="Translate through this LibreTranslate endpoint instead of Google")
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--chunksize', type=int, default=4)
+    parser.add_argument('--retry-errors', action='store_true',
+                        help="Run images whose earlier record has an error again")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    images = find_images(args.inputs)
+    finished = load_finished(args.output, args.retry_errors)
+    pending = [path for path in images if path not in finished]
+    logging.info(f"{len(images)} images, {len(images) - len(pending)} already done, "
+                 f"{len(pending)} to go on {args.workers} workers")
+    if not pending:
+        return
+
+    start = time.time()
+    done = errors = 0
+    initargs = (args.engine, args.lang, args.source, args.translate_to, args.libretranslate_url)
+    with open(args.output, 'a', encoding='utf-8') as out, \
+            multiprocessing.Pool(args.workers, init_worker, initargs) as pool:
+        for record in pool.imap_unordered(process_image, pending, args.chunksize):
+            out.write(json.dumps(record, ensure_ascii=False) + '\n')
+            out.flush()
+            done += 1
+            errors += bool(record['error'])
+            if done % 100 == 0 or done == len(pending):
+                rate = done / (time.time() - start)
+                logging.info(f"{done}/{len(pending)} images ({errors} errors), "
+                             f"{rate:.1f} images/s")
+
+
+if __name__ == "__main__":
+    main()
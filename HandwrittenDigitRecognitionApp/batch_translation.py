@@ -0,0 +1,169 @@
+"""Segmented, deduplicated and coalesced translation
+
+A recognized page used to be translated as one opaque string, and batch jobs
+made one round trip per page. ``BatchTranslator`` splits text into segments
+(lines and sentences) and translates only the segments the cache does not
+already hold, each distinct segment once. Misses go to the backend's
+``translate_batch`` in chunks, so a page costs one request instead of one
+per line. A segment another caller is already translating is not requested
+again: the second caller waits for the first caller's result. The
+translations are then put back together with the original separators, so
+line and paragraph breaks survive. A segment that fails to translate is kept
+in the source language rather than losing the rest of the page.
+"""
+import logging
+import re
+import threading
+from concurrent.futures import Future
+
+from instrumentation import metrics
+from translation_cache import TranslationCache, normalize_text
+
+# Line breaks, and the whitespace after sentence-ending punctuation
+_SEGMENT_BREAK = re.compile(r'(\s*\n\s*|(?<=[.!?])\s+)')
+
+
+def split_segments(text):
+    """Return (segments, separators); separators[i] follows segments[i] verbatim"""
+    parts = _SEGMENT_BREAK.split(text.strip())
+    return parts[0::2], parts[1::2]
+
+
+def join_segments(segments, separators):
+    return ''.join(segment + separator
+                   for segment, separator in zip(segments, separators + ['']))
+
+
+class BatchTranslator:
+    """Cached translation through a backend, one bulk request per batch of misses"""
+
+    def __init__(self, backend, cache=None, max_segments=50, max_chars=4500, timeout=30.0):
+        self.backend = backend
+        self.cache = cache or TranslationCache()
+        self.max_segments = max_segments
+        self.max_chars = max_chars
+        self.timeout = timeout
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def translate(self, text, src, dest):
+        """Translate ``text``; None only when none of its segments could be translated"""
+        return self.translate_many([text], src, dest)[0]
+
+    def translate_many(self, texts, src, dest):
+        """Translate several texts, sharing requests between all their segments"""
+        with metrics.span('translate'):
+            splits = [split_segments(text) for text in texts]
+            translated = iter(self.translate_segments(
+                [segment for segments, _ in splits for segment in segments], src, dest))
+
+            results = []
+            for segments, separators in splits:
+                parts = [next(translated) for _ in segments]
+                if all(part is None for part in parts) and any(segments):
+                    results.append(None)
+                    continue
+                if None in parts:
+                    metrics.increment('translation_partial')
+                    logging.warning(f"{parts.count(None)} of {len(parts)} segments were "
+                                    f"not translated and are kept as written")
+                parts = [segment if part is None else part
+                         for segment, part in zip(segments, parts)]
+                results.append(join_segments(parts, separators))
+            return results
+
+    def translate_segments(self, segments, src, dest):
+        """Translations of ``segments`` in order, None where a translation failed"""
+        results = {}
+        owned = []
+        waiting = {}
+        for segment in dict.fromkeys(normalize_text(segment) for segment in segments):
+            if not segment:
+                results[segment] = ''
+                continue
+            cached = self.cache.get(segment, src, dest)
+            if cached is not None:
+                results[segment] = cached
+                continue
+            key = (segment, src, dest)
+            with self._lock:
+                future = self._in_flight.get(key)
+                if future is None:
+                    future = self._in_flight[key] = Future()
+                    owned.append(segment)
+                else:
+                    metrics.increment('translation_coalesced')
+            waiting[segment] = future
+
+        if owned:
+            self._translate_owned(owned, src, dest)
+        for segment, future in waiting.items():
+            results[segment] = future.result(timeout=self.timeout)
+        return [results[normalize_text(segment)] for segment in segments]
+
+    def _translate_owned(self, segments, src, dest):
+        """Request the segments this caller registered and publish the results"""
+        done = 0
+        try:
+            for chunk in self._chunks(segments):
+                for segment, translation in zip(chunk, self._request(chunk, src, dest)):
+                    if translation:
+                        self.cache.put(segment, src, dest, translation)
+                    self._finish(segment, src, dest, result=translation or None)
+                    done += 1
+        except BaseException as e:
+            # Whoever waits on the rest gets the same error instead of hanging
+            for segment in segments[done:]:
+                self._finish(segment, src, dest, error=e)
+            raise
+
+    def _request(self, chunk, src, dest):
+        """Translations of one chunk, None for each segment that could not be translated"""
+        with metrics.span('translate_request'):
+            if not hasattr(self.backend, 'translate_batch'):
+                return [self._translate_one(segment, src, dest) for segment in chunk]
+            try:
+                translations = list(self.backend.translate_batch(chunk, src, dest))
+            except Exception as e:
+                metrics.increment('translation_errors')
+                logging.warning(f"Could not translate a request of {len(chunk)} segments: {e}")
+                return [None] * len(chunk)
+        metrics.increment('translation_segments', len(chunk))
+        if len(translations) != len(chunk):
+            # Which segment a translation belongs to is unknown, so none is used
+            metrics.increment('translation_errors')
+            logging.warning(f"The backend returned {len(translations)} translations "
+                            f"for {len(chunk)} segments")
+            return [None] * len(chunk)
+        return translations
+
+    def _translate_one(self, segment, src, dest):
+        metrics.increment('translation_segments')
+        try:
+            return self.backend.translate(segment, src, dest)
+        except Exception as e:
+            metrics.increment('translation_errors')
+            logging.warning(f"Could not translate a segment: {e}")
+            return None
+
+    def _finish(self, segment, src, dest, result=None, error=None):
+        with self._lock:
+            future = self._in_flight.pop((segment, src, dest))
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def _chunks(self, segments):
+        """Split into requests of at most ``max_segments`` segments and ``max_chars``"""
+        chunk = []
+        size = 0
+        for segment in segments:
+            if chunk and (len(chunk) >= self.max_segments
+                          or size + len(segment) > self.max_chars):
+                yield chunk
+                chunk, size = [], 0
+            chunk.append(segment)
+            size += len(segment) + 1
+        if chunk:
+            yield chunk
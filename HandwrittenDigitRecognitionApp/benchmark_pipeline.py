@@ -0,0 +1,256 @@
+"""Headless per-stage latency benchmark of the recognition pipeline
+
+Synthetic handwriting is composited from EMNIST test glyphs onto images the
+size of the drawing canvas, then every stage of ``recognize_text`` is timed
+on its own and as a whole:
+
+    capture       copy of the canvas raster (``get_canvas_image``)
+    preprocess    ``preprocessing.preprocess`` (``enhance_image``)
+    ocr           Tesseract through the engine pool, or a CNN recognizer
+    translate     one translation request, uncached
+    pronunciation IPA guide lookup (``get_pronunciation_guide``)
+    descriptions  one lookup per word (``get_word_description``)
+    pipeline      the whole flow the app runs for one recognition
+
+Translation and dictionary APIs are replaced by a local stub server with a
+configurable response delay, so runs are reproducible offline. Reports
+p50/p95/p99 latency and throughput per stage.
+
+Usage:
+    python benchmark_pipeline.py --runs 200 --stub-latency 20
+    python benchmark_pipeline.py --engine emnist --split balanced --output bench.json
+"""
+import argparse
+import json
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+import numpy as np
+from PIL import Image
+
+from dictionary_lookups import LookupClient
+from emnist_dataset import load_split
+from preprocessing import preprocess
+from translation_backends import LibreTranslateBackend
+
+CANVAS_SIZE = (800, 400)
+STAGES = ('capture', 'preprocess', 'ocr', 'translate', 'pronunciation', 'descriptions',
+          'pipeline')
+
+
+class StubApiHandler(BaseHTTPRequestHandler):
+    """Canned LibreTranslate, Free Dictionary, Wiktionary and MyMemory responses"""
+
+    latency = 0.0
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, data, status=200):
+        time.sleep(self.latency)
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        payload = json.loads(self.rfile.read(length) or b'{}')
+        if urlparse(self.path).path != '/translate':
+            return self._send_json({'error': 'Not found'}, 404)
+        query = payload.get('q', '')
+        if isinstance(query, list):
+            return self._send_json({'translatedText': [text.upper() for text in query]})
+        return self._send_json({'translatedText': query.upper()})
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        if url.path.startswith('/api/v2/entries/'):
+            word = unquote(url.path.rsplit('/', 1)[-1])
+            return self._send_json([{'word': word, 'meanings': [{
+                'partOfSpeech': 'noun',
+                'definitions': [{'definition': f'Stub definition of {word}.',
+                                 'example': f'An example with {word}.'}],
+            }]}])
+        if url.path == '/w/api.php':
+            page = params.get('page', '')
+            wikitext = (f"{{{{IPA|en|/{page}/}}}}\n"
+                        f"===Etymology===\nStub etymology of {page}.\n")
+            return self._send_json({'parse': {'title': page, 'wikitext': {'*': wikitext}}})
+        if url.path == '/get':
+            return self._send_json({'matches': [
+                {'translation': params.get('q', ''), 'quality': '80'}
+            ]})
+        return self._send_json({'error': 'Not found'}, 404)
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # The lookup client opens up to ten connections at once
+    request_queue_size = 64
+
+
+def start_stub_server(latency=0.0):
+    """Serve the stub APIs on a free local port; returns (server, base url)"""
+    handler = type('Handler', (StubApiHandler,), {'latency': latency})
+    server = StubServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+class SyntheticPages:
+    """Canvas-sized pages of black handwriting composited from EMNIST glyphs"""
+
+    def __init__(self, split='mnist', glyph_height=48, seed=0):
+        images, labels = load_split(split, 'test')
+        self.glyphs = images[:, :, :, 0]
+        self.labels = labels
+        self.glyph_height = glyph_height
+        self.rng = np.random.default_rng(seed)
+
+    def glyph(self, index):
+        # EMNIST stores glyphs transposed and white on black
+        glyph = Image.fromarray(255 - np.ascontiguousarray(self.glyphs[index].T))
+        scale = self.glyph_height * self.rng.uniform(0.85, 1.15) / 28
+        return glyph.resize((int(28 * scale), int(28 * scale)), Image.BILINEAR)
+
+    def page(self, lines=3, words_per_line=3, letters_per_word=4):
+        """Return a grayscale PIL page and the number of glyphs on it"""
+        page = Image.new('L', CANVAS_SIZE, 255)
+        count = 0
+        y = 30
+        for _ in range(lines):
+            x = 30
+            for _ in range(words_per_line):
+                for _ in range(letters_per_word):
+                    glyph = self.glyph(self.rng.integers(len(self.glyphs)))
+                    if x + glyph.width > CANVAS_SIZE[0] - 20:
+                        break
+                    offset = int(self.rng.integers(-4, 5))
+                    # Darken-combine so overlapping glyphs keep their ink
+                    box = (x, y + offset, x + glyph.width, y + offset + glyph.height)
+                    page.paste(Image.fromarray(np.minimum(
+                        np.array(page.crop(box)), np.array(glyph))), box[:2])
+                    x += glyph.width - int(self.rng.integers(2, 8))
+                    count += 1
+                x += self.glyph_height // 2
+            y += int(self.glyph_height * 1.6)
+        return page, count
+
+
+def make_ocr(engine):
+    """OCR callable for the chosen engine, or None if it cannot run here"""
+    try:
+        if engine == 'tesseract':
+            from tesseract_pool import TesseractEnginePool
+            pool = TesseractEnginePool()
+            pool.image_to_string(np.zeros((32, 32), np.uint8))  # Warm, and fail early
+            return lambda processed: ' '.join(pool.image_to_string(processed).split())
+        from cnn_recognizer import CnnRecognizer
+        recognizer = CnnRecognizer(engine)
+        recognizer.load()
+        return recognizer.recognize
+    except Exception as e:
+        logging.warning(f"OCR engine '{engine}' unavailable, skipping its stage: {e}")
+        return None
+
+
+def summarize(samples):
+    """Latency percentiles (ms) and throughput (runs/s) for one stage"""
+    if not samples:
+        return None
+    values = np.array(samples) * 1000
+    return {
+        'runs': len(values),
+        'mean_ms': float(values.mean()),
+        'p50_ms': float(np.percentile(values, 50)),
+        'p95_ms': float(np.percentile(values, 95)),
+        'p99_ms': float(np.percentile(values, 99)),
+        'per_sec': float(1000 / values.mean()) if values.mean() else float('inf'),
+    }
+
+
+def run_benchmark(runs=100, engine='tesseract', split='mnist', src='en', dest='es',
+                  stub_latency=0.0, pages=20, fallback_text='hello world again'):
+    """Time every stage ``runs`` times and return {stage: summary}"""
+    server, base_url = start_stub_server(stub_latency)
+    translator = LibreTranslateBackend(f"{base_url}/translate")
+    lookups = LookupClient(endpoints={
+        'free_dictionary': f"{base_url}/api/v2/entries",
+        'wiktionary': f"{base_url}/w/api.php",
+        'mymemory': f"{base_url}/get",
+    })
+    ocr = make_ocr(engine)
+    synthetic = SyntheticPages(split)
+    canvases = [synthetic.page()[0] for _ in range(pages)]
+    timings = {stage: [] for stage in STAGES}
+
+    def timed(stage, function, *args):
+        start = time.perf_counter()
+        value = function(*args)
+        timings[stage].append(time.perf_counter() - start)
+        return value
+
+    try:
+        for run in range(runs):
+            canvas = canvases[run % len(canvases)]
+            start = time.perf_counter()
+            gray = timed('capture', np.array, canvas)
+            processed = timed('preprocess', preprocess, gray)
+            text = timed('ocr', ocr, processed) if ocr else None
+            # Without OCR (or when it reads nothing) later stages still need text
+            text = text or fallback_text
+            translation = timed('translate', translator.translate, text, src, dest)
+            lookups.describe(translation, dest, max_words=3)
+            timings['pipeline'].append(time.perf_counter() - start)
+
+            # The app's lookup wrappers, measured on their own
+            timed('pronunciation', lookups.describe, translation, dest, 0)
+            start = time.perf_counter()
+            for word in translation.split()[:3]:
+                lookups.describe(word, dest, 1)
+            timings['descriptions'].append(time.perf_counter() - start)
+    finally:
+        lookups.close()
+        translator.close()
+        server.shutdown()
+    return {stage: summarize(samples) for stage, samples in timings.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the recognition pipeline stages")
+    parser.add_argument('--runs', type=int, default=100)
+    parser.add_argument('--engine', choices=['tesseract', 'emnist', 'mnist'],
+                        default='tesseract')
+    parser.add_argument('--split', default='mnist', help="EMNIST test split to draw glyphs from")
+    parser.add_argument('--stub-latency', type=float, default=0.0,
+                        help="Simulated API response delay in milliseconds")
+    parser.add_argument('--src', default='en')
+    parser.add_argument('--dest', default='es')
+    parser.add_argument('--output', default=None, help="Write the JSON report here")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    report = run_benchmark(args.runs, args.engine, args.split, args.src, args.dest,
+                           args.stub_latency / 1000)
+    print(f"{'stage':<14}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'per sec':>10}")
+    for stage in STAGES:
+        summary = report[stage]
+        if summary is None:
+            print(f"{stage:<14}{'skipped':>10}")
+            continue
+        print(f"{stage:<14}{summary['p50_ms']:>10.2f}{summary['p95_ms']:>10.2f}"
+              f"{summary['p99_ms']:>10.2f}{summary['per_sec']:>10.1f}")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'args': vars(args), 'stages': report}, f, indent=2, sort_keys=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""Local CNN recognition backend built on the shipped MNIST/EMNIST models
+
+The binary page produced by ``enhance_image`` (white ink on black) is split
+into lines, words and glyphs by ``segmentation.Segmenter``, every glyph is
+normalized to a 28x28 tile the way the training data was, and all tiles of a
+frame are classified in one batched ``model.predict`` call. Predictions are
+decoded through the EMNIST mapping files, so no Tesseract process is
+involved at all.
+
+Models exported by ``export_model.py`` (.tflite or .onnx) are preferred over
+the Keras .h5 file when present and run through ``lite_runtime`` without
+importing TensorFlow.
+"""
+import logging
+import os
+import threading
+
+import numpy as np
+
+from emnist_dataset import find_data_file, load_mapping
+from lite_runtime import EXPORT_SUFFIXES, LiteModel
+from segmentation import Segmenter
+
+# How each shipped model was trained:
+#   mapping       - which emnist-*-mapping.txt decodes its output classes
+#   emnist_layout - trained on raw EMNIST IDX images, which are stored
+#                   transposed, so upright glyphs must be transposed too
+#   glyph_size    - size of the glyph inside the 28x28 tile
+MODEL_PROFILES = {
+    'emnist': {'path': 'emnist_model.h5', 'mapping': 'balanced',
+               'emnist_layout': True, 'glyph_size': 24},
+    'mnist': {'path': 'mnist_model.h5', 'mapping': 'mnist',
+              'emnist_layout': False, 'glyph_size': 20},
+}
+
+
+def default_model_path(profile):
+    """Fastest available model for a profile: int8 export, float export, then Keras"""
+    stem = os.path.splitext(MODEL_PROFILES[profile]['path'])[0]
+    for name in (f'{stem}_int8.tflite', f'{stem}.tflite', f'{stem}_int8.onnx', f'{stem}.onnx'):
+        try:
+            return find_data_file(name)
+        except FileNotFoundError:
+            continue
+    return find_data_file(MODEL_PROFILES[profile]['path'])
+
+
+class CnnRecognizer:
+    """Recognize short handwriting with one of the shipped Keras models"""
+
+    def __init__(self, profile='emnist', model_path=None):
+        self.profile = MODEL_PROFILES[profile]
+        self.model_path = model_path or default_model_path(profile)
+        self.labels = load_mapping(self.profile['mapping'])
+        self.model = None
+        self.segmenter = Segmenter(glyph_size=self.profile['glyph_size'],
+                                   emnist_layout=self.profile['emnist_layout'])
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Load the model on first use; TensorFlow is only imported for .h5 models"""
+        with self._lock:
+            if self.model is None:
+                if self.model_path.lower().endswith(EXPORT_SUFFIXES):
+                    self.model = LiteModel(self.model_path)
+                else:
+                    from tensorflow.keras.models import load_model
+                    self.model = load_model(self.model_path)
+                    logging.info(f"Loaded CNN model {self.model_path}")
+        return self.model
+
+    def classify(self, binary):
+        """Return (text, mean confidence) for a white-on-black binary page"""
+        model = self.load()
+        # The segmenter's crop buffer is shared, so keep it under the lock too
+        with self._lock:
+            segmentation = self.segmenter.segment(binary)
+            if not len(segmentation):
+                return '', 0.0
+            probabilities = model.predict(segmentation.crops, verbose=0)
+
+        predictions = probabilities.argmax(axis=1)
+        confidence = float(probabilities.max(axis=1).mean())
+        text = segmentation.text_from_labels(self.labels[label] for label in predictions)
+        return text, confidence
+
+    def classify_batch(self, binaries):
+        """Classify several pages with one model call; returns a (text, confidence) list"""
+        model = self.load()
+        segmentations = []
+        crops = []
+        with self._lock:
+            for binary in binaries:
+                segmentation = self.segmenter.segment(binary)
+                segmentations.append(segmentation)
+                # The next page reuses the crop buffer, so copy out of it
+                crops.append(segmentation.crops.copy())
+            total = sum(len(segmentation) for segmentation in segmentations)
+            if total:
+                probabilities = model.predict(np.concatenate(crops), verbose=0)
+
+        results = []
+        start = 0
+        for segmentation in segmentations:
+            count = len(segmentation)
+            if not count:
+                results.append(('', 0.0))
+                continue
+            page = probabilities[start:start + count]
+            start += count
+            text = segmentation.text_from_labels(self.labels[label]
+                                                 for label in page.argmax(axis=1))
+            results.append((text, float(page.max(axis=1).mean())))
+        return results
+
+    def recognize(self, binary):
+        """Return only the recognized text"""
+        return self.classify(binary)[0]
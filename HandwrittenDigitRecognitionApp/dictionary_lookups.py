@@ -0,0 +1,255 @@
+"""Concurrent dictionary, definition and IPA lookups
+
+The description panel used to query dictionaryapi.dev, Wiktionary and
+MyMemory one word and one API at a time with bare ``requests.get`` calls.
+``LookupClient`` fans every lookup for a translation out at once over a
+shared keep-alive session, bounds each HTTP call with a timeout and the
+whole batch with a deadline, and collects results as they arrive. The
+source priority is unchanged: a word's Free Dictionary entry wins over
+Wiktionary, which wins over MyMemory. When an ``OfflineDictionary`` is
+configured it answers first and the network is only a fallback.
+"""
+import html
+import logging
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from urllib.parse import quote
+
+import requests
+import wikitextparser as wtp
+from requests.adapters import HTTPAdapter
+
+from instrumentation import metrics
+
+DEFAULT_ENDPOINTS = {
+    'free_dictionary': 'https://api.dictionaryapi.dev/api/v2/entries',
+    'wiktionary': 'https://en.wiktionary.org/w/api.php',
+    'mymemory': 'https://api.mymemory.translated.net/get',
+}
+
+PRONUNCIATION_FALLBACK = "Pronunciation available through 'Listen' button"
+
+
+class LookupClient:
+    """Pooled, deadline-bounded lookups against the free dictionary APIs"""
+
+    def __init__(self, timeout=3.0, deadline=5.0, max_workers=10, endpoints=None,
+                 offline=None, use_network=True):
+        self.timeout = timeout
+        self.deadline = deadline
+        # Optional OfflineDictionary consulted before any web API
+        self.offline = offline
+        self.use_network = use_network
+        self.endpoints = dict(DEFAULT_ENDPOINTS, **(endpoints or {}))
+
+        # One keep-alive pool shared by every worker thread
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=len(self.endpoints), pool_maxsize=max_workers)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='lookup')
+
+    def _get_json(self, url, params=None):
+        response = self.session.get(url, params=params, timeout=self.timeout)
+        if response.status_code == 200:
+            return response.json()
+        return None
+
+    @metrics.timed('lookup_free_dictionary')
+    def free_dictionary(self, word, lang_code):
+        """Definitions and examples from the Free Dictionary API"""
+        descriptions = []
+        try:
+            url = f"{self.endpoints['free_dictionary']}/{lang_code}/{quote(word.lower())}"
+            data = self._get_json(url)
+            if data and len(data) > 0:
+                for meaning in data[0].get('meanings', [])[:2]:
+                    pos = meaning.get('partOfSpeech', '')
+                    first = meaning.get('definitions', [{}])[0]
+                    definition = first.get('definition', '')
+                    if definition:
+                        descriptions.append(f"({pos}) {definition}")
+                        # Add example if available
+                        example = first.get('example', '')
+                        if example:
+                            descriptions.append(f"   Example: {example}")
+        except Exception as e:
+            logging.error(f"Free Dictionary API error: {e}")
+        return descriptions
+
+    @metrics.timed('lookup_wiktionary')
+    def wiktionary_wikitext(self, page):
+        """Raw wikitext of the lead section of a Wiktionary page"""
+        try:
+            params = {
+                'action': 'parse',
+                'format': 'json',
+                'page': page,
+                'prop': 'wikitext',
+                'section': 0
+            }
+            data = self._get_json(self.endpoints['wiktionary'], params)
+            if data and 'parse' in data and 'wikitext' in data['parse']:
+                return data['parse']['wikitext']['*']
+        except Exception as e:
+            logging.error(f"Wiktionary API error: {e}")
+        return None
+
+    @staticmethod
+    def wiktionary_definition(wikitext):
+        """Extract a short definition or etymology from Wiktionary wikitext"""
+        descriptions = []
+        if wikitext:
+            try:
+                for section in wtp.parse(wikitext).sections:
+                    title = section.title or ''  # The lead section has no title
+                    if 'Etymology' in title or 'Definitions' in title:
+                        clean_text = html.unescape(section.plain_text())
+                        if clean_text:
+                            descriptions.append(clean_text[:200] + "...")  # Limit length
+                        break
+            except Exception as e:
+                logging.error(f"Wiktionary parse error: {e}")
+        return descriptions
+
+    @staticmethod
+    def wiktionary_ipa(wikitext):
+        """Pull the first {{IPA|...}} template out of Wiktionary wikitext"""
+        if wikitext and '{{IPA|' in wikitext:
+            ipa_start = wikitext.find('{{IPA|') + 6
+            ipa_end = wikitext.find('}}', ipa_start)
+            if ipa_end > ipa_start:
+                return f"IPA: {wikitext[ipa_start:ipa_end]}"
+        return None
+
+    @metrics.timed('lookup_mymemory')
+    def mymemory(self, word, lang_code):
+        """Approximate English glosses from the MyMemory translation memory"""
+        descriptions = []
+        try:
+            params = {'q': word, 'langpair': f"{lang_code}|en"}
+            data = self._get_json(self.endpoints['mymemory'], params)
+            if data and data.get('matches'):
+                for match in data['matches'][:2]:
+                    if match.get('translation') and match.get('quality', '0') != '0':
+                        descriptions.append(f"≈ {match['translation']}")
+        except Exception as e:
+            logging.error(f"MyMemory API error: {e}")
+        return descriptions
+
+    def offline_description(self, word, lang_code):
+        """Description lines for ``word`` from the offline store, if it has any"""
+        try:
+            match, rows = self.offline.lookup(word, lang_code)
+        except Exception as e:
+            logging.error(f"Offline dictionary error: {e}")
+            return []
+        descriptions = []
+        if rows and match != word.lower():
+            descriptions.append(f"[{match}]")  # Fuzzy match for a likely OCR typo
+        for pos, definition, example in rows:
+            descriptions.append(f"({pos}) {definition}")
+            if example:
+                descriptions.append(f"   Example: {example}")
+        return descriptions
+
+    def describe(self, text, lang_code, max_words=3):
+        """Look up the IPA guide for ``text`` and descriptions of its first words
+
+        The offline store, when configured, is asked first. Everything it
+        cannot answer is requested from the web APIs at once (unless
+        ``use_network`` is off); Wiktionary pages that are needed for both
+        the IPA guide and a definition are fetched once. Returns
+        ``(pronunciation, [(word, description), ...])`` as soon as each word's
+        best available source is known, or when the deadline passes.
+        """
+        words = text.split()[:max_words]
+        pronunciation = None
+        offline = {}
+        if self.offline is not None:
+            ipa = self.offline.ipa(text, lang_code)
+            if ipa:
+                pronunciation = f"IPA: {ipa}"
+            for word in words:
+                lines = self.offline_description(word, lang_code)
+                if lines:
+                    offline[word] = lines
+
+        online_words = [word for word in words if word not in offline]
+        if not self.use_network or (pronunciation and not online_words):
+            return (pronunciation or PRONUNCIATION_FALLBACK,
+                    [(word, '\n'.join(offline[word])) for word in words if word in offline])
+
+        pages = {}
+
+        def wiktionary(page):
+            if page not in pages:
+                pages[page] = self.executor.submit(self.wiktionary_wikitext, page)
+            return pages[page]
+
+        ipa_future = wiktionary(text.lower()) if pronunciation is None else None
+        # Per word, sources in priority order
+        sources = {
+            word: [
+                self.executor.submit(self.free_dictionary, word, lang_code),
+                wiktionary(word.lower()),
+                self.executor.submit(self.mymemory, word, lang_code),
+            ]
+            for word in online_words
+        }
+        parsers = [None, self.wiktionary_definition, None]
+        parsed = {}
+
+        def value(future, parser):
+            # Parse each finished response once, however often it is checked
+            key = (future, parser)
+            if key not in parsed:
+                result = future.result()
+                parsed[key] = parser(result) if parser else result
+            return parsed[key]
+
+        def settled(futures):
+            # Decided once a source has content and every better source came back empty
+            for future, parser in zip(futures, parsers):
+                if not future.done():
+                    return False
+                if value(future, parser):
+                    return True
+            return True
+
+        pending = set(pages.values()).union(f for futures in sources.values() for f in futures)
+        deadline = time.monotonic() + self.deadline
+        while pending:
+            if ((ipa_future is None or ipa_future.done())
+                    and all(settled(futures) for futures in sources.values())):
+                break
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                logging.warning("Dictionary lookups hit the deadline; using partial results")
+                break
+            _, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+
+        for future in pending:
+            future.cancel()
+
+        if ipa_future is not None and ipa_future.done() and not ipa_future.cancelled():
+            pronunciation = self.wiktionary_ipa(ipa_future.result()) or PRONUNCIATION_FALLBACK
+
+        # Best finished source per word; unfinished ones are skipped after the deadline
+        descriptions = []
+        for word in words:
+            if word in offline:
+                descriptions.append((word, '\n'.join(offline[word])))
+                continue
+            for future, parser in zip(sources[word], parsers):
+                if not future.done() or future.cancelled():
+                    continue
+                lines = value(future, parser)
+                if lines:
+                    descriptions.append((word, '\n'.join(lines)))
+                    break
+        return pronunciation, descriptions
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.session.close()
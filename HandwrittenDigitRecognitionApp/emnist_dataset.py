@@ -0,0 +1,142 @@
+"""Streaming, memory-mapped access to the shipped EMNIST/MNIST IDX splits
+
+The training scripts used to gunzip a whole IDX file into memory on every
+run, slice it with hard-coded header offsets and then divide by 255.0,
+which made a float64 copy eight times the size of the data. Here each
+``emnist-*-idx*-ubyte.gz`` file is decompressed once, streaming, into a
+cached ``.npy`` file; later runs memory-map that file. Headers are parsed
+properly and batches stay uint8 until they are normalized on the way into
+the model.
+
+Images keep the raw EMNIST layout (transposed relative to upright text),
+which is what the shipped models were trained on.
+"""
+import gzip
+import logging
+import os
+import struct
+from pathlib import Path
+
+import numpy as np
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CACHE_DIR = os.path.join(Path.home(), '.handwriting_app', 'emnist')
+
+SPLITS = ('mnist', 'digits', 'letters', 'balanced', 'byclass', 'bymerge')
+
+# IDX type byte -> numpy dtype (multi-byte types are big-endian)
+IDX_DTYPES = {
+    0x08: np.dtype(np.uint8),
+    0x09: np.dtype(np.int8),
+    0x0B: np.dtype('>i2'),
+    0x0C: np.dtype('>i4'),
+    0x0D: np.dtype('>f4'),
+    0x0E: np.dtype('>f8'),
+}
+
+CHUNK_BYTES = 16 * 1024 * 1024
+
+
+def find_data_file(name):
+    """Locate a shipped data file next to the app, in the repo root or the cwd"""
+    for directory in (os.getcwd(), APP_DIR, os.path.dirname(APP_DIR)):
+        path = os.path.join(directory, name)
+        if os.path.exists(path):
+            return path
+    raise FileNotFoundError(f"Could not find {name}")
+
+
+def load_mapping(split):
+    """Read emnist-<split>-mapping.txt into a list of characters indexed by label"""
+    chars = {}
+    with open(find_data_file(f'emnist-{split}-mapping.txt')) as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2:
+                chars[int(parts[0])] = chr(int(parts[1]))
+    size = max(chars) + 1
+    return [chars.get(label, '?') for label in range(size)]
+
+
+def idx_filename(split, part, kind):
+    """File name of one shipped split, e.g. emnist-balanced-train-images-idx3-ubyte.gz"""
+    if split not in SPLITS:
+        raise ValueError(f"Unknown EMNIST split '{split}', expected one of {SPLITS}")
+    rank = 3 if kind == 'images' else 1
+    return f'emnist-{split}-{part}-{kind}-idx{rank}-ubyte.gz'
+
+
+def read_idx_header(f):
+    """Parse an IDX header and return (dtype, shape)"""
+    zero, dtype_code, ndim = struct.unpack('>HBB', f.read(4))
+    if zero != 0 or dtype_code not in IDX_DTYPES:
+        raise ValueError("Not an IDX file")
+    shape = struct.unpack(f'>{ndim}I', f.read(4 * ndim))
+    return IDX_DTYPES[dtype_code], shape
+
+
+def cache_idx(gz_path, cache_dir=DEFAULT_CACHE_DIR):
+    """Decompress an IDX .gz file once into a cached .npy file and return its path
+
+    The payload is streamed chunk by chunk straight into a memory-mapped
+    output, so the whole split never has to fit in memory.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    name = os.path.basename(gz_path)
+    npy_path = os.path.join(cache_dir, name[:-len('.gz')] + '.npy')
+    if os.path.exists(npy_path) and os.path.getmtime(npy_path) >= os.path.getmtime(gz_path):
+        return npy_path
+
+    tmp_path = npy_path + '.tmp'
+    with gzip.open(gz_path, 'rb') as f:
+        dtype, shape = read_idx_header(f)
+        out = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=dtype.newbyteorder('='),
+                                        shape=shape)
+        flat = out.reshape(-1)
+        step = max(1, CHUNK_BYTES // dtype.itemsize)
+        for start in range(0, flat.size, step):
+            count = min(step, flat.size - start)
+            chunk = f.read(count * dtype.itemsize)
+            if len(chunk) != count * dtype.itemsize:
+                raise ValueError(f"{gz_path} is truncated")
+            flat[start:start + count] = np.frombuffer(chunk, dtype)
+        out.flush()
+        del flat, out
+    os.replace(tmp_path, npy_path)
+    logging.info(f"Cached {gz_path} as {npy_path}")
+    return npy_path
+
+
+def load_idx(gz_path, cache_dir=DEFAULT_CACHE_DIR):
+    """Memory-map an IDX file through its cached .npy copy"""
+    return np.load(cache_idx(gz_path, cache_dir), mmap_mode='r')
+
+
+def load_split(split, part='train', cache_dir=DEFAULT_CACHE_DIR):
+    """Return memory-mapped (images, labels) for a split; images are (N, 28, 28, 1) uint8"""
+    images = load_idx(find_data_file(idx_filename(split, part, 'images')), cache_dir)
+    labels = load_idx(find_data_file(idx_filename(split, part, 'labels')), cache_dir)
+    return images[..., np.newaxis], labels
+
+
+def normalize(batch):
+    """Scale a uint8 image batch to float32 in [0, 1]"""
+    return batch.astype(np.float32) * (1.0 / 255.0)
+
+
+def main():
+    """Decompress every shipped split into the cache and report its shape"""
+    logging.basicConfig(level=logging.INFO)
+    for split in SPLITS:
+        for part in ('train', 'test'):
+            for kind in ('images', 'labels'):
+                name = idx_filename(split, part, kind)
+                try:
+                    array = load_idx(find_data_file(name))
+                except FileNotFoundError:
+                    continue
+                print(f"{name}: {array.shape} {array.dtype}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+"""Accuracy and throughput evaluation of the CNN models over the EMNIST splits
+
+Runs a Keras (.h5) or exported (.tflite/.onnx) model over a shipped test
+split. Both the model's outputs and the split's labels are decoded to
+characters through their ``emnist-*-mapping.txt`` files, so a model can be
+scored on a split it was not trained on (e.g. the Balanced model on Digits).
+Reports accuracy, per-class accuracy, a confusion matrix and images/sec at
+several batch sizes and thread counts. Each thread count is measured in a
+fresh subprocess because TensorFlow fixes its thread pools at start-up.
+
+The JSON report is written with sorted keys so reports diff cleanly across
+builds.
+
+Usage:
+    python evaluate_models.py emnist_model.h5 --split balanced digits
+    python evaluate_models.py emnist_model_int8.tflite --split byclass --ignore-case
+"""
+import argparse
+import json
+import logging
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from cnn_recognizer import MODEL_PROFILES
+from emnist_dataset import SPLITS, find_data_file, load_mapping, load_split, normalize
+from lite_runtime import EXPORT_SUFFIXES, LiteModel
+
+
+def profile_for(model_path):
+    """Guess the training profile (mapping and layout) from a model's file name"""
+    return 'mnist' if os.path.basename(model_path).startswith('mnist') else 'emnist'
+
+
+def load_model_file(path, threads=None):
+    """Load any supported model; returns an object with ``predict(batch)``"""
+    if path.lower().endswith(EXPORT_SUFFIXES):
+        return LiteModel(path, num_threads=threads)
+    import tensorflow as tf
+    if threads:
+        tf.config.threading.set_intra_op_parallelism_threads(threads)
+        tf.config.threading.set_inter_op_parallelism_threads(1)
+    return tf.keras.models.load_model(path)
+
+
+def split_images(split, emnist_layout, limit=None):
+    """Memory-mapped test images and labels, oriented the way the model expects"""
+    images, labels = load_split(split, 'test')
+    if limit:
+        images, labels = images[:limit], labels[:limit]
+    if not emnist_layout:
+        images = images.transpose(0, 2, 1, 3)
+    return images, np.asarray(labels, dtype=np.int64)
+
+
+def predict_labels(model, images, batch_size=256):
+    """Predicted class index for every image, normalizing one batch at a time"""
+    predictions = np.empty(len(images), dtype=np.int64)
+    for start in range(0, len(images), batch_size):
+        batch = normalize(np.ascontiguousarray(images[start:start + batch_size]))
+        predictions[start:start + batch_size] = model.predict(batch, verbose=0).argmax(axis=1)
+    return predictions
+
+
+def score(true_chars, predicted_chars, ignore_case=False):
+    """Accuracy, per-class accuracy and confusion matrix over decoded characters"""
+    if ignore_case:
+        true_chars = [c.lower() for c in true_chars]
+        predicted_chars = [c.lower() for c in predicted_chars]
+    rows = sorted(set(true_chars))
+    columns = sorted(set(true_chars) | set(predicted_chars))
+    row_index = {c: i for i, c in enumerate(rows)}
+    column_index = {c: i for i, c in enumerate(columns)}
+
+    matrix = np.zeros((len(rows), len(columns)), dtype=np.int64)
+    np.add.at(matrix, ([row_index[c] for c in true_chars],
+                       [column_index[c] for c in predicted_chars]), 1)
+
+    correct = sum(matrix[i, column_index[c]] for c, i in row_index.items())
+    totals = matrix.sum(axis=1)
+    return {
+        'accuracy': float(correct / max(1, len(true_chars))),
+        'per_class_accuracy': {
+            c: float(matrix[i, column_index[c]] / totals[i]) for c, i in row_index.items()
+        },
+        'confusion': {'true': rows, 'predicted': columns, 'matrix': matrix.tolist()},
+    }
+
+
+def measure_throughput(model_path, split, emnist_layout, batch_sizes, threads, samples,
+                       repeats=3):
+    """Images/sec and per-batch latency at each batch size, in this process"""
+    model = load_model_file(model_path, threads)
+    images, _ = split_images(split, emnist_layout, samples)
+    images = normalize(np.ascontiguousarray(images))
+
+    results = []
+    for batch_size in batch_sizes:
+        batches = [images[i:i + batch_size] for i in range(0, len(images), batch_size)]
+        model.predict(batches[0], verbose=0)  # Warm up (graph tracing, allocation)
+        best = float('inf')
+        for _ in range(repeats):
+            start = time.perf_counter()
+            for batch in batches:
+                model.predict(batch, verbose=0)
+            best = min(best, time.perf_counter() - start)
+        results.append({
+            'threads': threads,
+            'batch_size': batch_size,
+            'images_per_sec': len(images) / best,
+            'batch_latency_ms': best / len(batches) * 1000,
+        })
+    return results
+
+
+def throughput_in_subprocess(model_path, split, emnist_layout, batch_sizes, threads, samples):
+    """Run ``measure_throughput`` in a fresh interpreter so thread settings take effect"""
+    env = dict(os.environ, OMP_NUM_THREADS=str(threads), TF_CPP_MIN_LOG_LEVEL='2')
+    command = [sys.executable, os.path.abspath(__file__), model_path, '--worker',
+               '--split', split, '--threads', str(threads), '--samples', str(samples),
+               '--batch-sizes', *map(str, batch_sizes)]
+    if not emnist_layout:
+        command.append('--upright')
+    completed = subprocess.run(command, capture_output=True, text=True, env=env)
+    if completed.returncode != 0:
+        logging.error(f"Throughput run with {threads} threads failed: {completed.stderr[-500:]}")
+        return []
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def evaluate(model_path, splits, mapping=None, emnist_layout=None, limit=None,
+             ignore_case=False):
+    """Accuracy report for one model over several splits"""
+    profile = MODEL_PROFILES[profile_for(model_path)]
+    mapping = mapping or profile['mapping']
+    if emnist_layout is None:
+        emnist_layout = profile['emnist_layout']
+    model_chars = load_mapping(mapping)
+    model = load_model_file(model_path)
+
+    results = {}
+    for split in splits:
+        try:
+            images, labels = split_images(split, emnist_layout, limit)
+        except FileNotFoundError as e:
+            logging.error(f"Skipping split '{split}': {e}")
+            continue
+        split_chars = load_mapping(split)
+        start = time.perf_counter()
+        predictions = predict_labels(model, images)
+        elapsed = time.perf_counter() - start
+        result = score([split_chars[label] for label in labels],
+                       [model_chars[label] if label < len(model_chars) else '?'
+                        for label in predictions],
+                       ignore_case)
+        result['samples'] = len(labels)
+        result['seconds'] = elapsed
+        results[split] = result
+        logging.info(f"{split}: accuracy {result['accuracy']:.4f} on {len(labels)} images")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate CNN model accuracy and throughput")
+    parser.add_argument('model', help="Model file (.h5, .tflite or .onnx)")
+    parser.add_argument('--split', nargs='+', choices=SPLITS, default=None,
+                        help="Test splits to score (default: the model's own)")
+    parser.add_argument('--mapping', choices=SPLITS, default=None,
+                        help="Mapping that decodes the model's outputs")
+    parser.add_argument('--upright', action='store_true',
+                        help="Model expects upright images instead of the raw EMNIST layout")
+    parser.add_argument('--ignore-case', action='store_true',
+                        help="Score letters case-insensitively (for merged-class models)")
+    parser.add_argument('--limit', type=int, default=None, help="Images per split")
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 32, 256])
+    parser.add_argument('--threads', type=int, nargs='+', default=None,
+                        help="Thread counts to measure (default: 1 and all cores)")
+    parser.add_argument('--samples', type=int, default=2048,
+                        help="Images per throughput measurement")
+    parser.add_argument('--output', default=None, help="Write the JSON report here")
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    model_path = find_data_file(args.model) if not os.path.exists(args.model) else args.model
+    profile = MODEL_PROFILES[profile_for(model_path)]
+    emnist_layout = False if args.upright else profile['emnist_layout']
+
+    splits = args.split or [profile['mapping']]
+    if args.worker:
+        print(json.dumps(measure_throughput(model_path, splits[0], emnist_layout,
+                                            args.batch_sizes, args.threads[0], args.samples)))
+        return
+
+    thread_counts = args.threads or sorted({1, os.cpu_count() or 1})
+    report = {
+        'model': os.path.basename(model_path),
+        'model_bytes': os.path.getsize(model_path),
+        'mapping': args.mapping or profile['mapping'],
+        'emnist_layout': emnist_layout,
+        'ignore_case': args.ignore_case,
+        'splits': evaluate(model_path, splits, args.mapping, emnist_layout, args.limit,
+                           args.ignore_case),
+        'throughput': [],
+    }
+    for threads in thread_counts:
+        report['throughput'].extend(throughput_in_subprocess(
+            model_path, splits[0], emnist_layout, args.batch_sizes, threads, args.samples))
+
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+        logging.info(f"Wrote {args.output}")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
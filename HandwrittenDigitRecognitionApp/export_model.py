@@ -0,0 +1,165 @@
+"""Export the shipped Keras CNNs to TFLite and/or ONNX
+
+Optionally applies int8 post-training quantization, calibrated on the
+EMNIST test split the profile decodes with. Each exported model is then
+loaded through ``lite_runtime.LiteModel`` (no Keras involved) and scored
+against the original on held-out test images, so the accuracy cost of
+conversion is reported next to the size and speed gain. ``--eval-samples 0``
+skips the evaluation, and when the profile's test images are not available
+the model is exported without the accuracy report. Quantization needs them.
+
+Usage:
+    python export_model.py emnist --format tflite onnx --quantize
+    python export_model.py mnist --format tflite --calibration-samples 1000
+    python export_model.py emnist --format onnx --eval-samples 0
+"""
+import argparse
+import json
+import logging
+import os
+import time
+
+import numpy as np
+
+from cnn_recognizer import MODEL_PROFILES
+from emnist_dataset import find_data_file, load_split, normalize
+from lite_runtime import LiteModel
+
+
+def test_images(profile, count, offset=0):
+    """Normalized (images, labels) from the test split matching a profile
+
+    Images are oriented the way the profile's model was trained: raw EMNIST
+    layout, or transposed upright for the Keras MNIST model.
+    """
+    images, labels = load_split(MODEL_PROFILES[profile]['mapping'], 'test')
+    images = images[offset:offset + count]
+    if not MODEL_PROFILES[profile]['emnist_layout']:
+        images = images.transpose(0, 2, 1, 3)
+    return normalize(images), np.asarray(labels[offset:offset + count], dtype=np.int64)
+
+
+def export_tflite(model, path, calibration=None):
+    """Convert to TFLite; with calibration data, fully int8 including input and output"""
+    import tensorflow as tf
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    if calibration is not None:
+        def representative_dataset():
+            for image in calibration:
+                yield [image[np.newaxis]]
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = representative_dataset
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        converter.inference_input_type = tf.int8
+        converter.inference_output_type = tf.int8
+    with open(path, 'wb') as f:
+        f.write(converter.convert())
+
+
+def export_onnx(model, path, calibration=None, opset=13):
+    """Convert to ONNX with tf2onnx; with calibration data, quantize to int8 (QDQ)"""
+    import tensorflow as tf
+    import tf2onnx
+    signature = (tf.TensorSpec((None, 28, 28, 1), tf.float32, name='image'),)
+    if calibration is None:
+        tf2onnx.convert.from_keras(model, input_signature=signature, opset=opset,
+                                   output_path=path)
+        return
+
+    from onnxruntime.quantization import (CalibrationDataReader, QuantFormat, QuantType,
+                                          quantize_static)
+
+    class Calibration(CalibrationDataReader):
+        def __init__(self):
+            self.batches = iter(calibration[i:i + 32] for i in range(0, len(calibration), 32))
+
+        def get_next(self):
+            batch = next(self.batches, None)
+            return None if batch is None else {'image': batch}
+
+    float_path = path[:-len('.onnx')] + '_float.onnx'
+    tf2onnx.convert.from_keras(model, input_signature=signature, opset=opset,
+                               output_path=float_path)
+    try:
+        quantize_static(float_path, path, Calibration(), quant_format=QuantFormat.QDQ,
+                        activation_type=QuantType.QInt8, weight_type=QuantType.QInt8)
+    finally:
+        os.remove(float_path)
+
+
+def accuracy(predict, images, labels, batch_size=256):
+    """Top-1 accuracy and images/second of a batch predict function"""
+    correct = 0
+    start = time.perf_counter()
+    for i in range(0, len(images), batch_size):
+        probabilities = predict(images[i:i + batch_size])
+        correct += int((probabilities.argmax(axis=1) == labels[i:i + batch_size]).sum())
+    elapsed = time.perf_counter() - start
+    return correct / len(images), len(images) / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export a CNN model to TFLite/ONNX")
+    parser.add_argument('profile', choices=sorted(MODEL_PROFILES))
+    parser.add_argument('--model', help="Keras model to export (default: the shipped one)")
+    parser.add_argument('--format', nargs='+', choices=['tflite', 'onnx'], default=['tflite'])
+    parser.add_argument('--quantize', action='store_true',
+                        help="int8 post-training quantization")
+    parser.add_argument('--calibration-samples', type=int, default=500)
+    parser.add_argument('--eval-samples', type=int, default=5000,
+                        help="Test images to score the exports on; 0 skips the evaluation")
+    parser.add_argument('--output-dir', default=None)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    from tensorflow.keras.models import load_model
+    model_path = args.model or find_data_file(MODEL_PROFILES[args.profile]['path'])
+    model = load_model(model_path)
+    stem = os.path.splitext(os.path.basename(model_path))[0] + ('_int8' if args.quantize else '')
+    output_dir = args.output_dir or os.path.dirname(os.path.abspath(model_path))
+
+    # Calibrate on the start of the test split and evaluate on what follows it
+    calibration = None
+    if args.quantize:
+        try:
+            calibration, _ = test_images(args.profile, args.calibration_samples)
+        except FileNotFoundError as e:
+            parser.error(f"--quantize calibrates on the test split: {e}")
+    images = labels = None
+    if args.eval_samples > 0:
+        eval_offset = args.calibration_samples if args.quantize else 0
+        try:
+            images, labels = test_images(args.profile, args.eval_samples, eval_offset)
+        except FileNotFoundError as e:
+            logging.warning(f"Exporting without an accuracy report: {e}")
+
+    report = {'model': model_path, 'eval_samples': 0 if images is None else len(images),
+              'exports': []}
+    if images is not None:
+        reference, reference_speed = accuracy(lambda batch: model.predict(batch, verbose=0),
+                                              images, labels)
+        report.update(keras_accuracy=reference, keras_images_per_sec=reference_speed)
+
+    for fmt in args.format:
+        path = os.path.join(output_dir, f'{stem}.{fmt}')
+        start = time.perf_counter()
+        (export_tflite if fmt == 'tflite' else export_onnx)(model, path, calibration)
+        logging.info(f"Exported {path} in {time.perf_counter() - start:.1f}s")
+
+        entry = {
+            'path': path,
+            'format': fmt,
+            'quantized': args.quantize,
+            'size_bytes': os.path.getsize(path),
+        }
+        if images is not None:
+            exported, speed = accuracy(LiteModel(path).predict, images, labels)
+            entry.update(accuracy=exported, accuracy_delta=exported - reference,
+                         images_per_sec=speed)
+        report['exports'].append(entry)
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
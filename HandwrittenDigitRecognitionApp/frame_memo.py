@@ -0,0 +1,112 @@
+"""Memoization of recognition results keyed on a perceptual hash of the frame
+
+Real-time mode recognizes the canvas after strokes, during painting and from
+the poll loop, often when the ink has not changed at all (an eraser pass
+over empty space, a repeated trigger). ``FrameMemo`` hands back the previous
+OCR, translation and description when the canvas ink matches a frame seen
+before under the same engine, languages and mode.
+
+Frames are compared on the raw canvas ink, so no preprocessing is done
+before a hit. A 256-bit hash of the ink (cropped, shrunk to 16x16 and
+thresholded) rejects most frames cheaply. A match also needs the same ink
+box and at most ``max_pixel_diff`` differing pixels in the exact bitmap, so
+a dot, a comma or the crossbar of a "t" is a real edit and misses the memo.
+"""
+import threading
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+from instrumentation import metrics
+
+
+class FrameHash:
+    """Perceptual hash plus the packed ink bitmap of a binary frame"""
+
+    __slots__ = ('bits', 'ink', 'box', 'pixels')
+
+    def __init__(self, bits, ink, box, pixels):
+        self.bits = bits
+        self.ink = ink
+        self.box = box
+        self.pixels = pixels
+
+    def distance(self, other):
+        """Number of differing hash bits"""
+        return bin(self.bits ^ other.bits).count('1')
+
+    def pixel_difference(self, other):
+        """Number of differing ink pixels; only meaningful for equal boxes"""
+        return int(np.unpackbits(np.bitwise_xor(self.pixels, other.pixels)).sum())
+
+
+def frame_hash(binary, size=16):
+    """Hash a white-on-black binary frame and keep its cropped ink bitmap"""
+    x, y, width, height = cv2.boundingRect(binary)
+    if width == 0:
+        return FrameHash(0, 0, (0, 0, 0, 0), np.zeros(0, np.uint8))
+    ink = binary[y:y + height, x:x + width]
+    small = cv2.resize(ink, (size, size), interpolation=cv2.INTER_AREA)
+    bits = np.packbits(small > 32)
+    return FrameHash(int.from_bytes(bits.tobytes(), 'big'), cv2.countNonZero(ink),
+                     (x, y, width, height), np.packbits(ink > 0))
+
+
+def canvas_hash(gray, threshold=128):
+    """Hash the dark ink of a grayscale canvas without preprocessing it"""
+    _, binary = cv2.threshold(gray, threshold - 1, 255, cv2.THRESH_BINARY_INV)
+    return frame_hash(binary)
+
+
+class FrameMemo:
+    """Small LRU of recent results, matched by hash distance"""
+
+    def __init__(self, max_entries=32, max_distance=3, max_pixel_diff=4):
+        self.max_entries = max_entries
+        self.max_distance = max_distance
+        self.max_pixel_diff = max_pixel_diff
+        self.stats = {'hits': 0, 'misses': 0}
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._next_id = 0
+
+    @property
+    def skip_rate(self):
+        lookups = self.stats['hits'] + self.stats['misses']
+        return self.stats['hits'] / lookups if lookups else 0.0
+
+    def matches(self, a, b):
+        # Cheap checks first; the bitmap comparison only runs for likely repeats
+        return (a.box == b.box
+                and abs(a.ink - b.ink) <= self.max_pixel_diff
+                and a.distance(b) <= self.max_distance
+                and a.pixel_difference(b) <= self.max_pixel_diff)
+
+    def lookup(self, frame, context):
+        """Return a copy of the result stored for a near-identical frame, or None
+
+        ``context`` identifies everything besides the ink that the result
+        depends on, e.g. (engine, source language, target language).
+        """
+        with self._lock:
+            for key, (stored_frame, stored_context, result) in reversed(self._entries.items()):
+                if stored_context == context and self.matches(frame, stored_frame):
+                    self._entries.move_to_end(key)
+                    self.stats['hits'] += 1
+                    metrics.increment('frame_memo_hits')
+                    return dict(result)
+            self.stats['misses'] += 1
+            metrics.increment('frame_memo_misses')
+            return None
+
+    def store(self, frame, context, result):
+        with self._lock:
+            self._next_id += 1
+            self._entries[self._next_id] = (frame, context, dict(result))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
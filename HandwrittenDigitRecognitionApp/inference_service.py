@@ -0,0 +1,404 @@
+"""Recognition and translation over HTTP for tools outside the Tk app
+
+The service runs the same steps as ``recognize_text``: ``preprocess``, OCR
+through the engine registry (or tiled OCR for large pages), then a cached
+translation. HTTP requests are handled on their own threads, which decode
+and preprocess in parallel. OCR calls go through ``MicroBatcher``: a
+bounded queue, one per engine, language and mode, drained by ``--workers``
+threads. For engines that can batch their model call (the CNNs), a worker
+waits up to ``--max-wait`` seconds to gather up to ``--max-batch`` frames
+and classifies them together. Other engines run one frame per worker, so
+Tesseract scales with the worker count even while CNN batches are filling.
+When the queue is full the request is refused with 503 and a Retry-After
+header instead of queueing without bound. At most ``--max-requests``
+requests are handled at once; further ones get the same 503 before their
+body is read, so a burst of large uploads cannot exhaust memory.
+
+Endpoints:
+    POST /recognize   image bytes (query: engine, lang, source, translate_to)
+                      or JSON {"image": <base64>, "engine", "lang", ...}
+                      -> {"text", "translation", "seconds"}
+    POST /translate   LibreTranslate-style {"q": str or [str], "source", "target"}
+                      -> {"translatedText": ...}
+    GET  /health      queue depth and engines
+    GET  /metrics     Prometheus text from ``instrumentation``
+
+Usage:
+    python inference_service.py --port 8750 --workers 8 --max-requests 64
+    curl --data-binary @page.png "http://127.0.0.1:8750/recognize?engine=auto&translate_to=es"
+"""
+import argparse
+import base64
+import binascii
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import cv2
+import numpy as np
+
+from batch_translation import BatchTranslator
+from instrumentation import metrics
+from ocr_registry import OcrRouter, default_registry
+from page_tiling import is_large, recognize_page
+from pipeline import recognize
+from tesseract_pool import TesseractEnginePool
+from translation_backends import GoogletransBackend, LibreTranslateBackend
+from translation_cache import TranslationCache
+
+MAX_BODY = 64 * 1024 * 1024
+
+
+class QueueFull(Exception):
+    """The service is at capacity; the client should retry later"""
+
+
+class MicroBatcher:
+    """Bounded work queue whose workers coalesce compatible items into batches
+
+    ``process_batch(key, items)`` returns one result per item. Every key has
+    its own queue, and a worker only ever takes entries for one key. When
+    ``batchable(key)`` is true, the worker waits until ``max_batch`` entries
+    are queued or the oldest has waited ``max_wait`` seconds. Otherwise it
+    takes a single entry, and the key stays available so other workers can
+    run its remaining entries at the same time. ``max_queue`` bounds the
+    entries queued over all keys.
+    """
+
+    def __init__(self, process_batch, batchable=lambda key: True, max_batch=16,
+                 max_wait=0.01, workers=None, max_queue=256):
+        self.process_batch = process_batch
+        self.batchable = batchable
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.max_queue = max_queue
+        # key -> deque of (item, future, queued at); keys with entries no worker
+        # has claimed, in arrival order; and keys that are ready or claimed
+        self._pending = {}
+        self._ready = deque()
+        self._scheduled = set()
+        self._size = 0
+        self._closed = False
+        self._condition = threading.Condition()
+        self._threads = [threading.Thread(target=self._work, name=f'batch-{i}', daemon=True)
+                         for i in range(workers or os.cpu_count() or 1)]
+        for thread in self._threads:
+            thread.start()
+
+    @property
+    def depth(self):
+        return self._size
+
+    def submit(self, key, item):
+        """Queue one item; returns a Future, or raises QueueFull"""
+        future = Future()
+        with self._condition:
+            if self._size >= self.max_queue:
+                metrics.increment('service_rejected')
+                raise QueueFull(f"{self.max_queue} requests already queued")
+            self._pending.setdefault(key, deque()).append((item, future, time.perf_counter()))
+            self._size += 1
+            if key not in self._scheduled:
+                self._scheduled.add(key)
+                self._ready.append(key)
+            self._condition.notify_all()
+        return future
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+    def _next_batch(self):
+        """Claim a key and take its next batch; None once closed"""
+        with self._condition:
+            while not self._ready and not self._closed:
+                self._condition.wait()
+            if self._closed:
+                return None
+            key = self._ready.popleft()
+            entries = self._pending[key]
+            count = 1
+            if self.batchable(key):
+                deadline = entries[0][2] + self.max_wait
+                while len(entries) < self.max_batch and not self._closed:
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                count = min(len(entries), self.max_batch)
+            batch = [entries.popleft() for _ in range(count)]
+            self._size -= count
+            if entries:
+                # The rest goes back for whichever worker is free next
+                self._ready.append(key)
+                self._condition.notify_all()
+            else:
+                del self._pending[key]
+                self._scheduled.discard(key)
+            return key, batch
+
+    def _work(self):
+        while True:
+            claimed = self._next_batch()
+            if claimed is None:
+                return
+            self._run(*claimed)
+
+    def _run(self, key, entries):
+        now = time.perf_counter()
+        for _, _, queued in entries:
+            metrics.observe('service_queue_wait', now - queued)
+        metrics.increment('service_batches')
+        metrics.increment('service_batched_items', len(entries))
+        try:
+            results = self.process_batch(key, [item for item, _, _ in entries])
+        except Exception as e:
+            for _, future, _ in entries:
+                future.set_exception(e)
+            return
+        for (_, future, _), result in zip(entries, results):
+            future.set_result(result)
+
+
+class RecognitionService:
+    """The pipeline behind the HTTP handler: batched OCR and cached translation"""
+
+    def __init__(self, workers=None, max_batch=16, max_wait=0.01, max_queue=256,
+                 tile_workers=None, budget=5.0, timeout=60.0, libretranslate_url=None,
+                 cache_path=None, max_requests=64):
+        self.ocr_pool = TesseractEnginePool()
+        self.registry = default_registry(self.ocr_pool)
+        # Engines are warmed on the registry's pool; batcher threads create their
+        # Tesseract handles on first use
+        self.router = OcrRouter(self.registry)
+        # Requests being handled, from reading the body to the response
+        self.request_slots = threading.BoundedSemaphore(max_requests)
+        self.max_requests = max_requests
+        self.engine_names = ['auto'] + [engine.name for engine in self.registry.available()]
+        self.budget = budget
+        self.timeout = timeout
+        self.batcher = MicroBatcher(self.process_batch, self.batchable, max_batch, max_wait,
+                                    workers, max_queue)
+        self.tile_executor = ThreadPoolExecutor(
+            max_workers=tile_workers or min(8, os.cpu_count() or 1), thread_name_prefix='tile')
+        backend = (LibreTranslateBackend(libretranslate_url) if libretranslate_url
+                   else GoogletransBackend())
+        self.translator = BatchTranslator(backend, TranslationCache(cache_path))
+
+    def batchable(self, key):
+        engine = key[0]
+        return engine != 'auto' and self.registry.get(engine).batches_model_calls
+
+    def process_batch(self, key, batch):
+        engine, lang, psm = key
+        if engine == 'auto':
+            return [self.router.recognize(processed, lang, self.budget, prefer_accuracy=True,
+                                          psm=psm).text
+                    for processed in batch]
+        return [text for text, _ in self.registry.get(engine).recognize_batch(batch, lang, psm)]
+
+    def ocr_function(self, engine, lang):
+        """ocr(processed, psm) that goes through the batching queue"""
+        if engine not in self.engine_names:
+            raise ValueError(f"Unknown engine '{engine}', expected one of {self.engine_names}")
+
+        def ocr(processed, psm=6):
+            # ``preprocess`` reuses a per-thread buffer; a request that timed out must
+            # not leave its queued frame pointing at the next request's pixels
+            future = self.batcher.submit((engine, lang, psm), processed.copy())
+            return future.result(timeout=self.timeout)
+        return ocr
+
+    def recognize(self, gray, engine='auto', lang='eng', source=None, translate_to=None):
+        ocr = self.ocr_function(engine, lang)
+        if is_large(gray):
+            text = recognize_page(gray, ocr, self.tile_executor)
+        else:
+            text = recognize(gray, ocr)
+        translation = None
+        if text and translate_to:
+            translation = self.translate(text, source or 'auto', translate_to)
+        return {'text': text, 'translation': translation}
+
+    def translate(self, text, source, target):
+        return self.translator.translate(text, source, target)
+
+    def close(self):
+        self.batcher.close()
+        self.tile_executor.shutdown(wait=False, cancel_futures=True)
+        self.registry.close()
+        self.ocr_pool.close()
+
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    """HTTP front end; ``service`` is set on the subclass made by ``make_server``"""
+
+    service = None
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        logging.debug(f"{self.address_string()} {format % args}")
+
+    def _send(self, body, status=200, content_type='application/json', headers=None):
+        if not isinstance(body, bytes):
+            body = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_body(self):
+        length = int(self.headers.get('Content-Length', 0))
+        if length > MAX_BODY:
+            raise ValueError(f"Request body over {MAX_BODY} bytes")
+        return self.rfile.read(length)
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path == '/health':
+            return self._send({'status': 'ok', 'queued': self.service.batcher.depth,
+                               'engines': self.service.engine_names})
+        if path == '/metrics':
+            return self._send(metrics.to_prometheus().encode('utf-8'),
+                              content_type='text/plain; version=0.0.4')
+        self._send({'error': 'Not found'}, 404)
+
+    def do_POST(self):
+        if not self.service.request_slots.acquire(blocking=False):
+            metrics.increment('service_rejected')
+            # The body is left unread, so the connection cannot be reused
+            self.close_connection = True
+            return self._send({'error': f"{self.service.max_requests} requests already "
+                                        f"in progress"}, 503,
+                              headers={'Retry-After': '1', 'Connection': 'close'})
+        try:
+            self.handle_post()
+        finally:
+            self.service.request_slots.release()
+
+    def handle_post(self):
+        url = urlparse(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        start = time.perf_counter()
+        try:
+            body = self._read_body()
+            if url.path == '/recognize':
+                with metrics.span('service_recognize'):
+                    result = self.recognize(body, params)
+            elif url.path == '/translate':
+                with metrics.span('service_translate'):
+                    result = self.translate(body)
+            else:
+                return self._send({'error': 'Not found'}, 404)
+        except QueueFull as e:
+            return self._send({'error': str(e)}, 503, headers={'Retry-After': '1'})
+        except FutureTimeout:
+            return self._send({'error': 'Recognition timed out'}, 504)
+        except ValueError as e:
+            return self._send({'error': str(e)}, 400)
+        except Exception as e:
+            logging.error(f"Service error on {url.path}: {e}")
+            return self._send({'error': str(e)}, 500)
+        result['seconds'] = round(time.perf_counter() - start, 4)
+        self._send(result)
+
+    def recognize(self, body, params):
+        if self.headers.get('Content-Type', '').startswith('application/json'):
+            payload = json.loads(body or b'{}')
+            if not isinstance(payload, dict):
+                raise ValueError("The JSON body must be an object")
+            params = {**params, **{key: value for key, value in payload.items()
+                                   if key != 'image'}}
+            try:
+                body = base64.b64decode(payload.get('image', ''), validate=True)
+            except binascii.Error:
+                raise ValueError("'image' is not valid base64")
+        gray = cv2.imdecode(np.frombuffer(body, np.uint8), cv2.IMREAD_GRAYSCALE)
+        if gray is None:
+            raise ValueError("Could not decode the image")
+        return self.service.recognize(gray, params.get('engine', 'auto'),
+                                      params.get('lang', 'eng'), params.get('source'),
+                                      params.get('translate_to'))
+
+    def translate(self, body):
+        payload = json.loads(body or b'{}')
+        if not isinstance(payload, dict):
+            raise ValueError("The JSON body must be an object")
+        query, source, target = payload.get('q'), payload.get('source', 'auto'), \
+            payload.get('target')
+        if query is None or not target:
+            raise ValueError("'q' and 'target' are required")
+        texts = query if isinstance(query, list) else [query]
+        if not all(isinstance(text, str) for text in texts):
+            raise ValueError("'q' must be a string or a list of strings")
+        if isinstance(query, list):
+            # Every segment of every text in one coalesced batch
+            return {'translatedText': self.service.translator.translate_many(query, source,
+                                                                             target)}
+        return {'translatedText': self.service.translate(query, source, target)}
+
+
+class ServiceServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Bursts of clients are queued by the batcher, not refused by the socket
+    request_queue_size = 128
+
+
+def make_server(service, host='127.0.0.1', port=8750):
+    handler = type('Handler', (ServiceHandler,), {'service': service})
+    return ServiceServer((host, port), handler)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Handwriting recognition HTTP service")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8750)
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help="OCR worker threads draining the queue")
+    parser.add_argument('--tile-workers', type=int, default=None,
+                        help="Threads splitting large pages into tiles")
+    parser.add_argument('--max-batch', type=int, default=16)
+    parser.add_argument('--max-wait', type=float, default=0.01,
+                        help="Seconds a worker waits to fill a batch")
+    parser.add_argument('--max-queue', type=int, default=256,
+                        help="Queued OCR calls before requests are refused with 503")
+    parser.add_argument('--max-requests', type=int, default=64,
+                        help="Requests handled at once before new ones are refused with 503")
+    parser.add_argument('--budget', type=float, default=5.0,
+                        help="Latency budget in seconds for the 'auto' engine")
+    parser.add_argument('--timeout', type=float, default=60.0)
+    parser.add_argument('--libretranslate-url', default=None,
+                        help="Translate through this LibreTranslate endpoint instead of Google")
+    parser.add_argument('--cache', default=os.path.join(
+        os.path.expanduser('~'), '.handwriting_app', 'translations.sqlite3'))
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    service = RecognitionService(args.workers, args.max_batch, args.max_wait, args.max_queue,
+                                 args.tile_workers, args.budget, args.timeout,
+                                 args.libretranslate_url, args.cache, args.max_requests)
+    server = make_server(service, args.host, args.port)
+    logging.info(f"Serving on http://{args.host}:{args.port} with {args.workers} workers, "
+                 f"engines: {', '.join(service.engine_names)}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+
+
+if __name__ == "__main__":
+    main()
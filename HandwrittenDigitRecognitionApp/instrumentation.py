@@ -0,0 +1,222 @@
+"""Lightweight timing spans, counters and rolling histograms for the hot path
+
+Stages are wrapped in ``metrics.span(name)``; each span records its duration
+into a rolling histogram (the last ``window`` samples, plus lifetime count
+and sum) and failures are counted separately. The registry can be dumped as
+JSON or Prometheus text, shown live in a Tk debug panel, and asked to run
+cProfile over the next single recognition.
+
+Recording a span costs two ``perf_counter`` calls and one lock acquisition,
+so the instrumentation stays on all the time.
+"""
+import cProfile
+import io
+import json
+import logging
+import pstats
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+
+import numpy as np
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class RollingHistogram:
+    """The most recent samples of one stage plus lifetime totals"""
+
+    def __init__(self, window=1024):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value):
+        self.samples.append(value)
+        self.count += 1
+        self.total += value
+
+    def summary(self):
+        values = np.fromiter(self.samples, dtype=np.float64, count=len(self.samples))
+        summary = {'count': self.count, 'sum': self.total}
+        if len(values):
+            summary['max'] = float(values.max())
+            for quantile, value in zip(QUANTILES, np.quantile(values, QUANTILES)):
+                summary[f'p{int(quantile * 100)}'] = float(value)
+        return summary
+
+
+class MetricsRegistry:
+    """Thread-safe named counters and stage histograms"""
+
+    def __init__(self, window=1024):
+        self.window = window
+        self.counters = {}
+        self.histograms = {}
+        self.last_profile = None
+        self._profile_next = False
+        self._lock = threading.Lock()
+
+    def increment(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, name, seconds):
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = RollingHistogram(self.window)
+            histogram.observe(seconds)
+
+    @contextmanager
+    def span(self, name):
+        """Time the enclosed block as one sample of stage ``name``"""
+        start = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            self.increment(f'{name}_errors')
+            raise
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def timed(self, name):
+        """Decorator form of ``span``"""
+        def decorator(function):
+            @wraps(function)
+            def wrapper(*args, **kwargs):
+                with self.span(name):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def profile_next(self):
+        """Run cProfile over the next ``profiled`` block only"""
+        self._profile_next = True
+
+    @contextmanager
+    def profiled(self, name, limit=30):
+        """Profile the enclosed block if ``profile_next`` was requested
+
+        Only the calling thread is profiled. The report (sorted by
+        cumulative time) is logged and kept in ``last_profile``.
+        """
+        with self._lock:
+            armed, self._profile_next = self._profile_next, False
+        if not armed:
+            yield
+            return
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            stream = io.StringIO()
+            pstats.Stats(profiler, stream=stream).sort_stats('cumulative').print_stats(limit)
+            self.last_profile = stream.getvalue()
+            logging.info(f"Profile of {name}:\n{self.last_profile}")
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    def snapshot(self):
+        """Counters and per-stage summaries (seconds) as plain data"""
+        with self._lock:
+            return {
+                'counters': dict(self.counters),
+                'stages': {name: histogram.summary()
+                           for name, histogram in self.histograms.items()},
+            }
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), indent=2, sort_keys=True)
+
+    def to_prometheus(self, prefix='handwriting'):
+        """Prometheus text exposition: counters as ``_total``, stages as a summary"""
+        snapshot = self.snapshot()
+        lines = []
+        for name, value in sorted(snapshot['counters'].items()):
+            metric = f"{prefix}_{re.sub(r'[^a-zA-Z0-9_]', '_', name)}_total"
+            lines += [f'# TYPE {metric} counter', f'{metric} {value}']
+
+        metric = f'{prefix}_stage_seconds'
+        lines.append(f'# TYPE {metric} summary')
+        for name, summary in sorted(snapshot['stages'].items()):
+            for quantile in QUANTILES:
+                key = f'p{int(quantile * 100)}'
+                if key in summary:
+                    lines.append(f'{metric}{{stage="{name}",quantile="{quantile}"}} '
+                                 f'{summary[key]:.6f}')
+            lines.append(f'{metric}_sum{{stage="{name}"}} {summary["sum"]:.6f}')
+            lines.append(f'{metric}_count{{stage="{name}"}} {summary["count"]}')
+        return '\n'.join(lines) + '\n'
+
+    def dump(self, path):
+        """Write the metrics to ``path``; .prom/.txt files get Prometheus text"""
+        text = self.to_prometheus() if path.endswith(('.prom', '.txt')) else self.to_json()
+        with open(path, 'w') as f:
+            f.write(text)
+
+
+# Registry shared by the app and its helper modules
+metrics = MetricsRegistry()
+
+
+def open_debug_panel(root, registry=metrics, refresh_ms=1000):
+    """Show a window with live stage latencies and counters
+
+    Tk is only imported here so headless tools can use the registry.
+    """
+    import tkinter as tk
+    from tkinter import filedialog, ttk
+
+    window = tk.Toplevel(root)
+    window.title("Performance")
+    columns = ('count', 'p50', 'p95', 'p99', 'max')
+    tree = ttk.Treeview(window, columns=columns, height=14)
+    tree.heading('#0', text='Stage')
+    for column in columns:
+        tree.heading(column, text=column if column == 'count' else f'{column} (ms)')
+        tree.column(column, width=80, anchor=tk.E)
+    tree.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+
+    counters_label = ttk.Label(window, justify=tk.LEFT)
+    counters_label.pack(fill=tk.X, padx=5)
+
+    def export():
+        path = filedialog.asksaveasfilename(
+            parent=window, defaultextension='.json',
+            filetypes=[("JSON", "*.json"), ("Prometheus text", "*.prom")])
+        if path:
+            registry.dump(path)
+
+    buttons = ttk.Frame(window)
+    buttons.pack(fill=tk.X, padx=5, pady=5)
+    ttk.Button(buttons, text="Export", command=export).pack(side=tk.LEFT, padx=5)
+    ttk.Button(buttons, text="Profile next recognition",
+               command=registry.profile_next).pack(side=tk.LEFT, padx=5)
+    ttk.Button(buttons, text="Reset", command=registry.reset).pack(side=tk.LEFT, padx=5)
+
+    def refresh():
+        if not window.winfo_exists():
+            return
+        snapshot = registry.snapshot()
+        tree.delete(*tree.get_children())
+        for name, summary in sorted(snapshot['stages'].items()):
+            values = [summary['count']] + [
+                f"{summary[key] * 1000:.1f}" if key in summary else '-'
+                for key in ('p50', 'p95', 'p99', 'max')
+            ]
+            tree.insert('', tk.END, text=name, values=values)
+        counters_label.config(text='  '.join(
+            f"{name}: {value}" for name, value in sorted(snapshot['counters'].items())))
+        window.after(refresh_ms, refresh)
+
+    refresh()
+    return window
@@ -0,0 +1,70 @@
+"""Deferred loading of heavy subsystems and a start-up time report
+
+The app used to import googletrans, pygame, requests, wikitextparser and the
+OCR bindings, initialize the audio mixer (twice) and build a translator
+before its window appeared. Each of those is now a ``Subsystem`` created on
+first use - or earlier, by a background warm-up that starts once the window
+is interactive. ``StartupTimer`` records how long each phase of start-up
+took so the budget can be checked on every launch.
+"""
+import logging
+import threading
+import time
+
+from instrumentation import metrics
+
+
+class Subsystem:
+    """A component built by ``factory`` on first use, exactly once, from any thread"""
+
+    def __init__(self, name, factory):
+        self.name = name
+        self.factory = factory
+        self.load_seconds = None
+        self._value = None
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        return self._loaded
+
+    def get(self):
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    start = time.perf_counter()
+                    self._value = self.factory()
+                    self.load_seconds = time.perf_counter() - start
+                    self._loaded = True
+                    metrics.observe(f'load_{self.name}', self.load_seconds)
+                    logging.info(f"Loaded {self.name} in {self.load_seconds * 1000:.0f} ms")
+        return self._value
+
+    def peek(self):
+        """The component if it has been created already, otherwise None"""
+        return self._value if self._loaded else None
+
+    def warm(self):
+        """Create the component now, logging rather than raising on failure"""
+        try:
+            self.get()
+        except Exception as e:
+            logging.warning(f"Could not preload {self.name}: {e}")
+
+
+class StartupTimer:
+    """Elapsed time from process start to each named start-up phase"""
+
+    def __init__(self, start):
+        self.start = start
+        self.marks = []
+
+    def mark(self, phase):
+        elapsed = time.perf_counter() - self.start
+        self.marks.append((phase, elapsed))
+        metrics.observe(f'startup_{phase}', elapsed)
+        return elapsed
+
+    def report(self):
+        return ', '.join(f"{phase} {elapsed * 1000:.0f} ms" for phase, elapsed in self.marks)
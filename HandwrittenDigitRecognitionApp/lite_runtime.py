@@ -0,0 +1,96 @@
+"""Run exported CNN models without TensorFlow or Keras
+
+``export_model.py`` converts the shipped Keras models to TFLite and/or ONNX,
+optionally with int8 weights and activations. ``LiteModel`` loads either
+format with the smallest runtime available (``tflite_runtime``/LiteRT or
+``onnxruntime``) and exposes the ``predict(batch)`` call the recognizer
+already uses, taking float images in [0, 1] and returning float class
+probabilities whatever the model's internal quantization.
+"""
+import logging
+import os
+import threading
+
+import numpy as np
+
+EXPORT_SUFFIXES = ('.tflite', '.onnx')
+
+
+def load_tflite_interpreter(path, num_threads=None):
+    """Create a TFLite interpreter from the lightest package installed"""
+    try:
+        from tflite_runtime.interpreter import Interpreter
+    except ImportError:
+        try:
+            from ai_edge_litert.interpreter import Interpreter
+        except ImportError:
+            # Full TensorFlow still works, it just costs the heavy import
+            from tensorflow.lite import Interpreter
+    return Interpreter(model_path=path, num_threads=num_threads)
+
+
+class LiteModel:
+    """Batch classifier over an exported .tflite or .onnx model"""
+
+    def __init__(self, path, num_threads=None):
+        self.path = path
+        self.format = os.path.splitext(path)[1].lower()
+        if self.format not in EXPORT_SUFFIXES:
+            raise ValueError(f"Unsupported model format: {path}")
+        self.num_threads = num_threads or os.cpu_count()
+        # Interpreters are not thread safe and hold one resizable input shape
+        self._lock = threading.Lock()
+        if self.format == '.tflite':
+            self._load_tflite()
+        else:
+            self._load_onnx()
+        logging.info(f"Loaded {self.format[1:]} model {path}")
+
+    def _load_tflite(self):
+        self.interpreter = load_tflite_interpreter(self.path, self.num_threads)
+        self.interpreter.allocate_tensors()
+        self.input = self.interpreter.get_input_details()[0]
+        self.output = self.interpreter.get_output_details()[0]
+        self.batch_size = None
+
+    def _load_onnx(self):
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = self.num_threads
+        self.session = ort.InferenceSession(self.path, options,
+                                            providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+
+    @staticmethod
+    def _quantize(batch, details):
+        scale, zero_point = details['quantization']
+        if not scale:
+            return batch.astype(details['dtype'])
+        info = np.iinfo(details['dtype'])
+        quantized = np.round(batch / scale + zero_point)
+        return np.clip(quantized, info.min, info.max).astype(details['dtype'])
+
+    @staticmethod
+    def _dequantize(values, details):
+        scale, zero_point = details['quantization']
+        if not scale:
+            return values.astype(np.float32)
+        return (values.astype(np.float32) - zero_point) * scale
+
+    def predict(self, batch, verbose=0):
+        """Class probabilities for a float (N, 28, 28, 1) batch"""
+        batch = np.asarray(batch, dtype=np.float32)
+        with self._lock:
+            if self.format == '.onnx':
+                return self.session.run(None, {self.input_name: batch})[0]
+
+            interpreter = self.interpreter
+            if self.batch_size != len(batch):
+                interpreter.resize_tensor_input(self.input['index'], batch.shape)
+                interpreter.allocate_tensors()
+                self.input = interpreter.get_input_details()[0]
+                self.output = interpreter.get_output_details()[0]
+                self.batch_size = len(batch)
+            interpreter.set_tensor(self.input['index'], self._quantize(batch, self.input))
+            interpreter.invoke()
+            return self._dequantize(interpreter.get_tensor(self.output['index']), self.output)
@@ -0,0 +1,80 @@
+"""Per-language OCR settings and script-to-language resolution
+
+Tesseract used to run with an ASCII-only character whitelist whatever the
+source language, which made Chinese, Russian or Hindi unrecognizable and
+dropped the accents of Spanish or French. ``whitelist_for`` gives Latin
+languages ASCII plus their own letters and lets every other script run
+unrestricted.
+
+``resolve_language`` turns the script found by Tesseract's orientation and
+script detection (OSD) into the language model to use: the selected language
+when the script matches it, otherwise that script's default language.
+"""
+ASCII_ALPHANUMERIC = 'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789'
+
+# Letters beyond ASCII used by each Latin-script language
+LATIN_LETTERS = {
+    'eng': '',
+    'tgl': 'ñÑ',
+    'ceb': 'ñÑ',
+    'spa': 'áéíóúüñÁÉÍÓÚÜÑ',
+    'fra': 'àâæçéèêëîïôœùûüÿÀÂÆÇÉÈÊËÎÏÔŒÙÛÜŸ',
+    'deu': 'äöüßÄÖÜ',
+    'ita': 'àèéìíîòóùúÀÈÉÌÍÎÒÓÙÚ',
+    'por': 'áâãàçéêíóôõúÁÂÃÀÇÉÊÍÓÔÕÚ',
+    'nld': 'éëïóöüÉËÏÓÖÜ',
+    'tur': 'çğıöşüÇĞİÖŞÜ',
+    'vie': 'àáâãèéêìíòóôõùúýăđĩũơưạảấầẩẫậắằẳẵặẹẻẽếềểễệỉịọỏốồổỗộớờởỡợụủứừửữựỳỵỷỹ'
+           'ÀÁÂÃÈÉÊÌÍÒÓÔÕÙÚÝĂĐĨŨƠƯẠẢẤẦẨẪẬẮẰẲẴẶẸẺẼẾỀỂỄỆỈỊỌỎỐỒỔỖỘỚỜỞỠỢỤỦỨỪỬỮỰỲỴỶỸ',
+    'pol': 'ąćęłńóśźżĄĆĘŁŃÓŚŹŻ',
+    'ind': '',
+    'swe': 'åäöÅÄÖ',
+}
+
+# Scripts each language is written in, named as Tesseract's OSD names them
+LANGUAGE_SCRIPTS = {
+    'chi_sim': {'Han'},
+    'jpn': {'Japanese', 'Han', 'Katakana', 'Hiragana'},
+    'kor': {'Hangul', 'Han'},
+    'rus': {'Cyrillic'},
+    'ara': {'Arabic'},
+    'ell': {'Greek'},
+    'hin': {'Devanagari'},
+    'tha': {'Thai'},
+}
+LANGUAGE_SCRIPTS.update({lang: {'Latin'} for lang in LATIN_LETTERS})
+
+# Language used for a detected script when the selected one is written differently
+SCRIPT_LANGUAGES = {
+    'Latin': 'eng',
+    'Han': 'chi_sim',
+    'Japanese': 'jpn',
+    'Katakana': 'jpn',
+    'Hiragana': 'jpn',
+    'Hangul': 'kor',
+    'Cyrillic': 'rus',
+    'Arabic': 'ara',
+    'Greek': 'ell',
+    'Devanagari': 'hin',
+    'Thai': 'tha',
+}
+
+# OSD script confidences below this are mostly noise on handwriting
+MIN_SCRIPT_CONFIDENCE = 1.5
+
+
+def whitelist_for(lang):
+    """Character whitelist for ``lang``, or '' (no restriction) for non-Latin scripts"""
+    letters = LATIN_LETTERS.get(lang)
+    if letters is None:
+        return ''
+    return ASCII_ALPHANUMERIC + letters
+
+
+def resolve_language(selected, script, confidence, min_confidence=MIN_SCRIPT_CONFIDENCE):
+    """Language model to use for text in ``script`` when ``selected`` was chosen"""
+    if not script or confidence < min_confidence:
+        return selected
+    if script in LANGUAGE_SCRIPTS.get(selected, ()) or script not in SCRIPT_LANGUAGES:
+        return selected
+    return SCRIPT_LANGUAGES[script]
@@ -0,0 +1,475 @@
+"""Registry of OCR engines with a warm model pool and latency-budget routing
+
+Every engine declares the Tesseract-style language codes it reads, its
+expected latency per frame (refined from measured calls), whether it reports
+a confidence, and an accuracy rank. Engines are loaded once, on first use or
+in the background by ``OcrRegistry.warm``, and then shared by every caller.
+
+``OcrRouter`` picks the fastest loaded engine whose expected latency fits a
+request's budget. When that engine's confidence is below the threshold and
+the remaining budget allows, it escalates to more accurate engines and keeps
+the most confident answer. Real-time recognition passes a tight budget and
+gets the cheap engine; an explicit Recognize passes a generous one and
+prefers accuracy. Unloaded engines are never loaded mid-request: only when
+a request ends below the confidence threshold is the next engine in
+escalation order warmed, one at a time, for later requests. The one
+exception is a cold start, when no engine that reads whole text is loaded:
+the cheapest such engine is loaded by that request. Glyph classifiers like
+the CNNs never stand in for one.
+
+Tesseract keeps one handle per thread. Once its model has loaded on any
+thread it counts as loaded, and every other thread creates its own handle
+on first use.
+
+All engines take the white-on-black binary frame produced by ``preprocess``
+and return ``(text, confidence)`` with confidence in [0, 1] or None.
+"""
+import importlib.util
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from instrumentation import metrics
+from segmentation import line_bands
+
+# Languages of the app's combobox, as Tesseract codes
+ALL_LANGUAGES = frozenset({
+    'eng', 'tgl', 'ceb', 'spa', 'fra', 'deu', 'chi_sim', 'jpn', 'ita', 'por', 'rus', 'kor',
+    'ara', 'nld', 'ell', 'hin', 'tur', 'vie', 'tha', 'pol', 'ind', 'swe',
+})
+
+EASYOCR_LANGUAGES = {
+    'eng': 'en', 'tgl': 'tl', 'spa': 'es', 'fra': 'fr', 'deu': 'de', 'chi_sim': 'ch_sim',
+    'jpn': 'ja', 'ita': 'it', 'por': 'pt', 'rus': 'ru', 'kor': 'ko', 'ara': 'ar', 'nld': 'nl',
+    'hin': 'hi', 'tur': 'tr', 'vie': 'vi', 'tha': 'th', 'pol': 'pl', 'ind': 'id', 'swe': 'sv',
+}
+
+PADDLEOCR_LANGUAGES = {
+    'eng': 'en', 'chi_sim': 'ch', 'jpn': 'japan', 'kor': 'korean', 'fra': 'fr', 'deu': 'german',
+    'spa': 'es', 'ita': 'it', 'por': 'pt', 'rus': 'ru', 'ara': 'ar', 'nld': 'nl', 'hin': 'hi',
+    'tur': 'tr', 'vie': 'vi', 'pol': 'pl', 'ind': 'id', 'swe': 'sv', 'tgl': 'tl',
+}
+
+
+def black_on_white(binary, rgb=False):
+    """Invert the preprocessed frame for engines trained on dark text on light paper"""
+    image = cv2.bitwise_not(binary)
+    return cv2.cvtColor(image, cv2.COLOR_GRAY2RGB) if rgb else image
+
+
+def reading_order_text(items):
+    """Join (text, x, y) detections into lines, top to bottom and left to right"""
+    lines = []
+    for text, x, y in sorted(items, key=lambda item: item[2]):
+        if lines and abs(y - lines[-1][0]) < 20:
+            lines[-1][1].append((x, text))
+        else:
+            lines.append((y, [(x, text)]))
+    return '\n'.join(' '.join(text for _, text in sorted(words)) for _, words in lines)
+
+
+class OcrEngine:
+    """Base class; subclasses set the class attributes and implement ``_load``/``_recognize``"""
+
+    name = None
+    module = None            # Import that must be available for the engine to be offered
+    languages = ALL_LANGUAGES
+    expected_latency = 0.5   # Seconds per frame, refined from measurements
+    reports_confidence = True
+    accuracy = 1             # Higher is more accurate
+    routable = True          # Whether the router may choose it automatically
+    thread_safe = False
+    batches_model_calls = False  # Whether recognize_batch is cheaper than one call per frame
+    per_thread = False       # Models are loaded per calling thread
+    reads_text = True        # Reads words and lines, not only isolated glyphs
+
+    def __init__(self):
+        self.loaded_languages = set()
+        self._load_lock = threading.Lock()
+        self._call_lock = threading.Lock()
+
+    @property
+    def available(self):
+        return importlib.util.find_spec(self.module) is not None
+
+    def supports(self, lang):
+        return lang in self.languages
+
+    def is_loaded(self, lang):
+        return lang in self.loaded_languages
+
+    def load(self, lang='eng'):
+        """Load the engine's models once; safe to call from any thread"""
+        with self._load_lock:
+            start = time.perf_counter()
+            self._load(lang)
+            if lang not in self.loaded_languages:
+                logging.info(f"Loaded OCR engine {self.name} for '{lang}' in "
+                             f"{time.perf_counter() - start:.2f}s")
+                self.loaded_languages.add(lang)
+
+    def recognize(self, processed, lang='eng', psm=6):
+        """Return (text, confidence) and update the latency estimate"""
+        self.load(lang)
+        start = time.perf_counter()
+        with metrics.span(f'ocr_{self.name}'):
+            if self.thread_safe:
+                text, confidence = self._recognize(processed, lang, psm)
+            else:
+                with self._call_lock:
+                    text, confidence = self._recognize(processed, lang, psm)
+        # Exponential moving average of the observed latency
+        self.expected_latency += 0.2 * (time.perf_counter() - start - self.expected_latency)
+        return text.strip(), confidence
+
+    def recognize_batch(self, batch, lang='eng', psm=6):
+        """Recognize several frames; engines that can batch their model call override this"""
+        return [self.recognize(processed, lang, psm) for processed in batch]
+
+    def _load(self, lang):
+        raise NotImplementedError
+
+    def _recognize(self, processed, lang, psm):
+        raise NotImplementedError
+
+
+class TesseractEngine(OcrEngine):
+    name = 'tesseract'
+    module = 'pytesseract'
+    expected_latency = 0.15
+    accuracy = 2
+    thread_safe = True  # The pool keeps one API handle per thread
+    per_thread = True
+
+    def __init__(self, pool):
+        super().__init__()
+        self.pool = pool
+
+    @property
+    def available(self):
+        return self.pool.in_process or super().available
+
+    def is_loaded(self, lang):
+        # The pytesseract fallback starts a process per call; there is nothing to keep warm.
+        # In process, a thread without a handle builds one from the model files already read
+        return lang in self.loaded_languages if self.pool.in_process else True
+
+    def _load(self, lang):
+        # Called on every use; creates the calling thread's handle the first time
+        self.pool.warm(lang)
+
+    def _recognize(self, processed, lang, psm):
+        text, confidence = self.pool.image_to_text_and_confidence(processed, lang=lang, psm=psm)
+        return ' '.join(text.strip().split()), confidence
+
+
+class CnnEngine(OcrEngine):
+    """The shipped EMNIST/MNIST classifiers; fast, Latin letters and digits only"""
+
+    module = 'cnn_recognizer'
+    languages = frozenset({'eng'})
+    expected_latency = 0.03
+    thread_safe = True  # CnnRecognizer serializes its own model calls
+    batches_model_calls = True
+    reads_text = False
+
+    def __init__(self, profile):
+        super().__init__()
+        self.name = f'cnn_{profile}'
+        self.profile = profile
+        self.recognizer = None
+        # The MNIST model only knows digits, so it is never picked automatically
+        self.routable = profile != 'mnist'
+
+    @property
+    def available(self):
+        # Needs either TensorFlow or an exported model runtime
+        return any(importlib.util.find_spec(module) is not None
+                   for module in ('tensorflow', 'tflite_runtime', 'ai_edge_litert',
+                                  'onnxruntime'))
+
+    def _load(self, lang):
+        if self.recognizer is None:
+            from cnn_recognizer import CnnRecognizer
+            self.recognizer = CnnRecognizer(self.profile)
+        self.recognizer.load()
+
+    def _recognize(self, processed, lang, psm):
+        return self.recognizer.classify(processed)
+
+    def recognize_batch(self, batch, lang='eng', psm=6):
+        # All glyphs of the batch go through one model call
+        self.load(lang)
+        with metrics.span(f'ocr_{self.name}_batch'):
+            return self.recognizer.classify_batch(batch)
+
+
+class EasyOcrEngine(OcrEngine):
+    name = 'easyocr'
+    module = 'easyocr'
+    languages = frozenset(EASYOCR_LANGUAGES)
+    expected_latency = 1.0
+    accuracy = 3
+
+    def __init__(self):
+        super().__init__()
+        self.readers = {}
+
+    def _load(self, lang):
+        if lang not in self.readers:
+            import easyocr
+            code = EASYOCR_LANGUAGES[lang]
+            # Latin-script readers also get English, as EasyOCR recommends
+            codes = [code] if code == 'en' else [code, 'en']
+            self.readers[lang] = easyocr.Reader(codes, gpu=False, verbose=False)
+
+    def _recognize(self, processed, lang, psm):
+        detections = self.readers[lang].readtext(black_on_white(processed))
+        if not detections:
+            return '', 0.0
+        items = [(text, box[0][0], box[0][1]) for box, text, _ in detections]
+        confidence = float(np.mean([score for _, _, score in detections]))
+        return reading_order_text(items), confidence
+
+
+class PaddleOcrEngine(OcrEngine):
+    name = 'paddleocr'
+    module = 'paddleocr'
+    languages = frozenset(PADDLEOCR_LANGUAGES)
+    expected_latency = 0.8
+    accuracy = 3
+
+    def __init__(self):
+        super().__init__()
+        self.models = {}
+
+    def _load(self, lang):
+        if lang not in self.models:
+            from paddleocr import PaddleOCR
+            self.models[lang] = PaddleOCR(lang=PADDLEOCR_LANGUAGES[lang], use_angle_cls=False,
+                                          show_log=False)
+
+    def _recognize(self, processed, lang, psm):
+        pages = self.models[lang].ocr(black_on_white(processed, rgb=True), cls=False)
+        detections = (pages[0] if pages else None) or []
+        if not detections:
+            return '', 0.0
+        items = [(text, box[0][0], box[0][1]) for box, (text, _) in detections]
+        confidence = float(np.mean([score for _, (_, score) in detections]))
+        return reading_order_text(items), confidence
+
+
+class KerasOcrEngine(OcrEngine):
+    name = 'keras_ocr'
+    module = 'keras_ocr'
+    languages = frozenset({'eng'})
+    expected_latency = 2.0
+    reports_confidence = False
+    accuracy = 2
+
+    def __init__(self):
+        super().__init__()
+        self.pipeline = None
+
+    def _load(self, lang):
+        if self.pipeline is None:
+            import keras_ocr
+            self.pipeline = keras_ocr.pipeline.Pipeline()
+
+    def _recognize(self, processed, lang, psm):
+        predictions = self.pipeline.recognize([black_on_white(processed, rgb=True)])[0]
+        items = [(word, box[:, 0].min(), box[:, 1].min()) for word, box in predictions]
+        return reading_order_text(items), None
+
+
+class TrOcrEngine(OcrEngine):
+    """Transformer handwriting model, run line by line; slow but the most accurate"""
+
+    name = 'trocr'
+    module = 'transformers'
+    languages = frozenset({'eng'})
+    expected_latency = 3.0
+    accuracy = 4
+    model_name = 'microsoft/trocr-small-handwritten'
+
+    def __init__(self):
+        super().__init__()
+        self.processor = None
+        self.model = None
+
+    def _load(self, lang):
+        if self.model is None:
+            from transformers import TrOCRProcessor, VisionEncoderDecoderModel
+            self.processor = TrOCRProcessor.from_pretrained(self.model_name)
+            self.model = VisionEncoderDecoderModel.from_pretrained(self.model_name)
+            self.model.eval()
+
+    def _recognize(self, processed, lang, psm):
+        tops, bottoms = line_bands(processed > 0, line_gap=8)
+        if not len(tops):
+            return '', 0.0
+        lines = [black_on_white(processed[top:bottom + 1], rgb=True)
+                 for top, bottom in zip(tops, bottoms)]
+        pixels = self.processor(images=lines, return_tensors='pt').pixel_values
+        output = self.model.generate(pixels, return_dict_in_generate=True, output_scores=True)
+        texts = self.processor.batch_decode(output.sequences, skip_special_tokens=True)
+        # Mean token probability over every generated line
+        scores = self.model.compute_transition_scores(output.sequences, output.scores,
+                                                      normalize_logits=True)
+        confidence = float(np.exp(scores.numpy()[np.isfinite(scores.numpy())].mean()))
+        return '\n'.join(texts), confidence
+
+
+class OcrRegistry:
+    """Named engines plus a small pool that loads them in the background"""
+
+    def __init__(self):
+        self.engines = {}
+        self._warm_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix='ocr-warm')
+        self._warming = {}
+        self._warming_lock = threading.Lock()
+
+    def register(self, engine):
+        self.engines[engine.name] = engine
+        return engine
+
+    def get(self, name):
+        return self.engines[name]
+
+    def available(self):
+        """Engines whose packages are installed, in registration order"""
+        return [engine for engine in self.engines.values() if engine.available]
+
+    def candidates(self, lang):
+        return [engine for engine in self.available()
+                if engine.routable and engine.supports(lang)]
+
+    def warm(self, name, lang='eng', executor=None):
+        """Load an engine in the background; returns the future
+
+        Repeated requests for an engine and language already loading share
+        the pending load. ``executor`` runs the load instead of the registry's
+        own pool, so a per-thread engine's first handle is one that gets used.
+        """
+        engine = self.engines[name]
+        key = (name, lang)
+
+        def load():
+            try:
+                engine.load(lang)
+            except Exception as e:
+                logging.warning(f"Could not load OCR engine {name} for '{lang}': {e}")
+            finally:
+                with self._warming_lock:
+                    self._warming.pop(key, None)
+
+        with self._warming_lock:
+            future = self._warming.get(key)
+            if future is None:
+                future = self._warming[key] = (executor or self._warm_pool).submit(load)
+            return future
+
+    def close(self):
+        self._warm_pool.shutdown(wait=False, cancel_futures=True)
+
+
+class OcrResult:
+    __slots__ = ('text', 'confidence', 'engine')
+
+    def __init__(self, text, confidence, engine):
+        self.text = text
+        self.confidence = confidence
+        self.engine = engine
+
+
+class OcrRouter:
+    """Choose engines per request from a latency budget and a confidence threshold"""
+
+    def __init__(self, registry, min_confidence=0.6, executor=None):
+        self.registry = registry
+        self.min_confidence = min_confidence
+        # Where per-thread engines are warmed, when given: the pool that runs recognitions
+        self.executor = executor
+
+    def plan(self, lang, budget, prefer_accuracy=False):
+        """Engines to try, in order, for a request with ``budget`` seconds"""
+        def cheapest(engines):
+            return sorted(engines, key=lambda engine: engine.expected_latency)[:1]
+
+        candidates = self.registry.candidates(lang)
+        pool = [engine for engine in candidates if engine.is_loaded(lang)]
+        if not any(engine.reads_text for engine in pool):
+            # Cold start: the cheapest engine that reads text is loaded by this request
+            readers = cheapest(engine for engine in candidates if engine.reads_text)
+            pool += readers or ([] if pool else cheapest(candidates))
+
+        fitting = [engine for engine in pool if engine.expected_latency <= budget]
+        if not any(engine.reads_text for engine in fitting):
+            # A glyph classifier alone is no match for real text; keep a reader even over budget
+            fitting += cheapest(engine for engine in pool if engine.reads_text)
+        if not fitting:
+            fitting = cheapest(pool)
+        if prefer_accuracy:
+            return sorted(fitting, key=lambda engine: (-engine.accuracy,
+                                                       engine.expected_latency))
+        # Cheapest first, then escalation to increasingly accurate engines
+        first = min(fitting, key=lambda engine: engine.expected_latency)
+        heavier = sorted((engine for engine in fitting if engine.accuracy > first.accuracy),
+                         key=lambda engine: (engine.accuracy, engine.expected_latency))
+        return [first] + heavier
+
+    def recognize(self, processed, lang='eng', budget=0.3, prefer_accuracy=False, psm=6):
+        """Recognize within ``budget`` seconds, escalating on low confidence"""
+        plan = self.plan(lang, budget, prefer_accuracy)
+        if not plan:
+            raise RuntimeError(f"No OCR engine available for '{lang}'")
+
+        deadline = time.perf_counter() + budget
+        best = None
+        for engine in plan:
+            if best is not None and time.perf_counter() + engine.expected_latency > deadline:
+                break
+            try:
+                text, confidence = engine.recognize(processed, lang, psm)
+            except Exception as e:
+                logging.error(f"OCR engine {engine.name} failed: {e}")
+                continue
+            result = OcrResult(text, confidence, engine.name)
+            if best is None or (confidence or 0) > (best.confidence or 0):
+                best = result
+            if confidence is not None and confidence >= self.min_confidence:
+                break
+            metrics.increment('ocr_escalations')
+        if best is None:
+            raise RuntimeError("Every OCR engine failed")
+        if best.confidence is None or best.confidence < self.min_confidence:
+            self.warm_next(lang, budget, max(engine.accuracy for engine in plan))
+        return best
+
+    def warm_next(self, lang, budget, accuracy):
+        """Warm the next unloaded engine more accurate than ``accuracy`` that fits the budget"""
+        escalation = sorted(self.registry.candidates(lang),
+                            key=lambda engine: (engine.accuracy, engine.expected_latency))
+        for engine in escalation:
+            if (engine.accuracy > accuracy and engine.expected_latency <= budget
+                    and not engine.is_loaded(lang)):
+                self.registry.warm(engine.name, lang,
+                                   self.executor if engine.per_thread else None)
+                return
+
+
+def default_registry(tesseract_pool):
+    """Registry with every engine the app knows about"""
+    registry = OcrRegistry()
+    registry.register(TesseractEngine(tesseract_pool))
+    registry.register(CnnEngine('emnist'))
+    registry.register(CnnEngine('mnist'))
+    registry.register(EasyOcrEngine())
+    registry.register(PaddleOcrEngine())
+    registry.register(KerasOcrEngine())
+    registry.register(TrOcrEngine())
+    return registry
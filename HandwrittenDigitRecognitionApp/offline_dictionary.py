@@ -0,0 +1,249 @@
+"""Offline dictionary and IPA store backed by SQLite
+
+Definitions and pronunciations are imported once from a Wiktionary dump in
+the JSON-lines format produced by wiktextract (https://kaikki.org), one
+entry per line with ``word``, ``lang_code``, ``pos``, ``senses`` and
+``sounds``. Lookups are indexed on (lang, word) so an exact hit takes well
+under a millisecond; prefix queries use the same index and fuzzy matching
+for OCR typos draws its candidates from an FTS5 trigram index.
+
+Usage:
+    python offline_dictionary.py import kaikki-spanish.jsonl.gz --lang es
+    python offline_dictionary.py lookup hola --lang es
+"""
+import argparse
+import bz2
+import difflib
+import gzip
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+DEFAULT_DB_PATH = os.path.join(Path.home(), '.handwriting_app', 'dictionary.sqlite3')
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS entries (
+    word TEXT NOT NULL,
+    lang TEXT NOT NULL,
+    pos TEXT,
+    definition TEXT NOT NULL,
+    example TEXT
+);
+CREATE TABLE IF NOT EXISTS pronunciations (
+    word TEXT NOT NULL,
+    lang TEXT NOT NULL,
+    ipa TEXT NOT NULL,
+    PRIMARY KEY (lang, word)
+);
+'''
+
+# One row per sense, so importing an overlapping dump again adds nothing;
+# (lang, word) lookups use the same index
+UNIQUE_INDEX = '''
+CREATE UNIQUE INDEX IF NOT EXISTS entries_unique ON entries (lang, word, pos, definition);
+'''
+
+
+def base_language(lang_code):
+    """Google Translate codes such as 'zh-cn' map to the dump's 'zh'"""
+    return lang_code.split('-')[0].lower()
+
+
+def open_dump(path):
+    """Open a plain, gzip or bzip2 compressed JSON-lines dump as text"""
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8')
+    if path.endswith('.bz2'):
+        return bz2.open(path, 'rt', encoding='utf-8')
+    return open(path, encoding='utf-8')
+
+
+def parse_entry(entry, max_senses=3):
+    """Turn one wiktextract entry into (definition rows, ipa or None)"""
+    word = entry.get('word', '').strip().lower()
+    lang = base_language(entry.get('lang_code', ''))
+    if not word or not lang:
+        return [], None
+
+    rows = []
+    for sense in entry.get('senses', [])[:max_senses]:
+        glosses = sense.get('glosses') or sense.get('raw_glosses')
+        if not glosses:
+            continue
+        examples = sense.get('examples') or [{}]
+        rows.append((word, lang, entry.get('pos') or '', glosses[0],
+                     examples[0].get('text')))
+
+    ipa = next((sound['ipa'] for sound in entry.get('sounds', []) if sound.get('ipa')), None)
+    return rows, ((word, lang, ipa) if ipa else None)
+
+
+def import_dump(dump_path, db_path=DEFAULT_DB_PATH, langs=None, batch_size=5000):
+    """Build (or extend) the offline store from a wiktextract JSON-lines dump"""
+    langs = {base_language(lang) for lang in langs} if langs else None
+    os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+    db = sqlite3.connect(db_path)
+    db.executescript(SCHEMA)
+    # Bulk load: no journal
+    db.execute('PRAGMA journal_mode=OFF')
+    db.execute('PRAGMA synchronous=OFF')
+    if not db.execute("SELECT 1 FROM sqlite_master WHERE name = 'entries_unique'").fetchone():
+        # Stores imported before entries had a unique key may hold duplicates
+        db.execute('DELETE FROM entries WHERE rowid NOT IN ('
+                   ' SELECT MIN(rowid) FROM entries GROUP BY lang, word, pos, definition)')
+        db.execute('DROP INDEX IF EXISTS entries_lang_word')
+        db.executescript(UNIQUE_INDEX)
+
+    start = time.time()
+    entries, pronunciations = [], []
+    before = db.execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+    with open_dump(dump_path) as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if langs and base_language(entry.get('lang_code', '')) not in langs:
+                continue
+            rows, ipa = parse_entry(entry)
+            entries.extend(rows)
+            if ipa:
+                pronunciations.append(ipa)
+            if len(entries) >= batch_size:
+                db.executemany('INSERT OR IGNORE INTO entries VALUES (?, ?, ?, ?, ?)', entries)
+                db.executemany('INSERT OR IGNORE INTO pronunciations VALUES (?, ?, ?)',
+                               pronunciations)
+                entries, pronunciations = [], []
+
+    db.executemany('INSERT OR IGNORE INTO entries VALUES (?, ?, ?, ?, ?)', entries)
+    db.executemany('INSERT OR IGNORE INTO pronunciations VALUES (?, ?, ?)', pronunciations)
+
+    # Trigram index over distinct headwords for fuzzy candidate search
+    try:
+        db.execute('DROP TABLE IF EXISTS words_fts')
+        db.execute("CREATE VIRTUAL TABLE words_fts USING fts5("
+                   "word, lang UNINDEXED, tokenize='trigram')")
+        db.execute('INSERT INTO words_fts (word, lang) SELECT DISTINCT word, lang FROM entries')
+    except sqlite3.OperationalError as e:
+        logging.warning(f"FTS5 trigram index unavailable, fuzzy lookups will be slower: {e}")
+    total = db.execute('SELECT COUNT(*) FROM entries').fetchone()[0] - before
+    db.commit()
+    db.close()
+    logging.info(f"Imported {total} new definitions from {dump_path} in {time.time() - start:.1f}s")
+    return total
+
+
+class OfflineDictionary:
+    """Read-only lookups against a store built by ``import_dump``"""
+
+    def __init__(self, db_path=DEFAULT_DB_PATH):
+        if not os.path.exists(db_path):
+            raise FileNotFoundError(f"Offline dictionary not found: {db_path}")
+        self.db_path = db_path
+        self._local = threading.local()
+        self.has_fts = bool(self._db().execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'words_fts'"
+        ).fetchone())
+
+    def _db(self):
+        """One read-only connection per thread, so lookups can run concurrently"""
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True,
+                                 check_same_thread=False)
+            self._local.db = db
+        return db
+
+    def definitions(self, word, lang_code, limit=2):
+        """Return [(pos, definition, example), ...] for an exact headword"""
+        return self._db().execute(
+            'SELECT pos, definition, example FROM entries'
+            ' WHERE lang = ? AND word = ? ORDER BY rowid LIMIT ?',
+            (base_language(lang_code), word.lower(), limit)
+        ).fetchall()
+
+    def ipa(self, word, lang_code):
+        """Return the IPA transcription of a headword, or None"""
+        row = self._db().execute(
+            'SELECT ipa FROM pronunciations WHERE lang = ? AND word = ?',
+            (base_language(lang_code), word.lower())
+        ).fetchone()
+        return row[0] if row else None
+
+    def prefix(self, prefix, lang_code, limit=10):
+        """Headwords starting with ``prefix``, using the (lang, word) index"""
+        prefix = prefix.lower()
+        return [row[0] for row in self._db().execute(
+            'SELECT DISTINCT word FROM entries'
+            ' WHERE lang = ? AND word >= ? AND word < ? ORDER BY word LIMIT ?',
+            (base_language(lang_code), prefix, prefix + '\U0010ffff', limit)
+        )]
+
+    def fuzzy(self, word, lang_code, limit=5, cutoff=0.75):
+        """Closest headwords to a possibly misrecognized ``word``"""
+        word = word.lower()
+        lang = base_language(lang_code)
+        # Words sharing a trigram, plus words sharing the first letter for
+        # typos that break every trigram of a short word
+        candidates = set(self.prefix(word[:1], lang_code, limit=500))
+        if self.has_fts and len(word) >= 3:
+            trigrams = {word[i:i + 3] for i in range(len(word) - 2)}
+            query = ' OR '.join('"' + gram.replace('"', '""') + '"' for gram in trigrams)
+            candidates.update(row[0] for row in self._db().execute(
+                'SELECT word FROM words_fts WHERE words_fts MATCH ? AND lang = ?'
+                ' ORDER BY rank LIMIT 200',
+                (query, lang)
+            ))
+        return difflib.get_close_matches(word, candidates, n=limit, cutoff=cutoff)
+
+    def lookup(self, word, lang_code, limit=2):
+        """Exact definitions, falling back to the closest fuzzy match
+
+        Returns (matched word, [(pos, definition, example), ...]).
+        """
+        rows = self.definitions(word, lang_code, limit)
+        if rows:
+            return word.lower(), rows
+        for match in self.fuzzy(word, lang_code, limit=1):
+            rows = self.definitions(match, lang_code, limit)
+            if rows:
+                return match, rows
+        return None, []
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or query the offline dictionary")
+    parser.add_argument('--db', default=DEFAULT_DB_PATH, help="SQLite store path")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    importer = commands.add_parser('import', help="Import a wiktextract JSON-lines dump")
+    importer.add_argument('dump', help="Dump file (.jsonl, .jsonl.gz or .jsonl.bz2)")
+    importer.add_argument('--lang', action='append', help="Only import these language codes")
+
+    lookup = commands.add_parser('lookup', help="Look a word up")
+    lookup.add_argument('word')
+    lookup.add_argument('--lang', default='en')
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    if args.command == 'import':
+        import_dump(args.dump, args.db, args.lang)
+    else:
+        dictionary = OfflineDictionary(args.db)
+        start = time.perf_counter()
+        match, rows = dictionary.lookup(args.word, args.lang)
+        elapsed = (time.perf_counter() - start) * 1000
+        print(f"{match or args.word} [{dictionary.ipa(match or args.word, args.lang)}]"
+              f" ({elapsed:.2f} ms)")
+        for pos, definition, example in rows:
+            print(f"  ({pos}) {definition}")
+            if example:
+                print(f"     Example: {example}")
+
+
+if __name__ == "__main__":
+    main()
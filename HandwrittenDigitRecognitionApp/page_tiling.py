@@ -0,0 +1,216 @@
+"""Full-resolution recognition of large pages through tiled, parallel OCR
+
+Uploaded scans used to be shrunk to the 800x400 canvas before OCR. Here the
+decoded page is analysed on a small working copy only: ink is binarized and
+smeared into text blocks, tall blocks are cut between text lines, and every
+resulting tile is cropped from the full-resolution page, preprocessed and
+OCR'd in parallel. Text is merged back in reading order. A block that is
+one unbroken band taller than a tile falls back to overlapping strips whose
+duplicated words are removed at the seams.
+
+Crops are views of the page and each worker preprocesses one tile at a
+time, so memory beyond the decoded page is bounded by workers x tile size.
+JPEG pages above ``MAX_PIXELS`` are decoded at reduced resolution, which
+libjpeg does without materializing the full image. Other formats cannot be
+decoded that way and are refused above ``MAX_PIXELS``.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from instrumentation import metrics
+from preprocessing import preprocess
+from segmentation import line_bands
+
+MAX_PIXELS = 80_000_000
+WORK_SIDE = 1600
+MAX_TILE_HEIGHT = 1200
+OVERLAP = 96
+LARGE_SIDE = 1600
+
+# Decoder flags halving the resolution once, twice and three times
+_REDUCED_FLAGS = (cv2.IMREAD_REDUCED_GRAYSCALE_2, cv2.IMREAD_REDUCED_GRAYSCALE_4,
+                  cv2.IMREAD_REDUCED_GRAYSCALE_8)
+
+# Formats whose decoder scales down while decoding
+_REDUCIBLE_FORMATS = ('JPEG', 'MPO')
+
+_header_lock = threading.Lock()
+
+
+def read_header(path):
+    """Return (width, height, format) without PIL's decompression bomb check
+
+    The check raises for exactly the huge scans ``load_page`` exists for,
+    and only the header is read here anyway.
+    """
+    with _header_lock:
+        limit, Image.MAX_IMAGE_PIXELS = Image.MAX_IMAGE_PIXELS, None
+        try:
+            with Image.open(path) as image:
+                return image.size[0], image.size[1], image.format
+        finally:
+            Image.MAX_IMAGE_PIXELS = limit
+
+
+def load_page(path, max_pixels=MAX_PIXELS):
+    """Decode an image file as grayscale, at reduced resolution if it is a huge JPEG"""
+    width, height, image_format = read_header(path)
+    flag = cv2.IMREAD_GRAYSCALE
+    if width * height > max_pixels:
+        if image_format not in _REDUCIBLE_FORMATS:
+            raise ValueError(
+                f"{path} is {width}x{height} pixels, over the {max_pixels:,} pixel limit for "
+                f"{image_format} images; save it as JPEG or scale it down first")
+        for reduced in _REDUCED_FLAGS:
+            if width * height <= max_pixels:
+                break
+            flag = reduced
+            width, height = width // 2, height // 2
+    page = cv2.imread(path, flag)
+    if page is None:
+        raise ValueError(f"Could not read image {path}")
+    return page
+
+
+def text_blocks(gray, work_side=WORK_SIDE):
+    """Find text blocks on a small copy of the page
+
+    Returns (blocks, mask, scale): (top, bottom, left, right) boxes in page
+    coordinates, the working-copy ink mask and the page/working size ratio.
+    """
+    height, width = gray.shape[:2]
+    scale = max(1.0, max(height, width) / work_side)
+    small = gray if scale == 1.0 else cv2.resize(
+        gray, (int(width / scale), int(height / scale)), interpolation=cv2.INTER_AREA)
+    _, mask = cv2.threshold(small, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)
+    if cv2.countNonZero(mask) > mask.size // 2:
+        mask[:] = 0  # Blank page: Otsu split paper noise
+
+    # Smear words into lines and lines into paragraphs
+    kernel = np.ones((max(3, small.shape[0] // 50), max(3, small.shape[1] // 40)), np.uint8)
+    _, _, stats, _ = cv2.connectedComponentsWithStats(cv2.dilate(mask, kernel), connectivity=8)
+    blocks = []
+    margin = 4
+    for x, y, w, h, _ in stats[1:]:
+        if w * h < 64:
+            continue
+        blocks.append((
+            max(int((y - margin) * scale), 0),
+            min(int((y + h + margin) * scale), height),
+            max(int((x - margin) * scale), 0),
+            min(int((x + w + margin) * scale), width),
+        ))
+    return reading_order(blocks), mask > 0, scale
+
+
+def reading_order(blocks):
+    """Sort blocks into rows (by vertical overlap) and each row left to right"""
+    rows = []
+    for block in sorted(blocks):
+        top, bottom = block[0], block[1]
+        row = rows[-1] if rows else None
+        if row is not None and top < (row['top'] + row['bottom']) / 2:
+            row['blocks'].append(block)
+            row['bottom'] = max(row['bottom'], bottom)
+        else:
+            rows.append({'top': top, 'bottom': bottom, 'blocks': [block]})
+    return [block for row in rows for block in sorted(row['blocks'], key=lambda b: b[2])]
+
+
+def split_block(block, mask, scale, max_height=MAX_TILE_HEIGHT, overlap=OVERLAP):
+    """Cut a tall block into tiles between text lines
+
+    Returns a list of (tile, overlapped) pairs; ``overlapped`` marks strips
+    cut through ink that share ``overlap`` rows with the previous strip.
+    """
+    top, bottom, left, right = block
+    if bottom - top <= max_height:
+        return [(block, False)]
+
+    # Line bands of the block, from the working-copy mask
+    region = mask[int(top / scale):int(np.ceil(bottom / scale)),
+                  int(left / scale):int(np.ceil(right / scale))]
+    tops, bottoms = line_bands(region, line_gap=1)
+    bands = [(top + int(t * scale), min(top + int((b + 1) * scale), bottom))
+             for t, b in zip(tops, bottoms)]
+
+    tiles = []
+    start = end = None
+    for band_top, band_bottom in bands:
+        if start is not None and band_bottom - start > max_height:
+            tiles.append(((start, end, left, right), False))
+            start = None
+        if start is None:
+            start = max(band_top - 4, top)
+        end = min(band_bottom + 4, bottom)
+    if start is not None:
+        tiles.append(((start, end, left, right), False))
+
+    # A single band taller than a tile: overlapping strips
+    result = []
+    for (tile_top, tile_bottom, _, _), _ in tiles:
+        if tile_bottom - tile_top <= max_height:
+            result.append(((tile_top, tile_bottom, left, right), False))
+            continue
+        step = max_height - overlap
+        for strip_top in range(tile_top, tile_bottom - overlap, step):
+            result.append(((strip_top, min(strip_top + max_height, tile_bottom), left, right),
+                           strip_top != tile_top))
+    return result
+
+
+def merge_overlap(previous, text, max_words=12):
+    """Drop words at the start of ``text`` that repeat the end of ``previous``"""
+    before, after = previous.split(), text.split()
+    for size in range(min(max_words, len(before), len(after)), 0, -1):
+        if before[-size:] == after[:size]:
+            return ' '.join(after[size:])
+    return text
+
+
+def is_large(gray):
+    """Pages bigger than the canvas are worth tiling"""
+    return max(gray.shape[:2]) > LARGE_SIDE
+
+
+def recognize_page(gray, ocr, executor=None, max_workers=None):
+    """OCR a full-resolution grayscale page tile by tile and merge in reading order
+
+    ``ocr(processed, psm)`` must be safe to call from several threads.
+    """
+    blocks, mask, scale = text_blocks(gray)
+    tiles = [tile for block in blocks for tile in split_block(block, mask, scale)]
+    if not tiles:
+        return ''
+
+    def read_tile(box):
+        top, bottom, left, right = box
+        with metrics.span('preprocess'):
+            processed = preprocess(gray[top:bottom, left:right])
+        if processed is None:
+            return ''
+        with metrics.span('ocr_tile'):
+            return ocr(processed, psm=6)
+
+    own_executor = executor is None
+    if own_executor:
+        executor = ThreadPoolExecutor(max_workers=max_workers or min(4, os.cpu_count() or 1),
+                                      thread_name_prefix='tile')
+    try:
+        texts = list(executor.map(read_tile, [box for box, _ in tiles]))
+    finally:
+        if own_executor:
+            executor.shutdown()
+
+    parts = []
+    for (_, overlapped), text in zip(tiles, texts):
+        if overlapped and parts:
+            text = merge_overlap(parts[-1], text)
+        if text:
+            parts.append(text)
+    return '\n'.join(parts)
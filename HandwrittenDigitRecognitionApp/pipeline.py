@@ -0,0 +1,80 @@
+"""The recognition pipeline as a library, without the Tk GUI
+
+``recognize`` is the enhance + OCR step ``recognize_text`` runs on the
+canvas. ``recognize_image`` adds image loading, engine selection and an
+optional translation, and is what ``batch_recognize.py`` runs in each
+worker process. Engines are created once per process and reused.
+Translation goes through ``batch_translation.BatchTranslator``.
+"""
+import logging
+import threading
+
+import cv2
+
+from instrumentation import metrics
+from page_tiling import is_large, load_page, recognize_page
+from preprocessing import preprocess
+
+ENGINES = ('tesseract', 'emnist', 'mnist')
+
+_engines = {}
+_engines_lock = threading.Lock()
+
+
+def recognize(gray, ocr, psm=6):
+    """Preprocess a grayscale page and OCR it as a uniform block of text"""
+    with metrics.span('preprocess'):
+        processed = preprocess(gray)
+    if processed is None:
+        raise Exception("Image processing failed")
+    with metrics.span('ocr'):
+        return ocr(processed, psm=psm)
+
+
+def ocr_function(engine='tesseract', lang='eng'):
+    """This process's ocr(processed, psm) callable for an engine, created on first use"""
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown engine '{engine}', expected one of {ENGINES}")
+    with _engines_lock:
+        if engine not in _engines:
+            if engine == 'tesseract':
+                from tesseract_pool import TesseractEnginePool
+                _engines[engine] = TesseractEnginePool()
+            else:
+                from cnn_recognizer import CnnRecognizer
+                _engines[engine] = CnnRecognizer(engine)
+        backend = _engines[engine]
+
+    if engine == 'tesseract':
+        def ocr(processed, psm=6):
+            text = backend.image_to_string(processed, lang=lang, psm=psm)
+            return ' '.join(text.strip().split())
+        return ocr
+    return lambda processed, psm=6: backend.recognize(processed)
+
+
+def recognize_image(image, engine='tesseract', lang='eng', translator=None, src='en',
+                    dest=None, tile_workers=None):
+    """Recognize one image (path or grayscale array) and optionally translate it
+
+    Pages larger than the canvas are OCR'd tile by tile on ``tile_workers``
+    threads. Returns ``{'text': ..., 'translation': ...}``; the translation
+    is None unless both ``translator`` and ``dest`` are given.
+    """
+    if isinstance(image, str):
+        image = load_page(image)
+    elif image.ndim == 3:
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+    ocr = ocr_function(engine, lang)
+    if is_large(image):
+        text = recognize_page(image, ocr, max_workers=tile_workers)
+    else:
+        text = recognize(image, ocr)
+    translation = None
+    if text and translator is not None and dest:
+        try:
+            translation = translator.translate(text, src, dest)
+        except Exception as e:
+            logging.error(f"Translation error: {e}")
+    return {'text': text, 'translation': translation}
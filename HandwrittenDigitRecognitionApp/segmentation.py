@@ -0,0 +1,188 @@
+"""Line, word and glyph segmentation for binary handwriting images
+
+Works on the white-on-black binary image produced by ``enhance_image``.
+Everything is computed from connected-component statistics and projection
+profiles with numpy array operations; the only Python loop is one resize per
+glyph when the 28x28 crops are filled in. Crops are written into a
+preallocated batch array that is reused between calls, ready to be fed to a
+classifier in one go.
+"""
+import cv2
+import numpy as np
+
+# Offset that keeps the x coordinates of different lines from overlapping
+# when all glyphs are processed in a single sorted array
+_LINE_STRIDE = 1 << 20
+
+
+def line_bands(ink_mask, line_gap=8):
+    """Return (tops, bottoms) row indices of the text bands in a boolean ink mask
+
+    Rows separated by no more than ``line_gap`` blank rows belong to the same
+    band. ``bottoms`` are inclusive.
+    """
+    ink_rows = np.flatnonzero(ink_mask.any(axis=1))
+    if ink_rows.size == 0:
+        empty = np.empty(0, np.intp)
+        return empty, empty
+    breaks = np.flatnonzero(np.diff(ink_rows) > line_gap)
+    tops = np.concatenate(([ink_rows[0]], ink_rows[breaks + 1]))
+    bottoms = np.concatenate((ink_rows[breaks], [ink_rows[-1]]))
+    return tops, bottoms
+
+
+def _group_boxes(x0, y0, x1, y1, starts):
+    """Reduce consecutive boxes into one box per group beginning at ``starts``"""
+    return np.stack([
+        np.minimum.reduceat(x0, starts),
+        np.minimum.reduceat(y0, starts),
+        np.maximum.reduceat(x1, starts),
+        np.maximum.reduceat(y1, starts),
+    ], axis=1)
+
+
+def _to_xywh(boxes):
+    """Convert (x0, y0, x1, y1) rows to (x, y, w, h)"""
+    out = boxes.copy()
+    out[:, 2:] -= boxes[:, :2]
+    return out
+
+
+class Segmentation:
+    """Result of one segmentation pass; all boxes are (x, y, w, h) int arrays
+
+    ``glyph_line`` / ``glyph_word`` give the line and word index of every
+    glyph and ``word_line`` the line index of every word. ``crops`` is a view
+    into the segmenter's reusable buffer and is overwritten by the next call.
+    """
+
+    def __init__(self, lines, words, glyphs, glyph_line, glyph_word, word_line, crops):
+        self.lines = lines
+        self.words = words
+        self.glyphs = glyphs
+        self.glyph_line = glyph_line
+        self.glyph_word = glyph_word
+        self.word_line = word_line
+        self.crops = crops
+
+    def __len__(self):
+        return len(self.glyphs)
+
+    def text_from_labels(self, labels):
+        """Join one label per glyph back into text with word and line breaks"""
+        text = ''
+        for index, label in enumerate(labels):
+            # Every line starts a new word, so word ids cover both kinds of break
+            if index and self.glyph_word[index] != self.glyph_word[index - 1]:
+                text += ' '
+            text += label
+        return text
+
+
+class Segmenter:
+    """Segment binary pages and produce batched, normalized glyph crops"""
+
+    def __init__(self, tile_size=28, glyph_size=24, emnist_layout=False,
+                 min_area=12, line_gap=8, word_gap_ratio=0.5, capacity=256):
+        self.tile_size = tile_size
+        self.glyph_size = glyph_size
+        self.emnist_layout = emnist_layout
+        self.min_area = min_area
+        self.line_gap = line_gap
+        self.word_gap_ratio = word_gap_ratio
+        self._tiles = np.zeros((capacity, tile_size, tile_size), np.uint8)
+        self._crops = np.zeros((capacity, tile_size, tile_size, 1), np.float32)
+
+    def _reserve(self, count):
+        """Grow the reusable crop buffers to hold at least ``count`` glyphs"""
+        capacity = len(self._tiles)
+        if count > capacity:
+            while capacity < count:
+                capacity *= 2
+            size = self.tile_size
+            self._tiles = np.zeros((capacity, size, size), np.uint8)
+            self._crops = np.zeros((capacity, size, size, 1), np.float32)
+
+    def segment(self, binary):
+        """Segment a white-on-black binary image into lines, words and glyphs"""
+        _, _, stats, _ = cv2.connectedComponentsWithStats(binary, connectivity=8)
+        stats = stats[1:]  # Drop the background component
+        stats = stats[stats[:, cv2.CC_STAT_AREA] >= self.min_area]
+        if len(stats) == 0:
+            empty_boxes = np.empty((0, 4), np.int64)
+            empty_ids = np.empty(0, np.intp)
+            return Segmentation(empty_boxes, empty_boxes, empty_boxes,
+                                empty_ids, empty_ids, empty_ids, self._crops[:0])
+
+        # Assign every component to a text band by its vertical center
+        tops, _ = line_bands(binary > 0, self.line_gap)
+        x0 = stats[:, cv2.CC_STAT_LEFT].astype(np.int64)
+        y0 = stats[:, cv2.CC_STAT_TOP].astype(np.int64)
+        x1 = x0 + stats[:, cv2.CC_STAT_WIDTH]
+        y1 = y0 + stats[:, cv2.CC_STAT_HEIGHT]
+        band = np.searchsorted(tops, (y0 + y1) // 2, side='right') - 1
+
+        # Sort by band, then left edge; shift each band so bands never overlap
+        order = np.lexsort((x0, band))
+        x0, y0, x1, y1, band = x0[order], y0[order], x1[order], y1[order], band[order]
+        shift = band * _LINE_STRIDE
+
+        # Merge components whose x range overlaps everything to their left
+        # (the dot of an "i", a stroke broken by thresholding)
+        reach = np.maximum.accumulate(x1 + shift)
+        glyph_start = np.ones(len(x0), bool)
+        glyph_start[1:] = (x0[1:] + shift[1:]) >= reach[:-1]
+        starts = np.flatnonzero(glyph_start)
+        glyphs = _group_boxes(x0, y0, x1, y1, starts)
+        glyph_band = band[starts]
+
+        # Lines: renumber the bands that actually hold glyphs
+        line_start = np.ones(len(glyphs), bool)
+        line_start[1:] = glyph_band[1:] != glyph_band[:-1]
+        line_starts = np.flatnonzero(line_start)
+        glyph_line = np.cumsum(line_start) - 1
+        lines = _group_boxes(glyphs[:, 0], glyphs[:, 1], glyphs[:, 2], glyphs[:, 3], line_starts)
+        line_height = (lines[:, 3] - lines[:, 1])[glyph_line]
+
+        # Words: break on horizontal gaps wider than a fraction of the line height
+        word_start = line_start.copy()
+        gaps = glyphs[1:, 0] - glyphs[:-1, 2]
+        word_start[1:] |= gaps > self.word_gap_ratio * line_height[1:]
+        word_starts = np.flatnonzero(word_start)
+        glyph_word = np.cumsum(word_start) - 1
+        words = _group_boxes(glyphs[:, 0], glyphs[:, 1], glyphs[:, 2], glyphs[:, 3], word_starts)
+        word_line = glyph_line[word_starts]
+
+        crops = self.crop_glyphs(binary, glyphs)
+        return Segmentation(_to_xywh(lines), _to_xywh(words), _to_xywh(glyphs),
+                            glyph_line, glyph_word, word_line, crops)
+
+    def crop_glyphs(self, binary, glyphs):
+        """Fill the reusable batch with one centered, [0, 1]-scaled tile per glyph
+
+        ``glyphs`` are (x0, y0, x1, y1) boxes. Returns a (N, size, size, 1)
+        float32 view that the next call overwrites.
+        """
+        count = len(glyphs)
+        self._reserve(count)
+        tiles = self._tiles[:count]
+        tiles.fill(0)
+
+        size = self.tile_size
+        for tile, (gx0, gy0, gx1, gy1) in zip(tiles, glyphs):
+            glyph = binary[gy0:gy1, gx0:gx1]
+            if self.emnist_layout:
+                glyph = np.ascontiguousarray(glyph.T)
+            h, w = glyph.shape
+            scale = self.glyph_size / max(h, w)
+            new_w = max(1, int(round(w * scale)))
+            new_h = max(1, int(round(h * scale)))
+            top = (size - new_h) // 2
+            left = (size - new_w) // 2
+            tile[top:top + new_h, left:left + new_w] = cv2.resize(
+                glyph, (new_w, new_h), interpolation=cv2.INTER_AREA
+            )
+
+        crops = self._crops[:count]
+        np.multiply(tiles[..., np.newaxis], 1.0 / 255.0, out=crops, casting='unsafe')
+        return crops
@@ -0,0 +1,209 @@
+"""Persistent in-process Tesseract engines for handwriting OCR
+
+``pytesseract.image_to_string`` spawns a ``tesseract`` process for every call,
+writes the image to a temp file and reloads the LSTM traineddata each time.
+This module keeps warm ``tesserocr`` API handles instead: one per worker
+thread and per language, fed straight from numpy buffers.
+
+When tesserocr is not installed the pool falls back to pytesseract with the
+same configuration, so callers never have to care which one is in use.
+Either module is only imported on the first OCR call, keeping app start-up
+light. A language's handles stay loaded once used, so switching back and forth
+between source languages costs no reload. Unless a caller passes its own,
+the character whitelist follows the language (see ``ocr_languages``).
+"""
+import logging
+import os
+import threading
+
+import numpy as np
+
+from ocr_languages import ASCII_ALPHANUMERIC, whitelist_for
+
+_tesserocr = None
+
+
+def load_tesserocr():
+    """Import tesserocr on first use; returns None when it is not installed"""
+    global _tesserocr
+    if _tesserocr is None:
+        try:
+            import tesserocr
+            _tesserocr = tesserocr
+        except ImportError:  # Optional dependency, fall back to the tesseract CLI
+            _tesserocr = False
+    return _tesserocr or None
+
+DEFAULT_WHITELIST = ASCII_ALPHANUMERIC
+
+# osd.traineddata only has the legacy model, which the LSTM-only mode cannot load
+OSD_OEM = 3  # OEM.DEFAULT
+
+
+def build_config(psm=6, oem=1, whitelist=DEFAULT_WHITELIST,
+                 preserve_interword_spaces=True, dpi=300):
+    """Build the equivalent command-line config for the pytesseract fallback"""
+    config = f'--oem {oem} --psm {psm} '
+    if whitelist:
+        config += f'-c tessedit_char_whitelist={whitelist} '
+    if preserve_interword_spaces:
+        config += '-c preserve_interword_spaces=1 '
+    return config + f'--dpi {dpi}'
+
+
+class TesseractEnginePool:
+    """Warm Tesseract API handles, one per (thread, language)"""
+
+    def __init__(self, tessdata_path=None, oem=1):
+        self.tessdata_path = tessdata_path or os.environ.get('TESSDATA_PREFIX')
+        self.oem = oem
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._apis = []
+        self.osd_error = None  # Why script detection is unavailable, once known
+
+    @property
+    def in_process(self):
+        """True when OCR runs inside this process through tesserocr"""
+        return load_tesserocr() is not None
+
+    def get_api(self, lang='eng', oem=None):
+        """Return this thread's API handle for ``lang``, loading it on first use"""
+        apis = getattr(self._local, 'apis', None)
+        if apis is None:
+            apis = self._local.apis = {}
+        api = apis.get(lang)
+        if api is None:
+            kwargs = {'lang': lang, 'oem': self.oem if oem is None else oem}
+            if self.tessdata_path:
+                kwargs['path'] = self.tessdata_path
+            api = load_tesserocr().PyTessBaseAPI(**kwargs)
+            apis[lang] = api
+            with self._lock:
+                self._apis.append(api)
+            logging.debug(f"Loaded Tesseract engine for '{lang}' on {threading.current_thread().name}")
+        return api
+
+    def warm(self, lang='eng'):
+        """Load the engine for ``lang`` on the calling thread ahead of the first request"""
+        if self.in_process:
+            self.get_api(lang)
+
+    def image_to_string(self, image, lang='eng', psm=6, whitelist=None,
+                        preserve_interword_spaces=True, dpi=300, timeout=5):
+        """OCR a grayscale or BGR numpy image, mirroring pytesseract's call"""
+        return self._recognize(image, lang, psm, whitelist, preserve_interword_spaces,
+                               dpi, timeout, False)[0]
+
+    def image_to_text_and_confidence(self, image, lang='eng', psm=6, whitelist=None,
+                                     preserve_interword_spaces=True, dpi=300, timeout=5):
+        """Like ``image_to_string``, also returning the mean word confidence in [0, 1]"""
+        return self._recognize(image, lang, psm, whitelist, preserve_interword_spaces,
+                               dpi, timeout, True)
+
+    def _recognize(self, image, lang, psm, whitelist, preserve_interword_spaces, dpi, timeout,
+                   with_confidence):
+        image = np.ascontiguousarray(image, dtype=np.uint8)
+        if whitelist is None:
+            whitelist = whitelist_for(lang)
+        if not self.in_process:
+            import pytesseract
+            config = build_config(psm, self.oem, whitelist, preserve_interword_spaces, dpi)
+            if not with_confidence:
+                return pytesseract.image_to_string(image, lang=lang, config=config,
+                                                   timeout=timeout), None
+            return self._text_and_confidence_from_data(pytesseract.image_to_data(
+                image, lang=lang, config=config, timeout=timeout,
+                output_type=pytesseract.Output.DICT
+            ))
+
+        api = self.get_api(lang)
+        try:
+            api.SetPageSegMode(psm)
+            api.SetVariable('tessedit_char_whitelist', whitelist or '')
+            api.SetVariable('preserve_interword_spaces', '1' if preserve_interword_spaces else '0')
+
+            height, width = image.shape[:2]
+            bytes_per_pixel = 1 if image.ndim == 2 else image.shape[2]
+            api.SetImageBytes(image.tobytes(), width, height,
+                              bytes_per_pixel, width * bytes_per_pixel)
+            api.SetSourceResolution(dpi)
+            text = api.GetUTF8Text()
+            return text, (api.MeanTextConf() / 100.0 if with_confidence else None)
+        finally:
+            api.Clear()
+
+    def detect_script(self, image, timeout=5):
+        """Return (script name, confidence) from Tesseract's OSD, or (None, 0.0)
+
+        Needs ``osd.traineddata``. The OSD handle is kept per thread like the
+        language handles. When the OSD model cannot be loaded, detection is
+        switched off for the pool instead of failing on every call.
+        """
+        if self.osd_error is not None:
+            return None, 0.0
+        image = np.ascontiguousarray(image, dtype=np.uint8)
+        try:
+            if not self.in_process:
+                import pytesseract
+                try:
+                    osd = pytesseract.image_to_osd(image, config=f'--oem {OSD_OEM} --psm 0',
+                                                   timeout=timeout,
+                                                   output_type=pytesseract.Output.DICT)
+                except pytesseract.TesseractError as e:
+                    if 'osd' in str(e).lower() and 'load' in str(e).lower():
+                        self.disable_osd(e)
+                    raise
+                return osd['script'], float(osd['script_conf'])
+
+            try:
+                api = self.get_api('osd', oem=OSD_OEM)
+            except RuntimeError as e:  # tesserocr could not initialize the OSD model
+                self.disable_osd(e)
+                raise
+            try:
+                api.SetPageSegMode(load_tesserocr().PSM.OSD_ONLY)
+                height, width = image.shape[:2]
+                bytes_per_pixel = 1 if image.ndim == 2 else image.shape[2]
+                api.SetImageBytes(image.tobytes(), width, height,
+                                  bytes_per_pixel, width * bytes_per_pixel)
+                osd = api.DetectOrientationScript()
+            finally:
+                api.Clear()
+            if not osd:
+                return None, 0.0
+            return osd['script_name'], float(osd['script_conf'])
+        except Exception as e:  # Usually too little ink to tell
+            logging.debug(f"Script detection failed: {e}")
+            return None, 0.0
+
+    def disable_osd(self, error):
+        self.osd_error = error
+        logging.warning(f"Script detection disabled, the OSD model could not be loaded: {error}")
+
+    @staticmethod
+    def _text_and_confidence_from_data(data):
+        """Rebuild line text and the mean word confidence from image_to_data output"""
+        lines = {}
+        confidences = []
+        for i, word in enumerate(data['text']):
+            confidence = float(data['conf'][i])
+            if not word.strip() or confidence < 0:
+                continue
+            key = (data['block_num'][i], data['par_num'][i], data['line_num'][i])
+            lines.setdefault(key, []).append(word)
+            confidences.append(confidence)
+        text = '\n'.join(' '.join(words) for words in lines.values())
+        confidence = sum(confidences) / len(confidences) / 100.0 if confidences else 0.0
+        return text, confidence
+
+    def close(self):
+        """Release every loaded engine"""
+        with self._lock:
+            apis, self._apis = self._apis, []
+        for api in apis:
+            try:
+                api.End()
+            except Exception as e:
+                logging.warning(f"Failed to release Tesseract engine: {e}")
+        self._local = threading.local()
@@ -0,0 +1,128 @@
+"""BatchTranslator tests with stub backends: segments, partial failures, coalescing
+
+Run with: python -m unittest test_batch_translation
+"""
+import threading
+import time
+import unittest
+
+from batch_translation import BatchTranslator, join_segments, split_segments
+from instrumentation import metrics
+
+
+class UpperBackend:
+    """Translates by upper-casing; segments containing 'fail' come back empty"""
+
+    def __init__(self):
+        self.requests = []
+
+    def translate_batch(self, texts, src, dest):
+        self.requests.append(list(texts))
+        return [None if 'fail' in text else text.upper() for text in texts]
+
+
+class RaisingBackend(UpperBackend):
+    """Raises for any request that contains a segment with 'boom'"""
+
+    def translate_batch(self, texts, src, dest):
+        if any('boom' in text for text in texts):
+            raise ConnectionError("503 Service Unavailable")
+        return super().translate_batch(texts, src, dest)
+
+
+class SingleBackend:
+    """A backend without translate_batch"""
+
+    def translate(self, text, src, dest):
+        if 'boom' in text:
+            raise ConnectionError("timed out")
+        return text.upper()
+
+
+class ShortBackend(UpperBackend):
+    def translate_batch(self, texts, src, dest):
+        return super().translate_batch(texts, src, dest)[:-1]
+
+
+class SegmentTest(unittest.TestCase):
+
+    def test_split_and_join_keep_the_separators(self):
+        text = "First line. Second sentence!\n\nNew paragraph\n  indented"
+        segments, separators = split_segments(text)
+        self.assertEqual(segments, ['First line.', 'Second sentence!', 'New paragraph',
+                                    'indented'])
+        self.assertEqual(join_segments(segments, separators), text)
+
+
+class BatchTranslatorTest(unittest.TestCase):
+
+    def test_paragraph_breaks_survive(self):
+        translator = BatchTranslator(UpperBackend())
+        self.assertEqual(translator.translate("one.\n\ntwo", 'en', 'es'), "ONE.\n\nTWO")
+
+    def test_each_distinct_segment_is_requested_once(self):
+        backend = UpperBackend()
+        translator = BatchTranslator(backend)
+        self.assertEqual(translator.translate_many(["hi\nhi", "hi\nbye"], 'en', 'es'),
+                         ["HI\nHI", "HI\nBYE"])
+        self.assertEqual(backend.requests, [['hi', 'bye']])
+        translator.translate("bye", 'en', 'es')
+        self.assertEqual(len(backend.requests), 1)  # Served from the cache
+
+    def test_empty_segment_is_kept_as_written(self):
+        translator = BatchTranslator(UpperBackend())
+        self.assertEqual(translator.translate("one\nfail here\ntwo", 'en', 'es'),
+                         "ONE\nfail here\nTWO")
+
+    def test_failed_request_keeps_the_rest_of_the_page(self):
+        translator = BatchTranslator(RaisingBackend(), max_segments=1)
+        self.assertEqual(translator.translate("one\nboom\ntwo", 'en', 'es'), "ONE\nboom\nTWO")
+        self.assertEqual(translator._in_flight, {})
+
+    def test_failed_segment_without_batch_support_keeps_the_rest(self):
+        translator = BatchTranslator(SingleBackend())
+        self.assertEqual(translator.translate("one\nboom", 'en', 'es'), "ONE\nboom")
+
+    def test_page_is_none_when_nothing_was_translated(self):
+        translator = BatchTranslator(RaisingBackend())
+        self.assertIsNone(translator.translate("boom\nalso boom", 'en', 'es'))
+
+    def test_short_backend_answer_resolves_every_segment(self):
+        translator = BatchTranslator(ShortBackend())
+        self.assertIsNone(translator.translate("one\ntwo", 'en', 'es'))
+        self.assertEqual(translator._in_flight, {})
+
+    def test_concurrent_callers_share_one_request(self):
+        started, release = threading.Event(), threading.Event()
+
+        class BlockingBackend(UpperBackend):
+            def translate_batch(self, texts, src, dest):
+                started.set()
+                release.wait(5)
+                return super().translate_batch(texts, src, dest)
+
+        backend = BlockingBackend()
+        translator = BatchTranslator(backend)
+        coalesced = metrics.counters.get('translation_coalesced', 0)
+        results = []
+        first = threading.Thread(target=lambda: results.append(
+            translator.translate("shared", 'en', 'es')))
+        first.start()
+        started.wait(5)
+        second = threading.Thread(target=lambda: results.append(
+            translator.translate("shared", 'en', 'es')))
+        second.start()
+        # The second caller waits on the first caller's request instead of making its own
+        deadline = time.monotonic() + 5
+        while (metrics.counters.get('translation_coalesced', 0) == coalesced
+               and time.monotonic() < deadline):
+            time.sleep(0.001)
+        release.set()
+        first.join(5)
+        second.join(5)
+        self.assertEqual(results, ['SHARED', 'SHARED'])
+        self.assertEqual(backend.requests, [['shared']])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+"""Regression tests for FrameMemo: small real edits must not be served from the memo
+
+Run with: python -m unittest test_frame_memo
+"""
+import unittest
+
+import cv2
+import numpy as np
+
+from frame_memo import FrameMemo, canvas_hash, frame_hash
+
+CONTEXT = ('Tesseract', 'English', 'Spanish', False)
+
+
+def text_frame():
+    """Three lines of white-on-black text on a 1000x600 binary frame"""
+    frame = np.zeros((600, 1000), np.uint8)
+    for row, line in enumerate(('the quick brown fox', 'jumps over the lazy', 'dog and the cat')):
+        cv2.putText(frame, line, (40, 150 + 160 * row), cv2.FONT_HERSHEY_SIMPLEX, 2.2, 255, 6)
+    return np.where(frame > 127, 255, 0).astype(np.uint8)
+
+
+class FrameMemoTest(unittest.TestCase):
+
+    def setUp(self):
+        self.memo = FrameMemo()
+        self.frame = text_frame()
+        self.memo.store(frame_hash(self.frame), CONTEXT, {'text': 'stored'})
+
+    def assertMisses(self, edited):
+        self.assertIsNone(self.memo.lookup(frame_hash(edited), CONTEXT))
+
+    def test_identical_frame_hits(self):
+        self.assertEqual(self.memo.lookup(frame_hash(self.frame.copy()), CONTEXT),
+                         {'text': 'stored'})
+
+    def test_adding_a_dot_misses(self):
+        edited = self.frame.copy()
+        cv2.circle(edited, (600, 300), 4, 255, -1)
+        self.assertMisses(edited)
+
+    def test_adding_a_comma_misses(self):
+        edited = self.frame.copy()
+        cv2.line(edited, (560, 460), (555, 472), 255, 4)
+        self.assertMisses(edited)
+
+    def test_adding_a_crossbar_misses(self):
+        edited = self.frame.copy()
+        cv2.line(edited, (300, 110), (318, 110), 255, 3)
+        self.assertMisses(edited)
+
+    def test_other_context_misses(self):
+        self.assertIsNone(self.memo.lookup(frame_hash(self.frame), CONTEXT[:3] + (True,)))
+
+    def test_canvas_hash_matches_inverted_binary(self):
+        canvas = 255 - self.frame
+        self.assertEqual(self.memo.lookup(canvas_hash(canvas), CONTEXT), {'text': 'stored'})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,142 @@
+"""MicroBatcher and HTTP front end tests with a stub batch function
+
+Run with: python -m unittest test_inference_service
+"""
+import http.client
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+import numpy as np
+
+from inference_service import MicroBatcher, QueueFull, RecognitionService, make_server
+
+
+class MicroBatcherTest(unittest.TestCase):
+
+    def make(self, process_batch, **kwargs):
+        batcher = MicroBatcher(process_batch, **kwargs)
+        self.addCleanup(batcher.close)
+        return batcher
+
+    def test_batchable_items_are_coalesced_per_key(self):
+        batches = []
+
+        def process_batch(key, items):
+            batches.append((key, list(items)))
+            return [f'{key}:{item}' for item in items]
+
+        batcher = self.make(process_batch, max_batch=8, max_wait=0.2, workers=1)
+        futures = [batcher.submit('cnn', i) for i in range(3)] + [batcher.submit('other', 9)]
+        self.assertEqual([future.result(5) for future in futures],
+                         ['cnn:0', 'cnn:1', 'cnn:2', 'other:9'])
+        self.assertIn(('cnn', [0, 1, 2]), batches)
+        self.assertIn(('other', [9]), batches)
+
+    def test_unbatchable_key_runs_on_every_worker(self):
+        running, peak, lock = [0], [0], threading.Lock()
+
+        def process_batch(key, items):
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            time.sleep(0.05)
+            with lock:
+                running[0] -= 1
+            return items
+
+        batcher = self.make(process_batch, batchable=lambda key: False, workers=4)
+        futures = [batcher.submit('tesseract', i) for i in range(4)]
+        self.assertEqual([future.result(5) for future in futures], [0, 1, 2, 3])
+        self.assertEqual(peak[0], 4)
+
+    def test_full_queue_is_refused(self):
+        release = threading.Event()
+        batcher = self.make(lambda key, items: release.wait(5) and items,
+                            batchable=lambda key: False, workers=1, max_queue=1)
+        batcher.submit('k', 0)
+        time.sleep(0.05)  # The worker takes the first entry and blocks
+        batcher.submit('k', 1)
+        with self.assertRaises(QueueFull):
+            batcher.submit('k', 2)
+        release.set()
+
+    def test_errors_reach_every_caller_of_the_batch(self):
+        def process_batch(key, items):
+            raise RuntimeError('engine crashed')
+
+        batcher = self.make(process_batch, max_wait=0.05, workers=1)
+        futures = [batcher.submit('k', i) for i in range(2)]
+        for future in futures:
+            with self.assertRaisesRegex(RuntimeError, 'engine crashed'):
+                future.result(5)
+
+
+class ServiceHandlerTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.service = RecognitionService(workers=1, max_requests=1,
+                                          cache_path=os.path.join(directory, 'cache.sqlite3'))
+        self.service.translator.translate_many = lambda texts, src, dest: [
+            text.upper() for text in texts]
+        self.server = make_server(self.service, port=0)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.service.close)
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+    def connect(self):
+        connection = http.client.HTTPConnection('127.0.0.1', self.server.server_address[1],
+                                                timeout=5)
+        self.addCleanup(connection.close)
+        return connection
+
+    def post(self, path, payload):
+        connection = self.connect()
+        connection.request('POST', path, json.dumps(payload),
+                           {'Content-Type': 'application/json'})
+        response = connection.getresponse()
+        return response.status, json.loads(response.read())
+
+    def test_translate_list(self):
+        status, body = self.post('/translate', {'q': ['a b', 'c'], 'target': 'es'})
+        self.assertEqual(status, 200)
+        self.assertEqual(body['translatedText'], ['A B', 'C'])
+
+    def test_translate_rejects_non_string_items(self):
+        status, body = self.post('/translate', {'q': [1, 2], 'target': 'es'})
+        self.assertEqual(status, 400)
+        self.assertIn('list of strings', body['error'])
+
+    def test_non_object_json_is_rejected(self):
+        self.assertEqual(self.post('/translate', [1, 2])[0], 400)
+
+    def test_requests_over_the_limit_are_refused_before_the_body_is_read(self):
+        body = json.dumps({'q': 'x', 'target': 'es'}).encode()
+        held = self.connect()
+        held.putrequest('POST', '/translate')
+        held.putheader('Content-Length', str(len(body)))
+        held.endheaders()
+        held.send(body[:4])  # Holds the only request slot while the body trickles in
+        time.sleep(0.1)
+        self.assertEqual(self.post('/translate', {'q': 'y', 'target': 'es'})[0], 503)
+        held.send(body[4:])
+        self.assertEqual(held.getresponse().status, 200)
+        self.assertEqual(self.post('/translate', {'q': 'y', 'target': 'es'})[0], 200)
+
+    def test_queued_frames_are_copies(self):
+        seen = []
+        self.service.batcher.process_batch = lambda key, items: seen.extend(items) or [
+            'text'] * len(items)
+        frame = np.zeros((4, 4), np.uint8)
+        ocr = self.service.ocr_function('auto', 'eng')
+        self.assertEqual(ocr(frame), 'text')
+        self.assertIsNot(seen[0], frame)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,132 @@
+"""Routing tests for OcrRouter with stub engines: no OCR package is needed
+
+Run with: python -m unittest test_ocr_registry
+"""
+import threading
+import unittest
+
+from ocr_registry import CnnEngine, OcrEngine, OcrRegistry, OcrRouter, TesseractEngine
+
+
+class StubPool:
+    """Stands in for TesseractEnginePool; records the threads that built a handle"""
+
+    in_process = True
+
+    def __init__(self, text='hello world', confidence=0.9):
+        self.text = text
+        self.confidence = confidence
+        self.handles = set()
+
+    def warm(self, lang='eng'):
+        self.handles.add((threading.current_thread().name, lang))
+
+    def image_to_text_and_confidence(self, image, lang='eng', psm=6):
+        self.warm(lang)
+        return self.text, self.confidence
+
+
+class StubTesseract(TesseractEngine):
+    available = True
+
+
+class StubCnn(CnnEngine):
+    available = True
+
+    def __init__(self, confidence=0.9):
+        super().__init__('emnist')
+        self.confidence = confidence
+
+    def _load(self, lang):
+        pass
+
+    def _recognize(self, processed, lang, psm):
+        return 'HELL0', self.confidence
+
+
+class StubReader(OcrEngine):
+    """A slow, accurate text reader such as EasyOCR"""
+
+    name = 'reader'
+    module = 'unittest'
+    expected_latency = 1.0
+    accuracy = 3
+
+    def _load(self, lang):
+        pass
+
+    def _recognize(self, processed, lang, psm):
+        return 'hello world', 0.95
+
+
+def names(plan):
+    return [engine.name for engine in plan]
+
+
+def in_thread(function):
+    """Call ``function`` on a fresh thread and return its result"""
+    results = []
+    thread = threading.Thread(target=lambda: results.append(function()), name='other')
+    thread.start()
+    thread.join()
+    return results[0]
+
+
+class OcrRouterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = StubPool()
+        self.registry = OcrRegistry()
+        self.tesseract = self.registry.register(StubTesseract(self.pool))
+        self.cnn = self.registry.register(StubCnn())
+        self.router = OcrRouter(self.registry)
+
+    def tearDown(self):
+        self.registry.close()
+
+    def test_cold_start_loads_a_text_reader_not_the_cnn(self):
+        self.assertEqual(names(self.router.plan('eng', 0.25)), ['tesseract'])
+        self.assertEqual(names(self.router.plan('eng', 5.0, prefer_accuracy=True)),
+                         ['tesseract'])
+
+    def test_cold_start_with_only_the_cnn_loaded_still_reads_text(self):
+        self.cnn.load('eng')
+        self.assertEqual(names(self.router.plan('eng', 0.25)), ['cnn_emnist', 'tesseract'])
+        self.assertEqual(names(self.router.plan('eng', 5.0, prefer_accuracy=True)),
+                         ['tesseract', 'cnn_emnist'])
+
+    def test_reader_over_budget_is_kept_next_to_the_cnn(self):
+        self.cnn.load('eng')
+        self.tesseract.load('eng')
+        self.assertEqual(names(self.router.plan('eng', 0.05)), ['cnn_emnist', 'tesseract'])
+
+    def test_tesseract_loaded_on_one_thread_is_routed_on_every_thread(self):
+        self.cnn.load('eng')
+        self.tesseract.load('eng')
+        plan = in_thread(lambda: names(self.router.plan('eng', 5.0, prefer_accuracy=True)))
+        self.assertEqual(plan, ['tesseract', 'cnn_emnist'])
+
+    def test_other_threads_build_their_own_handle_on_first_use(self):
+        self.tesseract.load('eng')
+        result = in_thread(lambda: self.router.recognize(None, 'eng', 5.0,
+                                                         prefer_accuracy=True))
+        self.assertEqual(result.engine, 'tesseract')
+        self.assertIn(('other', 'eng'), self.pool.handles)
+
+    def test_languages_the_cnn_cannot_read_go_to_tesseract(self):
+        self.cnn.load('eng')
+        self.assertEqual(names(self.router.plan('spa', 0.25)), ['tesseract'])
+
+    def test_low_confidence_warms_the_next_engine_for_later_requests(self):
+        reader = self.registry.register(StubReader())
+        self.pool.confidence = 0.2
+        self.tesseract.load('eng')
+        # The reader is not loaded mid-request, only warmed for the next one
+        self.assertEqual(self.router.recognize(None, 'eng', 5.0).engine, 'tesseract')
+        self.registry.warm(reader.name, 'eng').result(timeout=5)
+        self.assertTrue(reader.is_loaded('eng'))
+        self.assertEqual(self.router.recognize(None, 'eng', 5.0).engine, 'reader')
+
+
+if __name__ == '__main__':
+    unittest.main()
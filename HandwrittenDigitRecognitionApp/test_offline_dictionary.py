@@ -0,0 +1,61 @@
+"""Offline dictionary import and lookup tests on a small wiktextract-style dump
+
+Run with: python -m unittest test_offline_dictionary
+"""
+import json
+import os
+import tempfile
+import unittest
+
+from offline_dictionary import OfflineDictionary, import_dump
+
+ENTRIES = [
+    {'word': 'hola', 'lang_code': 'es', 'pos': 'intj',
+     'senses': [{'glosses': ['hello'], 'examples': [{'text': '¡Hola, amigo!'}]}],
+     'sounds': [{'ipa': '/ˈola/'}]},
+    {'word': 'casa', 'lang_code': 'es', 'pos': 'noun',
+     'senses': [{'glosses': ['house']}, {'glosses': ['home']}]},
+    {'word': 'house', 'lang_code': 'en', 'pos': 'noun', 'senses': [{'glosses': ['a building']}]},
+]
+
+
+class OfflineDictionaryTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.dump = os.path.join(directory, 'dump.jsonl')
+        self.db = os.path.join(directory, 'dictionary.sqlite3')
+        with open(self.dump, 'w', encoding='utf-8') as f:
+            for entry in ENTRIES:
+                f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+            f.write('not json\n')
+
+    def test_import_counts_new_definitions_only(self):
+        self.assertEqual(import_dump(self.dump, self.db, langs=['es']), 3)
+        self.assertEqual(import_dump(self.dump, self.db, langs=['es']), 0)
+        dictionary = OfflineDictionary(self.db)
+        self.assertEqual(dictionary.definitions('casa', 'es'),
+                         [('noun', 'house', None), ('noun', 'home', None)])
+        self.assertEqual(dictionary.definitions('house', 'en'), [])
+
+    def test_lookups(self):
+        import_dump(self.dump, self.db)
+        dictionary = OfflineDictionary(self.db)
+        self.assertEqual(dictionary.ipa('Hola', 'es'), '/ˈola/')
+        self.assertEqual(dictionary.prefix('ca', 'es'), ['casa'])
+        # Google Translate codes map to the dump's base language
+        self.assertEqual(dictionary.lookup('house', 'en-gb')[0], 'house')
+
+    def test_misrecognized_word_falls_back_to_the_closest_headword(self):
+        import_dump(self.dump, self.db)
+        word, rows = OfflineDictionary(self.db).lookup('casq', 'es')
+        self.assertEqual(word, 'casa')
+        self.assertEqual(rows[0][1], 'house')
+
+    def test_missing_store_raises(self):
+        with self.assertRaises(FileNotFoundError):
+            OfflineDictionary(self.db)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+"""ImagePreprocessor must match the reference enhance_image pipeline
+
+Run with: python -m unittest test_preprocessing
+"""
+import threading
+import unittest
+
+import cv2
+import numpy as np
+
+from preprocessing import ImagePreprocessor, enhance_image, preprocess
+
+
+def canvas(width=800, height=400):
+    """White canvas with a few dark strokes, like the drawing area"""
+    image = np.full((height, width), 255, np.uint8)
+    cv2.putText(image, 'Hello 42', (60, 220), cv2.FONT_HERSHEY_SIMPLEX, 3, 0, 8)
+    cv2.line(image, (600, 80), (700, 300), 40, 5)
+    return image
+
+
+class PreprocessingTest(unittest.TestCase):
+
+    def test_gray_matches_reference(self):
+        image = canvas()
+        np.testing.assert_array_equal(ImagePreprocessor().process(image), enhance_image(image))
+
+    def test_color_matches_reference(self):
+        image = cv2.cvtColor(canvas(), cv2.COLOR_GRAY2BGR)
+        image[50:60, 50:400] = (0, 0, 255)
+        np.testing.assert_array_equal(ImagePreprocessor().process(image), enhance_image(image))
+
+    def test_ink_at_the_edges_matches_reference(self):
+        image = canvas()
+        image[:3, :] = 0
+        image[:, -2:] = 0
+        np.testing.assert_array_equal(ImagePreprocessor().process(image), enhance_image(image))
+
+    def test_blank_canvas_is_empty(self):
+        output = ImagePreprocessor().process(np.full((100, 200), 255, np.uint8))
+        self.assertEqual(output.shape, (140, 240))
+        self.assertFalse(output.any())
+
+    def test_each_thread_gets_its_own_buffers(self):
+        outputs = {}
+
+        def run(name):
+            outputs[name] = preprocess(canvas())
+
+        threads = [threading.Thread(target=run, args=(name,)) for name in ('a', 'b')]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertIsNot(outputs['a'], outputs['b'])
+        self.assertIsNot(preprocess(canvas()), outputs['a'])
+
+
+if __name__ == '__main__':
+    unittest.main()
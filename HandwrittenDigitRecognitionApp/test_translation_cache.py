@@ -0,0 +1,66 @@
+"""TranslationCache tests: memory LRU, SQLite tier and TTL
+
+Run with: python -m unittest test_translation_cache
+"""
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from translation_cache import TranslationCache
+
+
+class TranslationCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), 'translations.sqlite3')
+
+    def make(self, **kwargs):
+        cache = TranslationCache(self.path, **kwargs)
+        self.addCleanup(cache.close)
+        return cache
+
+    def test_whitespace_variants_share_an_entry(self):
+        cache = self.make()
+        cache.put('hello  world', 'en', 'es', 'hola mundo')
+        self.assertEqual(cache.get(' hello\nworld ', 'en', 'es'), 'hola mundo')
+        self.assertIsNone(cache.get('hello world', 'en', 'fr'))
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_disk_tier_survives_a_restart(self):
+        self.make().put('hello', 'en', 'es', 'hola')
+        cache = self.make()
+        self.assertEqual(cache.get('hello', 'en', 'es'), 'hola')
+        self.assertEqual(cache.stats['disk_hits'], 1)
+
+    def test_least_recently_used_entry_is_evicted_from_memory(self):
+        cache = TranslationCache(max_memory_entries=2)
+        cache.put('a', 'en', 'es', 'A')
+        cache.put('b', 'en', 'es', 'B')
+        cache.get('a', 'en', 'es')
+        cache.put('c', 'en', 'es', 'C')
+        self.assertIsNone(cache.get('b', 'en', 'es'))
+        self.assertEqual(cache.get('a', 'en', 'es'), 'A')
+
+    def test_expired_entries_are_misses(self):
+        cache = self.make(ttl=60)
+        with mock.patch('translation_cache.time.time', return_value=1000.0):
+            cache.put('hello', 'en', 'es', 'hola')
+        with mock.patch('translation_cache.time.time', return_value=1061.0):
+            self.assertIsNone(cache.get('hello', 'en', 'es'))
+
+    def test_get_or_translate_only_calls_on_a_miss(self):
+        cache = self.make()
+        calls = []
+
+        def translate(text, src, dest):
+            calls.append(text)
+            return text.upper()
+
+        self.assertEqual(cache.get_or_translate('hi', 'en', 'es', translate), 'HI')
+        self.assertEqual(cache.get_or_translate('hi', 'en', 'es', translate), 'HI')
+        self.assertEqual(calls, ['hi'])
+
+
+if __name__ == '__main__':
+    unittest.main()
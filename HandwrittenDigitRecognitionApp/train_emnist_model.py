@@ -1,30 +1,23 @@
 # train_emnist_model.py
-import tensorflow as tf
+import argparse
 from tensorflow.keras import layers, models
-import numpy as np
-import gzip
+from emnist_dataset import load_split, load_mapping
+from training_input import add_arguments, datasets_from_args
 
-def load_emnist_images(filename):
-    with gzip.open(filename, 'rb') as f:
-        data = np.frombuffer(f.read(), np.uint8, offset=16)
-    return data.reshape(-1, 28, 28, 1)
-
-def load_emnist_labels(filename):
-    with gzip.open(filename, 'rb') as f:
-        data = np.frombuffer(f.read(), np.uint8, offset=8)
-    return data
-
-def load_emnist():
-    x_train = load_emnist_images('emnist-balanced-train-images-idx3-ubyte.gz')
-    y_train = load_emnist_labels('emnist-balanced-train-labels-idx1-ubyte.gz')
-    x_test = load_emnist_images('emnist-balanced-test-images-idx3-ubyte.gz')
-    y_test = load_emnist_labels('emnist-balanced-test-labels-idx1-ubyte.gz')
+def load_emnist(split='balanced'):
+    # Memory-mapped uint8 arrays; the .gz files are only decompressed on the first run
+    x_train, y_train = load_split(split, 'train')
+    x_test, y_test = load_split(split, 'test')
     return (x_train, y_train), (x_test, y_test)
 
-def create_and_save_model():
-    # Load EMNIST dataset
-    (x_train, y_train), (x_test, y_test) = load_emnist()
-    x_train, x_test = x_train / 255.0, x_test / 255.0
+def create_and_save_model(args=None):
+    args = args or add_arguments(argparse.ArgumentParser()).parse_args([])
+    split = getattr(args, 'split', 'balanced')
+
+    # Load EMNIST split and build the parallel tf.data input pipeline
+    train, test = load_emnist(split)
+    train_dataset, test_dataset = datasets_from_args(args, train, test)
+    num_classes = len(load_mapping(split))
 
     # Create model
     model = models.Sequential([
@@ -35,7 +28,7 @@ def create_and_save_model():
         layers.Conv2D(64, 3, activation='relu'),
         layers.Flatten(),
         layers.Dense(64, activation='relu'),
-        layers.Dense(47, activation='softmax')  # 47 classes for EMNIST Balanced
+        layers.Dense(num_classes, activation='softmax')  # 47 classes for Balanced, 62 for ByClass
     ])
     
     # Compile
@@ -46,10 +39,13 @@ def create_and_save_model():
     )
     
     # Train
-    model.fit(x_train, y_train, epochs=5, validation_data=(x_test, y_test))
+    model.fit(train_dataset, epochs=args.epochs, validation_data=test_dataset)
     
     # Save
-    model.save('emnist_model.h5')
+    model.save('emnist_model.h5' if split == 'balanced' else f'emnist_{split}_model.h5')
 
 if __name__ == "__main__":
-    create_and_save_model()
\ No newline at end of file
+    parser = add_arguments(argparse.ArgumentParser(description="Train the EMNIST CNN"))
+    parser.add_argument('--split', default='balanced',
+                        choices=['balanced', 'byclass', 'bymerge', 'letters', 'digits'])
+    create_and_save_model(parser.parse_args())
\ No newline at end of file
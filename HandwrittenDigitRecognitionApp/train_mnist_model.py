@@ -1,14 +1,19 @@
 # train_mnist_model.py
-import tensorflow as tf
+import argparse
 from tensorflow.keras import layers, models
-from tensorflow.keras.datasets import mnist
+from emnist_dataset import load_split
+from training_input import add_arguments, datasets_from_args
 
-def create_and_save_model():
-    # Load MNIST dataset
-    (x_train, y_train), (x_test, y_test) = mnist.load_data()
-    x_train, x_test = x_train / 255.0, x_test / 255.0
-    x_train = x_train.reshape(-1, 28, 28, 1)
-    x_test = x_test.reshape(-1, 28, 28, 1)
+def create_and_save_model(args=None):
+    args = args or add_arguments(argparse.ArgumentParser()).parse_args([])
+
+    # Load the shipped EMNIST MNIST split as memory-mapped uint8 arrays, like the EMNIST
+    # trainer; this model reads upright digits, so undo the raw EMNIST transpose
+    x_train, y_train = load_split('mnist', 'train')
+    x_test, y_test = load_split('mnist', 'test')
+    x_train = x_train.transpose(0, 2, 1, 3)
+    x_test = x_test.transpose(0, 2, 1, 3)
+    train_dataset, test_dataset = datasets_from_args(args, (x_train, y_train), (x_test, y_test))
 
     # Create model
     model = models.Sequential([
@@ -30,10 +35,11 @@ def create_and_save_model():
     )
     
     # Train
-    model.fit(x_train, y_train, epochs=5, validation_data=(x_test, y_test))
+    model.fit(train_dataset, epochs=args.epochs, validation_data=test_dataset)
     
     # Save
     model.save('mnist_model.h5')
 
 if __name__ == "__main__":
-    create_and_save_model()
\ No newline at end of file
+    parser = add_arguments(argparse.ArgumentParser(description="Train the MNIST CNN"))
+    create_and_save_model(parser.parse_args())
\ No newline at end of file
@@ -0,0 +1,146 @@
+"""tf.data input pipelines shared by the training scripts
+
+Examples are read from (memory-mapped) uint8 arrays in contiguous chunks,
+optionally cached, shuffled, batched, converted to float and augmented in
+parallel, and prefetched so the model never waits on input preparation.
+Augmentation is tuned for handwriting: small random rotations, shears,
+scales and shifts, plus stroke thickness jitter. All of it runs on whole
+batches inside the TensorFlow runtime, so it uses every available core.
+"""
+import numpy as np
+import tensorflow as tf
+
+AUTOTUNE = tf.data.AUTOTUNE
+
+
+def source_dataset(images, labels, chunk_size=4096):
+    """Per-example uint8 dataset over arrays that may be memory-mapped
+
+    Chunks are read with ``tf.numpy_function`` so a memmap is paged in a
+    contiguous block at a time instead of being copied into a tensor whole.
+    """
+    count = len(images)
+    image_shape = tuple(images.shape[1:])
+
+    def read_chunk(start):
+        start = int(start)
+        end = min(start + chunk_size, count)
+        return (np.ascontiguousarray(images[start:end], dtype=np.uint8),
+                np.asarray(labels[start:end], dtype=np.int64))
+
+    def load(start):
+        x, y = tf.numpy_function(read_chunk, [start], (tf.uint8, tf.int64))
+        return tf.ensure_shape(x, (None,) + image_shape), tf.ensure_shape(y, (None,))
+
+    dataset = tf.data.Dataset.range(0, count, chunk_size)
+    dataset = dataset.map(load, num_parallel_calls=AUTOTUNE, deterministic=True)
+    return dataset.unbatch()
+
+
+def to_float(images, labels):
+    """Scale a uint8 batch to float32 in [0, 1]"""
+    return tf.cast(images, tf.float32) * (1.0 / 255.0), labels
+
+
+def random_affine(images, max_rotation=0.15, max_shear=0.15, max_scale=0.1, max_shift=2.0):
+    """Apply a small random rotation, shear, scale and shift to every image in a batch"""
+    batch = tf.shape(images)[0]
+    height = tf.cast(tf.shape(images)[1], tf.float32)
+    width = tf.cast(tf.shape(images)[2], tf.float32)
+
+    def uniform(limit):
+        return tf.random.uniform([batch], -limit, limit)
+
+    angle = uniform(max_rotation)
+    shear = uniform(max_shear)
+    scale = 1.0 + uniform(max_scale)
+    cos, sin = tf.cos(angle), tf.sin(angle)
+
+    # Output -> input mapping: rotation times shear, divided by the scale,
+    # applied around the image center
+    m00, m01 = cos / scale, (shear * cos - sin) / scale
+    m10, m11 = sin / scale, (shear * sin + cos) / scale
+    cx, cy = (width - 1) / 2, (height - 1) / 2
+    offset_x = cx - m00 * cx - m01 * cy + uniform(max_shift)
+    offset_y = cy - m10 * cx - m11 * cy + uniform(max_shift)
+
+    zeros = tf.zeros([batch])
+    transforms = tf.stack([m00, m01, offset_x, m10, m11, offset_y, zeros, zeros], axis=1)
+    return tf.raw_ops.ImageProjectiveTransformV3(
+        images=images,
+        transforms=transforms,
+        output_shape=tf.shape(images)[1:3],
+        fill_value=0.0,
+        interpolation='BILINEAR',
+        fill_mode='CONSTANT',
+    )
+
+
+def thickness_jitter(images, probability=0.5):
+    """Randomly thicken (dilate) or thin (erode) the strokes of some images"""
+    batch = tf.shape(images)[0]
+    thicker = tf.nn.max_pool2d(images, ksize=2, strides=1, padding='SAME')
+    thinner = -tf.nn.max_pool2d(-images, ksize=2, strides=1, padding='SAME')
+    choice = tf.random.uniform([batch, 1, 1, 1])
+    images = tf.where(choice < probability / 2, thicker, images)
+    return tf.where(choice > 1 - probability / 2, thinner, images)
+
+
+def augment_batch(images, labels):
+    """Handwriting augmentation for a float batch of (N, H, W, 1) images"""
+    images = thickness_jitter(random_affine(images))
+    return tf.clip_by_value(images, 0.0, 1.0), labels
+
+
+def make_dataset(images, labels, batch_size=128, training=True, augment=False, cache=True,
+                 shuffle_buffer=20000, parallelism=None, seed=None):
+    """Build the input pipeline for one split
+
+    ``cache`` may be True (keep the decoded uint8 examples in memory after
+    the first epoch), a file path (cache on disk, for splits larger than
+    RAM) or False. ``parallelism`` caps the threads tf.data may use; None
+    lets the runtime tune it.
+    """
+    parallel_calls = parallelism or AUTOTUNE
+    dataset = source_dataset(images, labels)
+    if cache:
+        dataset = dataset.cache(cache if isinstance(cache, str) else '')
+    if training:
+        dataset = dataset.shuffle(shuffle_buffer, seed=seed, reshuffle_each_iteration=True)
+    dataset = dataset.batch(batch_size)
+    dataset = dataset.map(to_float, num_parallel_calls=parallel_calls)
+    if augment:
+        dataset = dataset.map(augment_batch, num_parallel_calls=parallel_calls,
+                              deterministic=False)
+    dataset = dataset.prefetch(AUTOTUNE)
+
+    if parallelism:
+        options = tf.data.Options()
+        options.threading.private_threadpool_size = parallelism
+        dataset = dataset.with_options(options)
+    return dataset
+
+
+def add_arguments(parser):
+    """Command-line options shared by the training scripts"""
+    parser.add_argument('--epochs', type=int, default=5)
+    parser.add_argument('--batch-size', type=int, default=128)
+    parser.add_argument('--parallelism', type=int, default=None,
+                        help="Threads for input preparation (default: autotune)")
+    parser.add_argument('--augment', action='store_true',
+                        help="Random affine and stroke thickness augmentation")
+    parser.add_argument('--cache-file', default=None,
+                        help="Cache decoded examples on disk instead of in memory")
+    parser.add_argument('--no-cache', action='store_true')
+    return parser
+
+
+def datasets_from_args(args, train, test):
+    """Build (train, validation) datasets from parsed ``add_arguments`` options"""
+    cache = False if args.no_cache else (args.cache_file or True)
+    train_dataset = make_dataset(*train, batch_size=args.batch_size, training=True,
+                                 augment=args.augment, cache=cache,
+                                 parallelism=args.parallelism)
+    test_dataset = make_dataset(*test, batch_size=args.batch_size, training=False,
+                                cache=not args.no_cache, parallelism=args.parallelism)
+    return train_dataset, test_dataset
@@ -0,0 +1,82 @@
+"""Interchangeable machine translation backends
+
+Every backend exposes ``translate(text, src, dest)`` returning the
+translated string (or None), the signature ``TranslationCache`` expects for
+its miss handler. ``GoogletransBackend`` wraps the googletrans client the
+app has always used. ``LibreTranslateBackend`` talks to any
+LibreTranslate-compatible HTTP endpoint, including a self-hosted server or
+the local stub used by ``benchmark_pipeline.py``, whose URL googletrans
+cannot be pointed at.
+
+Both also expose ``translate_batch(texts, src, dest)``, translating a list
+of segments in one round trip, which ``batch_translation`` builds on.
+"""
+import logging
+
+import requests
+
+LIBRETRANSLATE_URL = "https://libretranslate.com/translate"
+
+
+class GoogletransBackend:
+    """googletrans client, created on first use"""
+
+    def __init__(self):
+        self.translator = None
+
+    @property
+    def client(self):
+        """The googletrans Translator; importing googletrans is the slow part"""
+        if self.translator is None:
+            from googletrans import Translator
+            self.translator = Translator()
+        return self.translator
+
+    def translate(self, text, src, dest):
+        translation = self.client.translate(text, src=src, dest=dest)
+        return translation.text if translation else None
+
+    def translate_batch(self, texts, src, dest):
+        """One request for all segments, joined by newlines (googletrans sends lists one by one)"""
+        translated = self.translate('\n'.join(texts), src, dest)
+        lines = translated.split('\n') if translated else []
+        if len(lines) != len(texts):
+            # Lines were merged or split by the translation; fall back to one request each
+            return [self._translate_or_none(text, src, dest) for text in texts]
+        return [line.strip() or None for line in lines]
+
+    def _translate_or_none(self, text, src, dest):
+        """One segment of the fallback; a failure costs that segment, not the batch"""
+        try:
+            return self.translate(text, src, dest)
+        except Exception as e:
+            logging.warning(f"Could not translate a segment: {e}")
+            return None
+
+
+class LibreTranslateBackend:
+    """Client for a LibreTranslate-compatible ``/translate`` endpoint"""
+
+    def __init__(self, url=LIBRETRANSLATE_URL, api_key=None, timeout=5.0, session=None):
+        self.url = url
+        self.api_key = api_key
+        self.timeout = timeout
+        self.session = session or requests.Session()
+
+    def translate(self, text, src, dest):
+        payload = {'q': text, 'source': src, 'target': dest, 'format': 'text'}
+        if self.api_key:
+            payload['api_key'] = self.api_key
+        response = self.session.post(self.url, json=payload, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json().get('translatedText')
+
+    def translate_batch(self, texts, src, dest):
+        """LibreTranslate accepts a list for ``q`` and answers with a list"""
+        translated = self.translate(list(texts), src, dest)
+        if not isinstance(translated, list) or len(translated) != len(texts):
+            raise ValueError("LibreTranslate returned a different number of segments")
+        return translated
+
+    def close(self):
+        self.session.close()
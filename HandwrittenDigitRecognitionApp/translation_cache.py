@@ -0,0 +1,141 @@
+"""Two-tier cache for translation results
+
+Recognized text is translated again on every pass, even when neither the
+text nor the language pair changed. ``TranslationCache`` keeps a bounded
+in-memory LRU in front of a persistent SQLite store, both keyed on
+(normalized text, src, dest) and both honoring a TTL, and counts hits and
+misses so the saved round trips can be seen.
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+def normalize_text(text):
+    """Collapse whitespace so trivially different OCR output shares a cache entry"""
+    return ' '.join(text.split())
+
+
+class TranslationCache:
+    """Memory LRU + on-disk SQLite cache for translated strings"""
+
+    def __init__(self, path=None, max_memory_entries=512, max_disk_entries=50000,
+                 ttl=7 * 24 * 3600):
+        self.path = path
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self.ttl = ttl
+        self.stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'evictions': 0}
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._db = None
+        if path:
+            try:
+                os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+                self._db = sqlite3.connect(path, check_same_thread=False)
+                self._db.execute(
+                    'CREATE TABLE IF NOT EXISTS translations ('
+                    ' text TEXT NOT NULL, src TEXT NOT NULL, dest TEXT NOT NULL,'
+                    ' translation TEXT NOT NULL, created REAL NOT NULL,'
+                    ' PRIMARY KEY (text, src, dest))'
+                )
+                self._db.execute(
+                    'CREATE INDEX IF NOT EXISTS translations_created ON translations (created)'
+                )
+                self._db.commit()
+            except sqlite3.Error as e:
+                logging.warning(f"Translation cache disabled on disk ({path}): {e}")
+                self._db = None
+
+    @property
+    def hits(self):
+        return self.stats['memory_hits'] + self.stats['disk_hits']
+
+    @property
+    def misses(self):
+        return self.stats['misses']
+
+    def get(self, text, src, dest):
+        """Return a cached translation or None"""
+        key = (normalize_text(text), src, dest)
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                translation, created = entry
+                if now - created <= self.ttl:
+                    self._memory.move_to_end(key)
+                    self.stats['memory_hits'] += 1
+                    return translation
+                del self._memory[key]
+
+            if self._db is not None:
+                row = self._db.execute(
+                    'SELECT translation, created FROM translations'
+                    ' WHERE text = ? AND src = ? AND dest = ?', key
+                ).fetchone()
+                if row is not None and now - row[1] <= self.ttl:
+                    self._remember(key, row[0], row[1])
+                    self.stats['disk_hits'] += 1
+                    return row[0]
+
+            self.stats['misses'] += 1
+            return None
+
+    def put(self, text, src, dest, translation):
+        """Store a translation in both tiers"""
+        key = (normalize_text(text), src, dest)
+        now = time.time()
+        with self._lock:
+            self._remember(key, translation, now)
+            if self._db is not None:
+                try:
+                    self._db.execute(
+                        'INSERT OR REPLACE INTO translations VALUES (?, ?, ?, ?, ?)',
+                        key + (translation, now)
+                    )
+                    self._writes += 1
+                    if self._writes % 100 == 1:
+                        self._prune_disk(now)
+                    self._db.commit()
+                except sqlite3.Error as e:
+                    logging.warning(f"Translation cache write failed: {e}")
+
+    def get_or_translate(self, text, src, dest, translate):
+        """Return the cached translation, calling ``translate(text, src, dest)`` on a miss"""
+        translation = self.get(text, src, dest)
+        if translation is None:
+            translation = translate(text, src, dest)
+            if translation:
+                self.put(text, src, dest, translation)
+        return translation
+
+    def _remember(self, key, translation, created):
+        """Insert into the memory tier and evict the least recently used entries"""
+        self._memory[key] = (translation, created)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+            self.stats['evictions'] += 1
+
+    def _prune_disk(self, now):
+        """Drop expired rows and keep the disk tier under its size limit"""
+        self._db.execute('DELETE FROM translations WHERE created < ?', (now - self.ttl,))
+        count = self._db.execute('SELECT COUNT(*) FROM translations').fetchone()[0]
+        if count > self.max_disk_entries:
+            self._db.execute(
+                'DELETE FROM translations WHERE rowid IN ('
+                ' SELECT rowid FROM translations ORDER BY created LIMIT ?)',
+                (count - self.max_disk_entries,)
+            )
+            self.stats['evictions'] += count - self.max_disk_entries
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
@@ -0,0 +1,85 @@
+"""Content-addressed, in-memory cache of synthesized pronunciations
+
+Every "Listen" click used to call gTTS, write a uuid-named mp3 to a temp
+directory, load it from disk and delete it afterwards. ``AudioCache`` keys
+the synthesized mp3 bytes on a hash of (language, text), keeps them in a
+size-bounded LRU and hands them out as in-memory buffers that pygame can
+play directly, so a repeated click needs neither network nor disk.
+"""
+import hashlib
+import io
+import logging
+import threading
+from collections import OrderedDict
+
+from instrumentation import metrics
+
+
+def audio_key(text, lang):
+    """Content hash identifying one (language, text) pronunciation"""
+    return hashlib.sha256(f"{lang}\0{text}".encode('utf-8')).hexdigest()
+
+
+@metrics.timed('tts_synthesize')
+def synthesize(text, lang):
+    """Synthesize ``text`` with gTTS and return the mp3 bytes"""
+    from gtts import gTTS
+    buffer = io.BytesIO()
+    gTTS(text=text, lang=lang, slow=False).write_to_fp(buffer)
+    return buffer.getvalue()
+
+
+class AudioCache:
+    """LRU of mp3 bytes bounded by their total size"""
+
+    def __init__(self, max_bytes=32 * 1024 * 1024, synthesize=synthesize):
+        self.max_bytes = max_bytes
+        self.synthesize = synthesize
+        self.size = 0
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, text, lang):
+        """Return cached mp3 bytes or None"""
+        key = audio_key(text, lang)
+        with self._lock:
+            audio = self._entries.get(key)
+            if audio is not None:
+                self._entries.move_to_end(key)
+                self.stats['hits'] += 1
+                metrics.increment('tts_cache_hits')
+            return audio
+
+    def put(self, text, lang, audio):
+        """Store mp3 bytes, evicting the least recently played entries"""
+        if len(audio) > self.max_bytes:
+            return
+        key = audio_key(text, lang)
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous)
+            self._entries[key] = audio
+            self.size += len(audio)
+            while self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+                self.stats['evictions'] += 1
+
+    def get_or_synthesize(self, text, lang):
+        """Return mp3 bytes for ``text``, synthesizing them on a miss"""
+        audio = self.get(text, lang)
+        if audio is None:
+            with self._lock:
+                self.stats['misses'] += 1
+            audio = self.synthesize(text, lang)
+            if not audio:
+                raise RuntimeError("Speech synthesis returned no audio")
+            self.put(text, lang, audio)
+            logging.debug(f"Synthesized {len(audio)} bytes of audio for '{lang}'")
+        return audio
+
+    def open(self, text, lang):
+        """Return a fresh in-memory file for playback"""
+        return io.BytesIO(self.get_or_synthesize(text, lang))